@@ -2,14 +2,11 @@
 from __future__ import division
 import argparse
 import csv
-import functools
-import itertools
-import math
+import os.path
 import sys
 
-import dendropy
-from dendropy.treecalc import euclidean_distance, robinson_foulds_distance
-from dendropy import treesum,  treesplit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import newick, topology
 
 
 def main():
@@ -24,19 +21,20 @@ def main():
     a = p.parse_args()
 
     # Trees need a common taxon set
-    taxa = dendropy.TaxonSet()
+    taxa = newick.TaxonNamespace()
 
     with a.reference_tree as fp:
-        ref_tree = dendropy.Tree.get_from_stream(fp, 'newick', taxon_set=taxa)
+        ref_tree = topology.Reference(newick.parse(fp.read(), taxa))
+    read = {'newick': topology.read_newick_trees,
+            'nexus': topology.read_nexus_trees}[a.schema]
 
     with a.output as ofp:
         w = csv.writer(ofp, lineterminator='\n')
         w.writerow(['reference', 'query', 'euclidean_distance', 'rf_distance'])
         for tree_path in a.compare_trees:
-            tree = dendropy.Tree.get_from_path(tree_path, a.schema, taxon_set=taxa)
+            tree, _ = next(read(tree_path, taxa=taxa))
 
-            euc_dist = euclidean_distance(tree, ref_tree)
-            rf_dist = robinson_foulds_distance(tree, ref_tree)
+            _, rf_dist, euc_dist = ref_tree.distances(tree)
             w.writerow([a.reference_tree.name, tree_path, euc_dist, rf_dist])
 
 if __name__ == '__main__':
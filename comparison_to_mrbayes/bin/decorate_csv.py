@@ -1,8 +1,12 @@
 #!/usr/bin/env python
 import argparse
 import csv
+import os.path
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis.decorate import decorate, write_csv
+
 def key_val(s):
     if not s.count('=') == 1:
         raise ValueError("Format: x=y")
@@ -16,16 +20,9 @@ def main():
     p.add_argument('kvs', metavar='k=v', nargs='+', type=key_val)
     a = p.parse_args()
 
-    keys, values = zip(*a.kvs)
-    values = list(values)
-
     r = csv.reader(a.input)
-    headers = list(next(r))
-    w = csv.writer(a.output, lineterminator='\n')
-    w.writerow(headers + list(keys))
-
-    for row in r:
-        w.writerow(list(row) + values)
+    headers = next(r)
+    write_csv(a.output, *decorate(headers, r, a.kvs))
 
 if __name__ == '__main__':
     main()
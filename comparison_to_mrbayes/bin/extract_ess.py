@@ -6,6 +6,12 @@ import json
 import sys
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import stscolumns
+
+COLUMNS = ['generations.T', 'generations.ess', 'generations.uniqueParticles',
+           'generations.sequence']
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('-k', '--keys', default=['proposal_method_name',
@@ -32,18 +38,14 @@ def main():
             for f in online_result_files:
                 f = os.path.join(os.path.dirname(cf), os.path.basename(f))
                 try:
-                    with argparse.FileType('r')(f) as fp:
-                        sts_json = json.load(fp)
+                    cols = stscolumns.load_columns(f, COLUMNS)
                 except:
                      print(f)
                      continue
 
-                for r in sts_json['generations']:
+                for values in zip(*[cols[c].tolist() for c in COLUMNS]):
                     row = row_base.copy()
-                    row['generation'] = r['T']
-                    row['ess'] = r['ess']
-                    row['unique_particles'] = r['uniqueParticles']
-                    row['sequence'] = r['sequence']
+                    row.update(zip(['generation', 'ess', 'unique_particles', 'sequence'], values))
                     w.writerow(row)
 
 if __name__ == '__main__':
@@ -6,6 +6,9 @@ import json
 import sys
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import stscolumns
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('-k', '--keys', default=['proposal_method_name',
@@ -35,20 +38,20 @@ def main():
             row_base = {k: ctrl[k] for k in a.keys}
 
             for f in online_result_files:
-            	f = os.path.join(os.path.dirname(cf), os.path.basename(f))
+                f = os.path.join(os.path.dirname(cf), os.path.basename(f))
                 row = row_base.copy()
                 #print(f)
                 try:
-                    with argparse.FileType('r')(f) as fp:
-                        sts_json = json.load(fp)
+                    cols = stscolumns.load_columns(f, ['generations.ess',
+                                                       'generations.totalUpdatePartialsCalls',
+                                                       'generations.uniqueParticles'])
                 except:
                      print(f)
                      continue
-                last_gen = sts_json['generations'][-1]
                 row['sts_json'] = f
-                row['last_ess'] = last_gen['ess']
-                row['likelihood_calls'] = last_gen['totalUpdatePartialsCalls']
-                row['unique_particles'] = last_gen['uniqueParticles']
+                row['last_ess'] = cols['generations.ess'][-1].item()
+                row['likelihood_calls'] = cols['generations.totalUpdatePartialsCalls'][-1].item()
+                row['unique_particles'] = cols['generations.uniqueParticles'][-1].item()
                 w.writerow(row)
 
 if __name__ == '__main__':
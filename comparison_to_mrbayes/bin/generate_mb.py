@@ -3,8 +3,6 @@ import argparse
 import os.path
 import sys
 
-from Bio import SeqIO
-
 TEMPLATE = """
 begin mrbayes;
     set autoclose=yes nowarn=yes;
@@ -21,6 +19,8 @@ end;
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('nexus_path')
+    p.add_argument('-n', '--n-sequences', type=int, help="""Number of
+            sequences in nexus_path, if known [default: count them]""")
     mb_group = p.add_argument_group('mrbayes')
     mb_group.add_argument('-l', '--length', type=int, default=1000000)
     mb_group.add_argument('-r', '--runs', type=int, default=2)
@@ -29,7 +29,10 @@ def main():
     a = p.parse_args()
 
     base = os.path.splitext(a.nexus_path)[0]
-    n_sequences = sum(True for i in SeqIO.parse(a.nexus_path, 'nexus'))
+    n_sequences = a.n_sequences
+    if n_sequences is None:
+        from Bio import SeqIO
+        n_sequences = sum(True for i in SeqIO.parse(a.nexus_path, 'nexus'))
 
     extra = ''
     if n_sequences <= 4:
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Score attaching a pruned taxon at the middle of every edge of each tree of
+a posterior sample, ranking the edges of each tree by log likelihood.
+"""
+import argparse
+import csv
+import os.path
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import alignment, attachment, likelihood, newick, topology
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('alignment', help="""NEXUS alignment, including the pruned
+            taxon""")
+    p.add_argument('trees', help="""MrBayes tree file, sts-online result or
+            Newick trees, one per line""")
+    p.add_argument('-t', '--pruned-taxon', default='t1')
+    p.add_argument('-b', '--burnin', type=int, default=0, help="""Trees to skip
+            at the start of a MrBayes tree file [default: %(default)s]""")
+    p.add_argument('-l', '--pendant-length', type=float, action='append',
+            dest='pendant_lengths', help="""Length of the edge to the attached
+            taxon; may be repeated [default: 0 and 0.5]""")
+    p.add_argument('-o', '--output', type=argparse.FileType('w'),
+            default=sys.stdout)
+    a = p.parse_args()
+
+    pendant_lengths = a.pendant_lengths or attachment.PENDANT_LENGTHS
+    with open(a.alignment) as fp:
+        patterns, weights = likelihood.compress(alignment.read_nexus(fp))
+    tips = likelihood.tip_partials(patterns)
+
+    read = topology.tree_readers[os.path.splitext(a.trees)[1]]
+    with a.output as ofp:
+        w = csv.writer(ofp, lineterminator='\n')
+        w.writerow(attachment.header(pendant_lengths))
+        taxa = newick.TaxonNamespace()
+        for i, (tree, _) in enumerate(read(a.trees, a.burnin, taxa)):
+            rows = attachment.scan_tree(tree, tips, a.pruned_taxon, pendant_lengths,
+                                        weights)
+            w.writerows([i] + row for row in rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Compare the posterior of each tree of a MrBayes sample with that of forests
+cut from it: the tree without a pruned taxon, or with --random-splits, the
+two clades left by cutting random edges. Branch lengths have an
+exponential prior.
+"""
+import argparse
+import csv
+import math
+import os.path
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import alignment, forest, newick, topology
+
+PRUNE_HEADER = ('index', 'forest_length', 'orig_likelihood', 'orig_prior',
+                'orig_posterior', 'likelihood', 'prior', 'posterior')
+SPLIT_HEADER = ('index', 'split', 'forest_sizes', 'forest_length', 'orig_likelihood',
+                'orig_prior', 'orig_posterior', 'likelihood', 'prior', 'posterior')
+
+
+def edge_log_priors(tree, mean):
+    """
+    Log density of the exponential prior with ``mean`` of the length above
+    each node, 0 where it is missing.
+    """
+    return np.nan_to_num(-math.log(mean) - tree.length / mean)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('alignment', help="""NEXUS alignment""")
+    p.add_argument('trees', help="""MrBayes tree file, sts-online result or
+            Newick trees, one per line""")
+    p.add_argument('-b', '--burnin', type=int, default=0)
+    p.add_argument('-t', '--prune-taxon', help="""Taxon to remove""")
+    p.add_argument('-n', '--random-splits', type=int, default=0, help="""Cut
+            this many random edges of each tree instead of pruning a taxon""")
+    p.add_argument('-s', '--seed', type=int)
+    p.add_argument('--exp-mean', type=float, default=0.1, help="""Mean of the
+            exponential prior on branch lengths [default: %(default)s]""")
+    p.add_argument('-o', '--output', type=argparse.FileType('w'),
+            default=sys.stdout)
+    a = p.parse_args()
+    if not a.random_splits and a.prune_taxon is None:
+        p.error('one of --prune-taxon and --random-splits is required')
+
+    with open(a.alignment) as fp:
+        forests = forest.ForestLikelihood(alignment.read_nexus(fp))
+    random_state = np.random.RandomState(a.seed)
+
+    read = topology.tree_readers[os.path.splitext(a.trees)[1]]
+    taxa = newick.TaxonNamespace()
+    with a.output as ofp:
+        w = csv.writer(ofp, lineterminator='\n')
+        w.writerow(SPLIT_HEADER if a.random_splits else PRUNE_HEADER)
+        for i, (tree, _) in enumerate(read(a.trees, a.burnin, taxa)):
+            lengths = np.nan_to_num(tree.length)
+            priors = edge_log_priors(tree, a.exp_mean)
+            everything = forest.node_masks(tree)[-1]
+            orig_ll = forests.log_likelihood(tree, [everything])
+            orig = [orig_ll, priors.sum(), orig_ll + priors.sum()]
+
+            if not a.random_splits:
+                leaf = taxa.add(a.prune_taxon)
+                node, = np.flatnonzero(tree.taxon == leaf)
+                ll = forests.log_likelihood(tree, [everything ^ (1 << leaf)])
+                prior = priors.sum() - priors[node]
+                w.writerow([i, lengths.sum() - lengths[node]] + orig +
+                           [ll, prior, ll + prior])
+                continue
+
+            for _ in range(a.random_splits):
+                clades, cut = forest.random_split(tree, random_state)
+                sizes = [bin(m).count('1') for m in clades]
+                small = clades[int(np.argmin(sizes))]
+                ll = forests.log_likelihood(tree, clades)
+                prior = priors.sum() - priors[cut].sum()
+                w.writerow([i, ' '.join(forest.clade_labels(tree, small)),
+                            '|'.join(map(str, sizes)), lengths.sum() - lengths[cut].sum()] +
+                           orig + [ll, prior, ll + prior])
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 import argparse
 import csv
-import json
+import os.path
+import math
 import sys
 
-import dendropy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import newick, stscolumns
 
 def main():
     p = argparse.ArgumentParser()
@@ -14,24 +16,26 @@ def main():
         default=sys.stdout)
     a = p.parse_args()
 
-    ref_tree = dendropy.Tree.get_from_path(a.ref_tree, 'newick')
+    with open(a.ref_tree) as fp:
+        ref_tree = newick.parse(fp.read())
+    labels = ref_tree.labels
+    parents = ref_tree.parent.tolist()
+    children = ref_tree.children()
+    lengths = [None if math.isnan(l) else l for l in ref_tree.length.tolist()]
 
     with a.output as ofp:
         w = csv.writer(ofp, lineterminator='\n')
         w.writerow(['tree', 'posterior', 'generation', 'pruned_taxon', 'pendant_bl', 'prox_bl', 'dist_bl', 'ess'])
         for f in a.sts_json:
-            with argparse.FileType('r')(f) as fp:
-                sts_json = json.load(fp)
+            cols = stscolumns.load_columns(f, ['generations.sequence', 'generations.ess'])
+            for i, (sequence, ess) in enumerate(zip(cols['generations.sequence'].tolist(),
+                                                    cols['generations.ess'].tolist())):
+                node = labels.index(sequence)
 
-                for i, g in enumerate(sts_json['generations']):
-                    sequence = g['sequence']
-                    ess = g['ess']
-                    node = ref_tree.find_node_with_taxon_label(sequence)
+                parent = parents[node]
+                sibling = next((n for n in children[parent] if n != node), None)
 
-                    parent = node.parent_node
-                    sibling = next((n for n in parent.child_nodes() if n != node), None)
-
-                    w.writerow([a.ref_tree, f, i, sequence, node.edge_length, parent.edge_length, sibling.edge_length, ess])
+                w.writerow([a.ref_tree, f, i, sequence, lengths[node], lengths[parent], lengths[sibling], ess])
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Recompute the JC69 log likelihood of every tree of posterior samples
+against an alignment.
+
+Rows are written per tree, in the order of the comparison CSVs of
+compare_topologies, with the log likelihood MrBayes reported for the sample
+(the LnL column of the .p file next to a .t file) where there is one. With
+--append-to, the log likelihoods are added as a column of an existing
+comparison CSV instead.
+"""
+import argparse
+import csv
+import logging
+import os.path
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import alignment, likelihood, mrbayes, newick, topology
+
+log = logging.getLogger('rescore_trees')
+
+HEADER = ('file', 'log_weight', 'log_likelihood', 'reported_log_likelihood')
+
+
+def reported_log_likelihoods(path, burnin, n_trees):
+    """
+    LnL column of the MrBayes parameter file beside the tree file ``path``,
+    or None if there is none matching its trees.
+    """
+    stem, ext = os.path.splitext(path)
+    p = stem + '.p'
+    if ext != '.t' or not os.path.exists(p):
+        return None
+    with open(p) as fp:
+        lnl = mrbayes.read_parameters(fp, burnin).get('LnL')
+    if lnl is None or len(lnl) != n_trees:
+        log.warning('%s: parameters do not match the %d trees of %s', p, n_trees, path)
+        return None
+    return lnl.tolist()
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('alignment', help="""NEXUS alignment""")
+    p.add_argument('trees', nargs='+', help="""MrBayes tree files, sts-online
+            results or Newick trees, one per line""")
+    p.add_argument('-b', '--nexus-burnin', default=0, type=int)
+    p.add_argument('-j', '--jobs', type=int, default=1, help="""Number of
+            processes; 0 for one per CPU [default: %(default)s]""")
+    p.add_argument('-a', '--append-to', metavar='CSV', help="""Comparison CSV
+            of the same trees, to copy with a log_likelihood column""")
+    p.add_argument('-o', '--output', type=argparse.FileType('w'),
+            default=sys.stdout)
+    a = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with open(a.alignment) as fp:
+        aln = alignment.read_nexus(fp)
+
+    taxa = newick.TaxonNamespace()
+    rows = []
+    trees = []
+    for path in a.trees:
+        read = topology.tree_readers[os.path.splitext(path)[1]]
+        file_trees = list(read(path, a.nexus_burnin, taxa))
+        reported = (reported_log_likelihoods(path, a.nexus_burnin, len(file_trees)) or
+                    [None] * len(file_trees))
+        for (tree, log_weight), lnl in zip(file_trees, reported):
+            rows.append([path, log_weight, None, lnl])
+            trees.append(tree)
+    log_likes = likelihood.score_trees(trees, aln, a.jobs or None)
+    for row, ll in zip(rows, log_likes.tolist()):
+        row[2] = ll
+
+    with a.output as ofp:
+        w = csv.writer(ofp, lineterminator='\n')
+        if a.append_to is None:
+            w.writerow(HEADER)
+            w.writerows(rows)
+            return
+        with open(a.append_to) as fp:
+            r = csv.reader(fp)
+            header = next(r)
+            comparison = list(r)
+        if len(comparison) != len(rows):
+            raise ValueError('{0} has {1} rows for {2} trees'.format(
+                a.append_to, len(comparison), len(rows)))
+        if 'file' in header:
+            i = header.index('file')
+            if any(c[i] != row[0] for c, row in zip(comparison, rows)):
+                raise ValueError('{0} is not of the trees {1}'.format(
+                    a.append_to, ' '.join(a.trees)))
+        w.writerow(header + ['log_likelihood'])
+        w.writerows(c + [row[2]] for c, row in zip(comparison, rows))
+
+if __name__ == '__main__':
+    main()
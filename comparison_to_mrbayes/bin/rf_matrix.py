@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Robinson-Foulds distances between all pairs of trees in one or more posterior
+samples, for looking at the geometry of the posteriors (e.g. by MDS).
+"""
+import argparse
+import logging
+import os.path
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis.decorate import write_csv
+from stsanalysis.rfmatrix import SAMPLE_HEADER, SampleSplits, open_matrix, rf_matrices
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('trees', nargs='+', help="""MrBayes tree files or sts-online
+            results""")
+    p.add_argument('-o', '--output', required=True, help="""Write the RF
+            distance matrix to this .npy file""")
+    p.add_argument('-w', '--weighted', help="""Write the weighted RF distance
+            matrix to this .npy file""")
+    p.add_argument('-s', '--samples', type=argparse.FileType('w'), required=True,
+            help="""Write the file, index and log weight of each row to this
+            CSV file""")
+    p.add_argument('-b', '--nexus-burnin', default=0, type=int)
+    p.add_argument('-c', '--split-cache', action='store_true', help="""Read
+            splits from a binary cache next to each file, built on first
+            use""")
+    p.add_argument('-t', '--tile-size', default=256, type=int, help="""Compute
+            distances in blocks of this many rows [default: %(default)d]""")
+    a = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    sample_splits = SampleSplits()
+    for path in a.trees:
+        if a.split_cache:
+            sample_splits.add_cached(path, a.nexus_burnin)
+        else:
+            sample_splits.add_file(path, a.nexus_burnin)
+
+    n = len(sample_splits)
+    rf = open_matrix(a.output, n, np.int32)
+    weighted = open_matrix(a.weighted, n, np.float64) if a.weighted else None
+    rf_matrices(sample_splits, rf, weighted, tile_size=a.tile_size)
+    rf.flush()
+    if weighted is not None:
+        weighted.flush()
+
+    with a.samples as fp:
+        write_csv(fp, SAMPLE_HEADER, sample_splits.samples)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+Build the binary split caches of posterior tree files, so later analyses
+with --split-cache start without parsing them.
+"""
+import argparse
+import logging
+import os.path
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import splitcache
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('trees', nargs='+', help="""MrBayes tree files or sts-online
+            results""")
+    p.add_argument('-f', '--force', action='store_true', help="""Rebuild
+            caches even if they are up to date""")
+    a = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    for path in a.trees:
+        if a.force or not splitcache.is_current(path):
+            splitcache.write_split_matrix(path)
+
+if __name__ == '__main__':
+    main()
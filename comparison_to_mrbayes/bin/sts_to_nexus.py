@@ -1,17 +1,19 @@
 #!/usr/bin/env python
 import argparse
-import json
 import logging
 import math
+import os.path
 import sys
 
 import dendropy
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis import stsjson
+
 def parse_weighted_trees(fp, **kwargs):
     max_log_weight = -sys.float_info.max
     trees = []
-    jtrees = json.load(fp)
-    for i, tree in enumerate(jtrees['trees']):
+    for i, (_, tree) in enumerate(stsjson.iter_sections(fp, ['trees'])):
         sys.stderr.write('{0:10d}\r'.format(i + 1))
         nwk_str = str(tree['newickString'])  # This can't be unicode for dendropy
         log_weight = tree['logWeight']
@@ -1,51 +1,25 @@
 #!/usr/bin/env python
 import argparse
-import collections
 import csv
-import itertools
-import subprocess
-import re
+import logging
+import os.path
 import sys
 
-PosteriorComparison = collections.namedtuple(
-        'PosteriorComparison',
-        ['tree1', 'tree2',
-         'd11_mean', 'd11_lower' ,'d11_upper',
-         'd22_mean', 'd22_lower' ,'d22_upper',
-         'd12_mean', 'd12_lower' ,'d12_upper',
-         'p_d12_g_d11',
-         'p_d12_g_d22'])
-
-def extract_distance_range(comparison, text):
-    suffix = r'\s+~ ([.0-9]+)\s+\(([.0-9]+),\s+([.0-9]+)\)'
-    return map(float, re.findall(comparison + suffix, text)[0])
-
-def extract_p_greater(n, text):
-    r = r'P\(D12\s+>\s+D{0}{0}\) = ([.0-9]+)'.format(n)
-    return float(re.findall(r, text)[0])
-
-def compare_pair(tree1, tree2):
-    cmd = ['trees-distances', 'compare', tree1, tree2]
-    out = subprocess.check_output(cmd)
-
-    d11 = extract_distance_range('D11', out)
-    d12 = extract_distance_range('D12', out)
-    d22 = extract_distance_range('D22', out)
-
-    pd12_g_d11 = extract_p_greater(1, out)
-    pd12_g_d22 = extract_p_greater(2, out)
-    return PosteriorComparison(tree1, tree2,
-            d11[0], d11[1], d11[2],
-            d22[0], d22[1], d22[2],
-            d12[0], d12[1], d12[2],
-            pd12_g_d11,
-            pd12_g_d22)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from stsanalysis.treedist import PosteriorComparison, compare_posteriors
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('files', metavar='file', nargs='+')
     p.add_argument('-o', '--output', default=sys.stdout, type=argparse.FileType('w'))
+    p.add_argument('-b', '--nexus-burnin', default=0, type=int)
+    p.add_argument('-j', '--jobs', type=int, help="""Number of processes
+            [default: number of CPUs]""")
+    p.add_argument('-c', '--split-cache', action='store_true', help="""Read
+            splits from a binary cache next to each file, built on first
+            use""")
     a = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
 
     with a.output as fp:
         w = csv.writer(fp, lineterminator='\n')
@@ -53,8 +27,8 @@ def main():
         # Header
         w.writerow(PosteriorComparison._fields)
 
-        for tree1, tree2 in itertools.combinations(a.files, 2):
-            w.writerow(compare_pair(tree1, tree2))
+        w.writerows(compare_posteriors(a.files, a.nexus_burnin, a.jobs,
+                                       split_cache=a.split_cache))
 
 if __name__ == '__main__':
     main()
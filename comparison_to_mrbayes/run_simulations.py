@@ -10,13 +10,39 @@ from subprocess import check_call
 from timeit import default_timer as timer
 import argparse
 import logging
+import threading
 from shutil import copyfile
 import re
 
+from stsanalysis import alignment, asdsf, results, simulate, stscolumns, topology
+from stsanalysis.decorate import write_decorated
+from sweep.cache import ArtifactCache, parse_size
+from sweep.graph import TaskGraph
+from sweep.manifest import Manifest
+from sweep.workqueue import WorkQueue
+
 log = logging.getLogger('sts')
 
 p = argparse.ArgumentParser()
 p.add_argument('-o', '--output', default='output')
+p.add_argument('-j', '--jobs', type=int, default=1, help="""Number of steps
+        to run concurrently [default: %(default)d]""")
+p.add_argument('-f', '--force', action='store_true', help="""Rerun steps
+        which the manifest records as up to date""")
+p.add_argument('--cache', help="""Directory holding simulated alignments
+        and outputs of phyml, mb and sts-online runs, shared between output directories""")
+p.add_argument('--cache-size', type=parse_size, help="""Evict least recently
+        used cache entries beyond this size, e.g. 200G""")
+queue_group = p.add_argument_group('work queue', """Run the sweep on several
+        hosts sharing a file system: queue the steps once, start any number
+        of workers with the same output directory, then aggregate.""")
+queue_group = queue_group.add_mutually_exclusive_group()
+queue_group.add_argument('--enqueue', metavar='QUEUE', help="""Write the
+        steps of the sweep to the queue directory QUEUE""")
+queue_group.add_argument('--worker', metavar='QUEUE', help="""Run steps from
+        QUEUE until none remain, with --jobs steps at a time""")
+queue_group.add_argument('--reduce', metavar='QUEUE', help="""Aggregate the
+        results of the steps run from QUEUE""")
 arg = p.parse_args()
 
 logging.basicConfig(level=logging.INFO)
@@ -51,9 +77,6 @@ bin = os.path.join(dir, 'bin')
 sts = os.path.join(bin,'sts-online')
 
 # scripts
-cmp_pt = os.path.join(bin, 'compare_posterior_topologies.py')
-decorate_csv = os.path.join(bin, 'decorate_csv.py')
-asdsf = os.path.join(bin, 'asdsf.py')
 extract_ess_like = os.path.join(bin, 'extract_ess_like.py')
 extract_ess = os.path.join(bin, 'extract_ess.py')
 generate_mb = os.path.join(bin, 'generate_mb.py')
@@ -64,15 +87,24 @@ ess_csv = os.path.join(arg.output, 'ess.csv')
 posterior_comparison_csv = os.path.join(arg.output, 'posterior_comparison.csv')
 pp_comparison_csv = os.path.join(arg.output, 'pp_comparison.csv')
 mrbayes_csv = os.path.join(arg.output, 'mrbayes.csv')
+results_db = os.path.join(arg.output, 'results.sqlite')
+manifest_path = os.path.join(arg.output, 'manifest.jsonl')
 
 if not os.path.lexists(arg.output):
     os.mkdir(arg.output)
 
-asdsfs = ['csvstack']
-pps = ['csvstack']
-ppcomps = ['csvstack']
-probs = ['csvstack']
+# (csv, metadata) pairs of the outputs of each results table
+asdsfs = []
+pps = []
+ppcomps = []
+probs = []
 controls = []
+mrbayes_rows = []
+
+# Whether steps record their rows in results_db as they finish. Workers on
+# several hosts can't share SQLite, whose locking is unreliable over network
+# file systems, so they leave their CSVs for --reduce to import.
+record_to_db = True
 
 MRBAYES_TEMPLATE = """
 begin mrbayes;
@@ -88,20 +120,81 @@ end;
 """
 
 
+def makedir(path):
+    # Workers on other hosts may be creating the same directories
+    try:
+        os.mkdir(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+
 def main():
-    mb_csv = open(mrbayes_csv, "w")
+    global record_to_db
+
+    graph = build_graph()
+
+    cache = None
+    if arg.cache:
+        cache = ArtifactCache(arg.cache, arg.output, max_size=arg.cache_size)
+
+    if arg.enqueue:
+        WorkQueue(arg.enqueue).enqueue(graph)
+        return
+
+    if arg.worker:
+        record_to_db = False
+        queue = WorkQueue(arg.worker)
+        manifest = Manifest(manifest_path, force=arg.force, cache=cache, shard=queue.worker_id)
+        # As in TaskGraph.run, the pool must start before the threads
+        pool = None
+        if arg.jobs > 1 and any(task.process for task in graph):
+            pool = graph.start_pool(arg.jobs)
+        try:
+            workers = [threading.Thread(target=queue.work, args=(graph, manifest.execute))
+                       for _ in xrange(max(1, arg.jobs))]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        finally:
+            if pool is not None:
+                pool.terminate()
+            manifest.close()
+        return
+
+    if arg.reduce:
+        queue = WorkQueue(arg.reduce)
+        queue.check(graph)
+        done, failed = queue.finished()
+        if len(done) < len(graph):
+            log.warning('%d of %d steps failed or were not run', len(graph) - len(done), len(graph))
+    else:
+        manifest = Manifest(manifest_path, force=arg.force, cache=cache)
+        try:
+            failed = graph.run(arg.jobs, execute=manifest.execute)
+        finally:
+            manifest.close()
+        if failed:
+            log.warning('%d of %d steps failed or were skipped', len(failed), len(graph))
+
+    aggregate()
+
+
+def build_graph():
+    graph = TaskGraph()
 
     for n in taxonCounts:
         for i in treeReplicates:
 
             nwk = os.path.join(dir, 'trees', '{}taxon-0{}.nwk'.format(n, i))
 
-            tree_count_dir = os.path.join(arg.output, '{}taxon-0{}'.format(n, i))
+            base = '{}taxon-0{}'.format(n, i)
+            tree_count_dir = os.path.join(arg.output, base)
 
-            if not os.path.lexists(tree_count_dir):
-                os.mkdir(tree_count_dir)
+            makedir(tree_count_dir)
 
-            stem = os.path.join(tree_count_dir, '{}taxon-0{}'.format(n, i))
+            stem = os.path.join(tree_count_dir, base)
 
             mb = stem + '.mb'
             mb_t1 = stem + '.run1.t'
@@ -113,262 +206,343 @@ def main():
             fasta = stem + '.fasta'
             nex = stem + '.nex'
 
-            check_call(['bppseqgen', '--seed', '0', 'input.tree.file='+nwk, 'input.tree.format=Newick',
-                        'output.sequence.file='+fasta, 'output.sequence.format=Fasta', 'alphabet=DNA',
-                        'number_of_sites={}'.format(siteCount), 'rate_distribution=Constant', 'model=JC69'])
+            # JC69 with constant rates, written in every format used below
+            graph.add(base + '/simulate', func=simulate.simulate_files,
+                      args=(nwk, [fasta, nex, phyx], siteCount, 0),
+                      inputs=[nwk], outputs=[fasta, nex, phyx], process=True, cacheable=True)
 
-            check_call(['seqmagick', 'convert', '--alphabet', 'dna', '--output-format', 'nexus', fasta, nex])
+            # MrBayes runs in the tree directory, so the .mb files don't
+            # depend on the output directory and can be shared via the cache
+            graph.add(base + '/generate_mb',
+                      cmds=[[os.path.abspath(generate_mb), '--runs', str(runCount), '--length', str(generations),
+                             '--n-sequences', str(n), base + '.nex', '-o', base + '.mb']],
+                      inputs=[nex], outputs=[mb], cwd=tree_count_dir)
 
-            check_call([generate_mb, '--runs', str(runCount), '--length', str(generations),
-                        os.path.join(arg.output, '{}taxon-0{}'.format(n, i), '{}taxon-0{}.nex'.format(n, i)),
-                        '-o', mb])
+            graph.add(base + '/phyml',
+                      cmds=[['phyml', '-i', phyx, '-u', nwk, '-c', '1', '-m', 'JC69', '-o', 'l', '-b', '0']],
+                      inputs=[phyx, nwk], outputs=[phyml_t], cacheable=True)
 
-            check_call(['seqmagick', 'convert', fasta, phyx])
-            check_call(['phyml', '-i', phyx, '-u', nwk, '-c', '1', '-m', 'JC69', '-o', 'l', '-b', '0'])
-            check_call(['mb', os.path.join(arg.output, '{}taxon-0{}'.format(n, i), '{}taxon-0{}.mb'.format(n, i))])
-            check_call(['sed', '-i', '-e', 's/e+00//g', mb_t1, mb_t2, mb_p1, mb_p2])
+            graph.add(base + '/mb',
+                      cmds=[['mb', base + '.mb']],
+                      inputs=[mb, nex], outputs=[mb_t1, mb_t2, mb_p1, mb_p2], cwd=tree_count_dir, cacheable=True)
 
             # compare posterior
-            cmd = [decorate_csv, 'tree={}'.format(nwk), 'n_taxa={}'.format(n), 'trim_taxon=""', 'trim_count=""',
-                   'particle_factor=""', 'proposal_method_name=""', 'proposal_args=""', 'type=MrBayes']
+            metadata = [('tree', nwk), ('n_taxa', str(n)), ('trim_taxon', '""'), ('trim_count', '""'),
+                        ('particle_factor', '""'), ('proposal_method_name', '""'), ('proposal_args', '""'),
+                        ('type', 'MrBayes')]
 
             for j in xrange(1, runCount + 1):
                 run_t = stem + '.run{}.t'.format(j)
-                p_cmp = subprocess.Popen([cmp_pt, '-b', str(burnin), phyml_t, run_t], stdout=subprocess.PIPE)
-
-                with open(stem + '.run{}.comp.csv'.format(j), 'w') as out:
-                    a = subprocess.Popen(cmd, stdin=p_cmp.stdout, stdout=out)
-                    a.wait()
-                p_cmp.wait()
+                run_comp_csv = stem + '.run{}.comp.csv'.format(j)
+                graph.add('{}/compare_run{}'.format(base, j), func=compare_topologies,
+                          args=(phyml_t, run_t, run_comp_csv, metadata, burnin),
+                          inputs=[phyml_t, run_t], outputs=[run_comp_csv], process=True)
 
             asdsf_csv = os.path.join(tree_count_dir, 'asdsf.csv')
             pp_csv = os.path.join(tree_count_dir, 'pp.csv')
             pp_annot_csv = os.path.join(tree_count_dir, 'pp_annot.csv')
 
-            asdsfs.append(asdsf_csv)
-            pps.append(pp_annot_csv)
+            metadata = [('tree', nwk), ('n_taxa', str(n)), ('trim_taxon', '0'), ('trim_count', '0'),
+                        ('particle_factor', '0'), ('proposal_method_name', '0'), ('proposal_args', '0')]
 
-            p_cmp = subprocess.Popen(['python', asdsf, mb_t1, mb_t2, '--pp-table', pp_csv],
-                                     stdout=subprocess.PIPE)
+            asdsfs.append((asdsf_csv, metadata))
+            pps.append((pp_annot_csv, metadata))
 
-            cmd = ['python', decorate_csv, 'tree={}'.format(nwk), 'n_taxa={}'.format(n), 'trim_taxon=0', 'trim_count=0',
-                   'particle_factor=0', 'proposal_method_name=0', 'proposal_args=0']
-
-            # create asdsf.csv from the standard output of p_cmp
-            with open(asdsf_csv, 'w') as out:
-                a = subprocess.Popen(cmd, stdin=p_cmp.stdout, stdout=out)
-                a.wait()
-            p_cmp.wait()
-
-            # create pp_annot.csv from pp.csv
-            cmd = ['python', decorate_csv, 'tree={}'.format(nwk), 'n_taxa={}'.format(n), 'trim_taxon=0', 'trim_count=0',
-                   'particle_factor=0', 'proposal_method_name=0', 'proposal_args=0', '-i', pp_csv, '-o', pp_annot_csv]
-            check_call(cmd)
+            # create asdsf.csv, pp.csv and pp_annot.csv
+            graph.add(base + '/asdsf', func=compare_posteriors,
+                      args=(mb_t1, [(mb_t2, asdsf_csv, pp_csv, pp_annot_csv, metadata)]),
+                      inputs=[mb_t1, mb_t2], outputs=[asdsf_csv, pp_csv, pp_annot_csv], process=True)
 
+            trims = []
             for trim_count in trimCounts:
                 combinations = ('-'.join(c) for c in itertools.combinations(['t{}'.format(nn+1) for nn in range(n)], trim_count))
                 for c in list(itertools.islice(combinations, 0, trimReplicates)):
-
                     trim_dir = os.path.join(tree_count_dir, c)
-
-                    if not os.path.lexists(trim_dir):
-                        os.mkdir(trim_dir)
-
-                    stem_trim = os.path.join(trim_dir, '{}tax_trim_{}'.format(n, c))
-
-                    trim_nex = stem_trim + '.nex'
-                    trim_mb = stem_trim + '.mb'
-                    trim_t = stem_trim + '.t'
-                    trim_p = stem_trim + '.p'
-
-                    check_call(['seqmagick', 'convert', '--pattern-exclude', '^({})$'.format(c).replace('-', '|'),
-                                '--input-format', 'nexus' ,'--alphabet', 'dna', nex, trim_nex])
-                    check_call([generate_mb, '--runs', '1', '--length', str(generations),
-                                os.path.join(arg.output, '{}taxon-0{}'.format(n, i), c, '{}tax_trim_{}.nex'.format(n, c)), '-o', trim_mb])
-                    check_call(['mb', os.path.join(arg.output, '{}taxon-0{}'.format(n, i), c, '{}tax_trim_{}.mb'.format(n, c))])
-                    check_call(['sed', '-i', '-e', 's/e+00//g', trim_t, trim_p])
-
-                    for method, particle_factor in itertools.product(methods.keys(), particleFactors):
-                        if not os.path.lexists(os.path.join(trim_dir, str(particle_factor))):
-                            os.mkdir(os.path.join(trim_dir, str(particle_factor)))
-
-                        proposal_dir = os.path.join(trim_dir, str(particle_factor), method)
-
-                        if not os.path.lexists(proposal_dir):
-                            os.mkdir(proposal_dir)
-
-                        jsonf = os.path.join(proposal_dir, '{}tax_trim_{}.sts.json'.format(n, c))
-                        control = os.path.join(proposal_dir, 'control.json')
-
-                        cmp_csv = os.path.join(proposal_dir, '{}tax_trim_{}.sts.comp.csv'.format(n, c))
-                        asdsf_csv = os.path.join(proposal_dir, 'asdsf.csv')
-                        pp_csv = os.path.join(proposal_dir, 'pp.csv')
-                        pp_annot_csv = os.path.join(proposal_dir, 'pp_annot.csv')
-                        probs_csv = os.path.join(proposal_dir, 'probs.csv')
-
-                        asdsfs.append(asdsf_csv)
-                        pps.append(pp_annot_csv)
-                        ppcomps.append(cmp_csv)
-                        controls.append(control)
-                        probs.append(probs_csv)
-
-                        cmd = [sts] + methods[method]
-
-                        cmd.extend(['-p', str(particle_factor), '-b', str(burnin), fasta, trim_t, jsonf])
-                        print(' '.join(cmd))
-
-                        start = timer()
-                        try:
-                            check_call(cmd)
-                        except subprocess.CalledProcessError as e:
-                            sys.stderr.write('FAILED\n')
-                            continue
-                        end = timer()
-                        total_time = end - start
-                        print('Time: {}'.format(total_time))
-
-                        write_control(control, method, trim_count, c, n - trim_count,
-                                      particle_factor,
-                                      n, nwk, [jsonf], total_time)
-
-                        loggPs = []
-                        ids = []
-                        with open(jsonf) as js:
-                            root = json.load(js)
-                            for proposals in root['proposals']:
-                                if proposals['T'] == trim_count:
-                                    loggPs.append(proposals['newLogLike'])
-
-                            for trees in root['trees']:
-                                ids.append(trees['particleID'])
-
-                        with open(probs_csv, 'w') as ll:
-                            keys = ['trim_taxon', 'n_taxa', 'trim_count', 'particle_factor', 'proposal_method_name']
-                            header = [str(c), str(n), str(trim_count), str(particle_factor), method]
-                            row_base = {keys[i]: header[i] for i in range(len(header))}
-
-                            w = csv.DictWriter(ll, keys + ['logP'])
-                            w.writeheader()
-                            for idx in ids:
-                                row = row_base.copy()
-                                row['logP'] = loggPs[idx]
-                                w.writerow(row)
-
-                        # compare posterior
-                        cmd = ['python', decorate_csv, 'tree={}'.format(nwk), 'n_taxa={}'.format(n),
-                               'trim_taxon={}'.format(c), 'trim_count={}'.format(trim_count),
-                               'particle_factor={}'.format(particle_factor),
-                               'proposal_method_name={}'.format(method),
-                               'proposal_args=' + ' '.join(methods[method]), 'type=sts-online']
-
-                        # create .sts.comp.csv
-                        p_cmp = subprocess.Popen(['python', cmp_pt, phyml_t, jsonf],
-                                                 stdout=subprocess.PIPE)
-                        with open(cmp_csv, 'w') as out:
-                            a = subprocess.Popen(cmd, stdin=p_cmp.stdout, stdout=out)
-                            a.wait()
-                        p_cmp.wait()
-
-                        # Create pp.csv
-                        p_cmp = subprocess.Popen(['python', asdsf, mb_t1, jsonf, '--pp-table', pp_csv],
-                                                 stdout=subprocess.PIPE)
-
-                        cmd = ['python', decorate_csv, 'tree={}'.format(nwk), 'n_taxa={}'.format(n),
-                               'trim_taxon={}'.format(c),
-                               'trim_count={}'.format(trim_count),
-                               'particle_factor={}'.format(particle_factor),
-                               'proposal_method_name={}'.format(method),
-                               'proposal_args=' + ' '.join(methods[method])]
-
-                        # create asdsf.csv from the standard output of p_cmp
-                        with open(asdsf_csv, 'w') as out:
-                            a = subprocess.Popen(cmd, stdin=p_cmp.stdout, stdout=out)
-                            a.wait()
-                        p_cmp.wait()
-
-                        # create pp_annot.csv from pp.csv
-                        cmd = ['python', decorate_csv, 'tree={}'.format(nwk), 'n_taxa={}'.format(n),
-                               'trim_taxon={}'.format(c),
-                               'trim_count={}'.format(trim_count),
-                               'particle_factor={}'.format(particle_factor),
-                               'proposal_method_name={}'.format(method),
-                               'proposal_args=' + ' '.join(methods[method]), '-i', pp_csv, '-o', pp_annot_csv]
-                        check_call(cmd)
-
-                    if trim_count == 5 and n > 10:
-                        order = []
-                        with open(jsonf) as js:
-                            root = json.load(js)
-                            for proposals in root['generations']:
-                                order.append(proposals['sequence'])
-
-                        length = 30000000
-                        base = '{}taxon-0{}'.format(n, i)
-                        nexus = base + '.nex'
-
-                        for cc in xrange(1,trim_count+1):
-                            seqCount = n+cc-trim_count
-                            tree_count_dir_part = os.path.join(tree_count_dir, str(seqCount))
-                            if not os.path.lexists(tree_count_dir_part):
-                                os.mkdir(tree_count_dir_part)
-                            trim_nex = os.path.join(tree_count_dir_part, '{}taxon-0{}.nex'.format(n, i))
-                            trim_mb = os.path.join(tree_count_dir_part, '{}taxon-0{}.mb'.format(n, i))
-
-                            if cc == trim_count:
-                                copyfile(nex, trim_nex)
-                            else:
-                                check_call(['seqmagick', 'convert', '--pattern-exclude',
-                                            '^({})$'.format('|'.join(order[cc:])), '--input-format',
-                                            'nexus', '--alphabet', 'dna', nex, trim_nex])
-
-                            t = MRBAYES_TEMPLATE.format(nexus=nexus, out_base=base, extra='', length=length,
-                                                samplefreq=length // 1000, printfreq=length // 10000,
-                                                nruns=2, nchains=1, diagnfreq=length / 2)
-                            print(trim_mb)
-                            with open(trim_mb,'w') as fp:
-                                fp.write(t)
-
-                            start = timer()
-                            check_call(['mb', base+'.mb'], cwd=tree_count_dir_part)
-                            end = timer()
-                            total_time = end - start
-                            print('Time: {}'.format(total_time))
-
-                            asdsfv = -1
-                            pattern = re.compile(r'.+(\d+\.\d+)$')
-                            with open(os.path.join(tree_count_dir_part, '{}taxon-0{}.mcmc'.format(n, i))) as fp:
-                                for line in fp:
-                                    line = line.rstrip('\n').rstrip('\r')
-                                    m = pattern.match(line)
-                                    if m:
-                                        asdsfv = m.group(1)
-                            mb_csv.write('{},{},{},{},{},{}\n'.format(i, n, c, cc, total_time, asdsfv))
-
-    mb_csv.close()
+                    makedir(trim_dir)
+                    trims.append((trim_count, c, trim_dir, os.path.join(trim_dir, '{}tax_trim_{}'.format(n, c))))
+
+            # Every trimmed alignment from a single read of the full one
+            subsets = [(c.split('-'), stem_trim + '.nex') for _, c, _, stem_trim in trims]
+            graph.add(base + '/trim', func=alignment.write_subsets, args=(nex, subsets),
+                      inputs=[nex], outputs=[path for _, path in subsets], process=True)
+
+            for trim_count, c, trim_dir, stem_trim in trims:
+                trim_base = '{}/{}'.format(base, c)
+
+                trim_nex = stem_trim + '.nex'
+                trim_mb = stem_trim + '.mb'
+                trim_t = stem_trim + '.t'
+                trim_p = stem_trim + '.p'
+
+                graph.add(trim_base + '/generate_mb',
+                          cmds=[[os.path.abspath(generate_mb), '--runs', '1', '--length', str(generations),
+                                 '--n-sequences', str(n - trim_count),
+                                 os.path.basename(trim_nex), '-o', os.path.basename(trim_mb)]],
+                          inputs=[trim_nex], outputs=[trim_mb], cwd=trim_dir)
+                graph.add(trim_base + '/mb',
+                          cmds=[['mb', os.path.basename(trim_mb)]],
+                          inputs=[trim_mb, trim_nex], outputs=[trim_t, trim_p], cwd=trim_dir, cacheable=True)
+
+                trim_runs = []
+                for method, particle_factor in itertools.product(methods.keys(), particleFactors):
+                    makedir(os.path.join(trim_dir, str(particle_factor)))
+
+                    proposal_dir = os.path.join(trim_dir, str(particle_factor), method)
+
+                    makedir(proposal_dir)
+
+                    run_base = '{}/{}/{}'.format(trim_base, particle_factor, method)
+                    jsonf = os.path.join(proposal_dir, '{}tax_trim_{}.sts.json'.format(n, c))
+                    control = os.path.join(proposal_dir, 'control.json')
+
+                    cmp_csv = os.path.join(proposal_dir, '{}tax_trim_{}.sts.comp.csv'.format(n, c))
+                    asdsf_csv = os.path.join(proposal_dir, 'asdsf.csv')
+                    pp_csv = os.path.join(proposal_dir, 'pp.csv')
+                    pp_annot_csv = os.path.join(proposal_dir, 'pp_annot.csv')
+                    probs_csv = os.path.join(proposal_dir, 'probs.csv')
+
+                    metadata = [('tree', nwk), ('n_taxa', str(n)), ('trim_taxon', c),
+                                ('trim_count', str(trim_count)), ('particle_factor', str(particle_factor)),
+                                ('proposal_method_name', method),
+                                ('proposal_args', ' '.join(methods[method]))]
+
+                    asdsfs.append((asdsf_csv, metadata))
+                    pps.append((pp_annot_csv, metadata))
+                    ppcomps.append((cmp_csv, metadata + [('type', 'sts-online')]))
+                    controls.append(control)
+                    probs.append((probs_csv, metadata))
+
+                    cmd = [sts] + methods[method]
+
+                    cmd.extend(['-p', str(particle_factor), '-b', str(burnin), fasta, trim_t, jsonf])
+
+                    graph.add(run_base + '/sts-online', func=run_sts,
+                              args=(cmd, control, method, trim_count, c, n - trim_count,
+                                    particle_factor, n, nwk, [jsonf]),
+                              inputs=[fasta, trim_t], outputs=[jsonf, control], cacheable=True)
+
+                    sidecar = stscolumns.sidecar_path(jsonf)
+                    graph.add(run_base + '/columns', func=stscolumns.write_sidecar,
+                              args=(jsonf,), inputs=[jsonf], outputs=[sidecar])
+
+                    graph.add(run_base + '/probs', func=write_probs,
+                              args=(jsonf, probs_csv, c, n, trim_count, particle_factor, method, metadata),
+                              inputs=[jsonf, sidecar], outputs=[probs_csv])
+
+                    # compare posterior, creating .sts.comp.csv
+                    graph.add(run_base + '/compare', func=compare_topologies,
+                              args=(phyml_t, jsonf, cmp_csv, metadata + [('type', 'sts-online')]),
+                              inputs=[phyml_t, jsonf], outputs=[cmp_csv], process=True)
+
+                    trim_runs.append((jsonf, asdsf_csv, pp_csv, pp_annot_csv, metadata))
+
+                # create asdsf.csv, pp.csv and pp_annot.csv for every run
+                # of this trim, reading the MrBayes reference once
+                graph.add(trim_base + '/asdsf', func=compare_posteriors,
+                          args=(mb_t1, trim_runs),
+                          inputs=[mb_t1] + [r[0] for r in trim_runs],
+                          outputs=[path for r in trim_runs for path in r[1:4]], process=True)
+
+                if trim_count == 5 and n > 10:
+                    # Directories are shared between trim replicates; the
+                    # graph orders the replicates by their common outputs.
+                    for cc in xrange(1, trim_count+1):
+                        seqCount = n+cc-trim_count
+                        tree_count_dir_part = os.path.join(tree_count_dir, str(seqCount))
+                        makedir(tree_count_dir_part)
+                        part_stem = os.path.join(tree_count_dir_part, base)
+                        row_csv = os.path.join(tree_count_dir_part, 'mrbayes_{}.csv'.format(c))
+                        mrbayes_rows.append(row_csv)
+
+                        graph.add('{}/{}/sequential/{}'.format(base, c, seqCount),
+                                  func=run_sequential_mrbayes,
+                                  args=(jsonf, nex, tree_count_dir_part, n, i, c, cc, trim_count, row_csv),
+                                  inputs=[jsonf, stscolumns.sidecar_path(jsonf), nex],
+                                  outputs=[part_stem + '.nex', part_stem + '.mb', part_stem + '.mcmc', row_csv])
+
+    return graph
+
+
+def aggregate():
+    """
+    Combine the results of every step into the top-level csv files.
+    """
+    with open(mrbayes_csv, 'w') as mb_csv:
+        for row_csv in mrbayes_rows:
+            if os.path.exists(row_csv):
+                with open(row_csv) as fp:
+                    mb_csv.write(fp.read())
 
     log.info('Create control.json')
-    check_call(['python', extract_ess_like, '-o', ess_calls_csv]+controls, cwd=dir)
-    check_call(['python', extract_ess, '-o', ess_csv]+controls, cwd=dir)
-
-    log.info('Create comp.csv')
-    with open(posterior_comparison_csv, 'w') as out:
-        a = subprocess.Popen(ppcomps, stdout=out)
-        a.wait()
-
-    log.info('Create pp_annot.csv')
-    with open(os.path.join(arg.output, 'pp_comparison.csv'), 'w') as out:
-        a = subprocess.Popen(pps, stdout=out)
-        a.wait()
-
-    log.info('Create asdsf.csv')
-    with open(os.path.join(arg.output, 'asdsf.csv'), 'w') as out:
-        a = subprocess.Popen(asdsfs, stdout=out)
-        a.wait()
-
-    log.info('Create probs.csv')
-    with open(os.path.join(arg.output, 'probs.csv'), 'w') as out:
-        a = subprocess.Popen(probs, stdout=out)
-        a.wait()
+    check_call(['python', extract_ess_like, '-o', ess_calls_csv]+existing(controls), cwd=dir)
+    check_call(['python', extract_ess, '-o', ess_csv]+existing(controls), cwd=dir)
+
+    with results.ResultsStore(results_db) as store:
+        log.info('Create comp.csv')
+        export_results(store, 'topology_distances', ppcomps, posterior_comparison_csv)
+
+        log.info('Create pp_annot.csv')
+        export_results(store, 'split_pps', pps, pp_comparison_csv)
+
+        log.info('Create asdsf.csv')
+        export_results(store, 'asdsf', asdsfs, os.path.join(arg.output, 'asdsf.csv'))
+
+        log.info('Create probs.csv')
+        export_results(store, 'probs', probs, os.path.join(arg.output, 'probs.csv'))
+
+
+def existing(paths):
+    """
+    Paths which were actually produced; steps may have failed or been skipped.
+    """
+    result = [p for p in paths if os.path.exists(p)]
+    if len(result) < len(paths):
+        log.warning('%d of %d files missing', len(paths) - len(result), len(paths))
+    return result
+
+
+def export_results(store, table, outputs, path):
+    """
+    Write the rows of ``table`` from ``outputs``, ``(csv, metadata)`` pairs,
+    to ``path``. Outputs whose rows were not recorded in the results
+    database, such as those of steps run before it existed, or which have
+    been rewritten since, are read from their csv.
+    """
+    paths = existing([output for output, _ in outputs])
+    recorded = store.outputs(table)
+    for output, metadata in outputs:
+        stamp = results.file_stamp(output)
+        if stamp is not None and recorded.get(output) != stamp:
+            store.record_csv(table, output, metadata)
+    with open(path, 'w') as fp:
+        store.export_csv(table, fp, paths)
+
+
+def record_results(table, output, rows, metadata):
+    """
+    Add the rows of ``output`` to the results database, as soon as the step
+    which produced them finishes. If the database can't be written, or
+    ``record_to_db`` is off, the rows are left to :func:`export_results` to
+    read from ``output``.
+    """
+    if not record_to_db:
+        return
+    try:
+        with results.ResultsStore(results_db) as store:
+            store.record(table, output, rows, metadata)
+    except results.DatabaseError as e:
+        log.warning('%s: not recorded in %s: %s', output, results_db, e)
+
+
+def compare_topologies(reference_tree, posterior, output, metadata, burnin=0):
+    """
+    Write distances between the trees in ``posterior`` and ``reference_tree``,
+    decorated with ``metadata``, to ``output``.
+    """
+    rows = list(topology.compare_to_reference(reference_tree, [posterior], nexus_burnin=burnin))
+    write_decorated(output, topology.HEADER, rows, metadata)
+    record_results('topology_distances', output, rows, metadata)
+
+
+def compare_posteriors(mb_t, runs):
+    """
+    Compare split frequencies of posteriors with the MrBayes run ``mb_t``,
+    writing the ASDSF and split posterior probabilities. ``runs`` holds a
+    ``(posterior, asdsf_csv, pp_csv, pp_annot_csv, metadata)`` tuple for
+    each posterior.
+    """
+    outputs = dict((run[0], run[1:]) for run in runs)
+    for posterior, asdsf_rows, pp_rows in asdsf.compare_posteriors_batch(
+            mb_t, [run[0] for run in runs]):
+        asdsf_csv, pp_csv, pp_annot_csv, metadata = outputs[posterior]
+        write_decorated(asdsf_csv, asdsf.ASDSF_HEADER, asdsf_rows, metadata)
+        write_decorated(pp_csv, asdsf.PP_HEADER, pp_rows, [])
+        write_decorated(pp_annot_csv, asdsf.PP_HEADER, pp_rows, metadata)
+        record_results('asdsf', asdsf_csv, asdsf_rows, metadata)
+        record_results('split_pps', pp_annot_csv, pp_rows, metadata)
+
+
+def run_sts(cmd, control, method, trim_count, trim_taxon, keep_count, particle_factor, n_taxa, tree, files):
+    print(' '.join(cmd))
+
+    start = timer()
+    try:
+        check_call(cmd)
+    except subprocess.CalledProcessError:
+        sys.stderr.write('FAILED\n')
+        raise
+    end = timer()
+    total_time = end - start
+    print('Time: {}'.format(total_time))
+
+    write_control(control, method, trim_count, trim_taxon, keep_count, particle_factor,
+                  n_taxa, tree, files, total_time)
+
+
+def write_probs(jsonf, probs_csv, c, n, trim_count, particle_factor, method, metadata):
+    cols = stscolumns.load_columns(jsonf, ['proposals.T', 'proposals.newLogLike',
+                                           'trees.particleID'])
+    loggPs = cols['proposals.newLogLike'][cols['proposals.T'] == trim_count].tolist()
+    ids = cols['trees.particleID'].tolist()
+
+    with open(probs_csv, 'w') as ll:
+        keys = ['trim_taxon', 'n_taxa', 'trim_count', 'particle_factor', 'proposal_method_name']
+        header = [str(c), str(n), str(trim_count), str(particle_factor), method]
+        row_base = {keys[i]: header[i] for i in range(len(header))}
+
+        w = csv.DictWriter(ll, keys + ['logP'])
+        w.writeheader()
+        for idx in ids:
+            row = row_base.copy()
+            row['logP'] = loggPs[idx]
+            w.writerow(row)
+
+    record_results('probs', probs_csv, [[loggPs[idx]] for idx in ids], metadata)
+
+
+def run_sequential_mrbayes(jsonf, nex, tree_count_dir_part, n, i, c, cc, trim_count, row_csv):
+    """
+    Run MrBayes on the alignment with the last ``trim_count - cc`` taxa added
+    by sts-online removed, writing the MrBayes time and ASDSF to ``row_csv``.
+    """
+    order = stscolumns.load_columns(jsonf, ['generations.sequence'])['generations.sequence'].tolist()
+
+    length = 30000000
+    base = '{}taxon-0{}'.format(n, i)
+    nexus = base + '.nex'
+
+    trim_nex = os.path.join(tree_count_dir_part, '{}taxon-0{}.nex'.format(n, i))
+    trim_mb = os.path.join(tree_count_dir_part, '{}taxon-0{}.mb'.format(n, i))
+
+    if cc == trim_count:
+        copyfile(nex, trim_nex)
+    else:
+        alignment.write_subsets(nex, [(order[cc:], trim_nex)])
+
+    t = MRBAYES_TEMPLATE.format(nexus=nexus, out_base=base, extra='', length=length,
+                                samplefreq=length // 1000, printfreq=length // 10000,
+                                nruns=2, nchains=1, diagnfreq=length / 2)
+    print(trim_mb)
+    with open(trim_mb, 'w') as fp:
+        fp.write(t)
+
+    start = timer()
+    check_call(['mb', base+'.mb'], cwd=tree_count_dir_part)
+    end = timer()
+    total_time = end - start
+    print('Time: {}'.format(total_time))
+
+    asdsfv = -1
+    pattern = re.compile(r'.+(\d+\.\d+)$')
+    with open(os.path.join(tree_count_dir_part, '{}taxon-0{}.mcmc'.format(n, i))) as fp:
+        for line in fp:
+            line = line.rstrip('\n').rstrip('\r')
+            m = pattern.match(line)
+            if m:
+                asdsfv = m.group(1)
+
+    with open(row_csv, 'w') as fp:
+        fp.write('{},{},{},{},{},{}\n'.format(i, n, c, cc, total_time, asdsfv))
 
 
 def write_control(filename, method, trim_count, trim_taxon, keep_count, particle_factor, n_taxa, tree, files, tt):
@@ -0,0 +1,6 @@
+"""
+Analyses of sts-online and MrBayes posteriors.
+
+The scripts in ``bin`` are command-line wrappers around these modules;
+``run_simulations.py`` calls them directly.
+"""
@@ -0,0 +1,201 @@
+"""
+DNA alignments held as one compact array.
+
+An :class:`Alignment` stores each sequence as a row of indices into
+:data:`SYMBOLS`. Alignments are written as FASTA, NEXUS or relaxed PHYLIP by
+:func:`write_alignment`, and NEXUS and FASTA files are read back by
+:func:`read_nexus` and :func:`read_fasta`.
+:func:`write_subsets` reads an alignment once and writes a copy without each
+of several sets of taxa, as the trimmed alignments of the sweep need.
+"""
+import collections
+import os.path
+import re
+
+import numpy as np
+
+# Nucleotides first, so that simulated states 0-3 are A, C, G and T
+SYMBOLS = b'ACGTN?-'
+
+_CODES = np.frombuffer(SYMBOLS, dtype=np.uint8)
+
+# Index in SYMBOLS of each byte, -1 for bytes which are not symbols
+_INDEX = np.empty(256, dtype=np.int16)
+_INDEX.fill(-1)
+_INDEX[_CODES] = np.arange(len(_CODES))
+_INDEX[np.frombuffer(SYMBOLS.lower(), dtype=np.uint8)] = np.arange(len(_CODES))
+
+
+class Alignment(collections.namedtuple('Alignment', ['labels', 'states'])):
+    """
+    Sequences as a ``len(labels)`` x sites array of indices into
+    :data:`SYMBOLS`.
+    """
+    __slots__ = ()
+
+    @property
+    def n_sites(self):
+        return self.states.shape[1]
+
+    def sequences(self):
+        """
+        List of the sequences as strings.
+        """
+        chars = np.ascontiguousarray(_CODES[self.states])
+        rows = chars.view('S{0}'.format(max(1, self.n_sites))).ravel()
+        return [str(s.decode('ascii')) for s in rows.tolist()]
+
+    def without(self, taxa):
+        """
+        The alignment without the sequences labelled ``taxa``.
+        """
+        taxa = set(taxa)
+        missing = taxa.difference(self.labels)
+        if missing:
+            raise ValueError('Taxa not in the alignment: {0}'.format(
+                ', '.join(sorted(missing))))
+        keep = [i for i, label in enumerate(self.labels) if label not in taxa]
+        return Alignment([self.labels[i] for i in keep], self.states[keep])
+
+
+def encode(sequences):
+    """
+    Array of the indices in :data:`SYMBOLS` of the characters of
+    ``sequences``, which must all have the same length.
+    """
+    lengths = set(len(s) for s in sequences)
+    if len(lengths) > 1:
+        raise ValueError('Sequences differ in length: {0}'.format(sorted(lengths)))
+    data = ''.join(sequences).encode('ascii')
+    result = _INDEX[np.frombuffer(data, dtype=np.uint8)]
+    if (result < 0).any():
+        bad = set(data[i:i + 1].decode('ascii') for i in np.flatnonzero(result < 0))
+        raise ValueError('Unknown characters: {0}'.format(' '.join(sorted(bad))))
+    return result.astype(np.uint8).reshape(len(sequences), -1)
+
+
+def _token(label):
+    """
+    ``label`` as a single word, with spaces written as underscores as in
+    Newick and NEXUS.
+    """
+    return label.replace(' ', '_')
+
+
+def write_fasta(alignment, fp, width=60):
+    for label, seq in zip(alignment.labels, alignment.sequences()):
+        fp.write('>{0}\n'.format(_token(label)))
+        for i in range(0, len(seq), width):
+            fp.write(seq[i:i + width] + '\n')
+
+
+def _nexus_label(label):
+    label = _token(label)
+    if all(c.isalnum() or c in '._-' for c in label):
+        return label
+    return "'{0}'".format(label.replace("'", "''"))
+
+
+def write_nexus(alignment, fp):
+    labels = [_nexus_label(label) for label in alignment.labels]
+    width = max(len(label) for label in labels)
+    fp.write('#NEXUS\nbegin data;\n')
+    fp.write('    dimensions ntax={0} nchar={1};\n'.format(len(labels), alignment.n_sites))
+    fp.write('    format datatype=dna missing=? gap=-;\nmatrix\n')
+    for label, seq in zip(labels, alignment.sequences()):
+        fp.write('{0:<{1}} {2}\n'.format(label, width, seq))
+    fp.write(';\nend;\n')
+
+
+def write_phylip(alignment, fp):
+    """
+    Write sequential relaxed PHYLIP, in which labels may be longer than 10
+    characters and end at the first space.
+    """
+    labels = [_token(label) for label in alignment.labels]
+    width = max(len(label) for label in labels)
+    fp.write(' {0} {1}\n'.format(len(labels), alignment.n_sites))
+    for label, seq in zip(labels, alignment.sequences()):
+        fp.write('{0:<{1}}  {2}\n'.format(label, width, seq))
+
+
+writers = {'.fasta': write_fasta, '.fa': write_fasta,
+           '.nex': write_nexus, '.nexus': write_nexus,
+           '.phy': write_phylip, '.phyx': write_phylip}
+
+
+def write_alignment(alignment, path):
+    """
+    Write ``alignment`` to ``path``, in the format of its extension.
+    """
+    write = writers[os.path.splitext(path)[1]]
+    with open(path, 'w') as fp:
+        write(alignment, fp)
+
+
+_NEXUS_TOKEN = re.compile(r"'((?:[^']|'')*)'|\[[^\]]*\]|(;)|([^\s;'\[]+)")
+
+
+def read_nexus(fp):
+    """
+    Read the matrix of the DATA or CHARACTERS block of the NEXUS file
+    ``fp``, sequential or interleaved, into an :class:`Alignment`. Labels
+    are read as in :mod:`stsanalysis.newick`.
+    """
+    text = fp.read()
+    m = re.search(r'\bmatrix\b', text, re.I)
+    if m is None:
+        raise ValueError('No matrix in NEXUS file')
+    labels = []
+    chunks = {}
+    label = None
+    row_end = None
+    for t in _NEXUS_TOKEN.finditer(text, m.end()):
+        quoted, end, word = t.groups()
+        if end is not None:
+            break
+        if quoted is None and word is None:
+            continue                  # comment
+        # A row with a sequence ends at the end of its line
+        if row_end is not None and '\n' in text[row_end:t.start()]:
+            label = row_end = None
+        if label is None:
+            label = (quoted.replace("''", "'") if quoted is not None
+                     else word.replace('_', ' '))
+            if label not in chunks:
+                labels.append(label)
+                chunks[label] = []
+        else:
+            chunks[label].append(word)
+            row_end = t.end()
+    return Alignment(labels, encode([''.join(chunks[label]) for label in labels]))
+
+
+def read_fasta(fp):
+    """
+    Read the FASTA file ``fp`` into an :class:`Alignment`. Labels are the
+    first word of each description, with underscores as spaces.
+    """
+    labels = []
+    chunks = []
+    for line in fp:
+        line = line.strip()
+        if line.startswith('>'):
+            labels.append(line[1:].split()[0].replace('_', ' '))
+            chunks.append([])
+        elif line:
+            if not chunks:
+                raise ValueError('Sequence before the first FASTA header')
+            chunks[-1].append(line)
+    return Alignment(labels, encode([''.join(c) for c in chunks]))
+
+
+def write_subsets(path, subsets):
+    """
+    Read the NEXUS alignment ``path`` once, and for each ``(taxa, output)``
+    pair in ``subsets`` write the alignment without ``taxa`` to ``output``.
+    """
+    with open(path) as fp:
+        alignment = read_nexus(fp)
+    for taxa, output in subsets:
+        write_alignment(alignment.without(taxa), output)
@@ -0,0 +1,169 @@
+"""
+Average and maximum standard deviation of split frequencies (ASDSF, MSDSF)
+between posterior samples of trees, and the posterior probability of each
+split in each sample.
+"""
+import collections
+import logging
+import os.path
+
+import numpy as np
+
+from stsanalysis import newick, splitcache, splits, topology
+
+log = logging.getLogger('asdsf')
+
+ASDSFResult = collections.namedtuple('ASDSFResult',
+                                     ['asdsf', 'msdsf', 'pp_table'])
+
+ASDSF_HEADER = ('type', 'file1', 'file2', 'asdsf', 'msdsf')
+PP_HEADER = ('type', 'file1', 'file2', 'pp1', 'pp2', 'split')
+
+
+def sample_trees(path, burnin=0):
+    """
+    Yield ``(tree, log_weight)`` for each tree of a MrBayes tree file after
+    the first ``burnin``, or each particle of an sts-online result, as a
+    :class:`newick.Tree`. MrBayes trees have log weight 0.
+    """
+    read = topology.tree_readers[os.path.splitext(path)[1]]
+    return read(path, burnin, newick.TaxonNamespace())
+
+
+def weights_of_log_weights(log_weights):
+    log_weights = np.asarray(log_weights, dtype=float)
+    return np.exp(log_weights - log_weights.max())
+
+
+def _cached_split_lists(path, burnin, taxa):
+    """
+    Split tuples and log weights of the samples of ``path``, read from its
+    :mod:`splitcache`. Trees with the same topology share a tuple.
+    """
+    matrix = splitcache.open_split_matrix(path)
+    if matrix.taxa.labels != taxa.labels:
+        raise ValueError('{0}: taxa differ from the other files'.format(path))
+    rows = np.arange(0 if path.endswith('.json') else burnin, len(matrix))
+    topologies = matrix.topology[rows]
+    # First sample of each topology, in order
+    first = np.sort(np.unique(topologies, return_index=True)[1])
+    masks, inverse = matrix.unique_splits(rows[first], matrix.nontrivial[rows[first]])
+    by_topology = {}
+    for t, edges in zip(topologies[first].tolist(), inverse.tolist()):
+        by_topology[t] = tuple(masks[e] for e in edges if e >= 0)
+    return [by_topology[t] for t in topologies.tolist()], matrix.log_weights[rows]
+
+
+def split_frequencies(paths, burnin=0, weighted=True, table=None, cache=None,
+                      split_cache=False):
+    """
+    :class:`splits.SplitFrequencies` with one sample per file in ``paths``,
+    added to ``table`` if given. ``burnin`` is dropped from MrBayes files;
+    sts-online particles are weighted by their log weights if ``weighted``
+    is set. Splits are encoded once per topology, using the
+    :class:`splits.TopologyCache` ``cache`` if given, or read from each
+    file's :mod:`splitcache` if ``split_cache`` is set.
+    """
+    for path in paths:
+        log.info('Reading splits from %s', path)
+        if split_cache:
+            if table is None:
+                table = splits.SplitFrequencies(
+                    splitcache.open_split_matrix(path).taxa)
+            masks, log_weights = _cached_split_lists(path, burnin, table.taxa)
+        else:
+            masks = []
+            log_weights = []
+            for tree, log_weight in sample_trees(path, burnin):
+                if table is None:
+                    table = splits.SplitFrequencies(splits.TaxonIndex.of_tree(tree))
+                if cache is None:
+                    cache = splits.TopologyCache(table.taxa)
+                masks.append(cache.splits(tree))
+                log_weights.append(log_weight)
+            log.debug('%s: %d trees, %d topologies so far', path, len(masks), len(cache))
+        if not len(masks):
+            raise ValueError('{0}: no trees after burn-in'.format(path))
+        weights = weights_of_log_weights(log_weights) if weighted else None
+        table.add_sample(masks, weights)
+    return table
+
+
+def _result(table, min_support):
+    freqs = table.frequencies()
+    asdsf, msdsf, keep = splits.sdsf(freqs, min_support=min_support)
+    pp_table = [(name, row[0], row[1])
+                for name, row, k in zip(table.names(), freqs.tolist(), keep) if k]
+    return ASDSFResult(asdsf, msdsf, pp_table)
+
+
+def calculate_asdsf_msdsf(tree_path1, tree_path2, min_support=0.1, skip=0,
+                          weighted=True):
+    """
+    Compare the posteriors in two tree files.
+
+    Returns an :class:`ASDSFResult`, whose ``pp_table`` lists ``(split, pp1,
+    pp2)`` for each split with support at least ``min_support`` in either
+    file.
+    """
+    table = split_frequencies([tree_path1, tree_path2], burnin=skip,
+                              weighted=weighted)
+    return _result(table, min_support)
+
+
+def compare_to_reference(reference_tree, paths, burnin=250, min_support=0.1,
+                         weighted=True, split_cache=False):
+    """
+    Compare each posterior in ``paths`` with the MrBayes posterior
+    ``reference_tree``, which is read only once.
+
+    Yields ``(path, result)`` pairs, where ``result`` is an
+    :class:`ASDSFResult` as from :func:`calculate_asdsf_msdsf`. Splits are
+    read from the files' :mod:`splitcache` if ``split_cache`` is set.
+    """
+    reference = split_frequencies([reference_tree], burnin=burnin, weighted=weighted,
+                                  split_cache=split_cache)
+    cache = splits.TopologyCache(reference.taxa)
+    for path in paths:
+        table = split_frequencies([path], burnin=burnin, weighted=weighted,
+                                  table=reference.copy(), cache=cache,
+                                  split_cache=split_cache)
+        yield path, _result(table, min_support)
+
+
+def _comparison_rows(reference_tree, path, result):
+    if path.endswith('.t'):
+        comparison = 'mrbayes-mrbayes'
+    else:
+        comparison = 'mrbayes-sts'
+    asdsf_rows = [(comparison, reference_tree, path, result.asdsf, result.msdsf)]
+    pp_rows = [(comparison, reference_tree, path, pp1, pp2, split)
+               for split, pp1, pp2 in result.pp_table]
+    return asdsf_rows, pp_rows
+
+
+def compare_posteriors(reference_tree1, reference_tree2, burnin=250, weighted=True):
+    """
+    Compare the MrBayes posterior ``reference_tree1`` with either a second
+    MrBayes run (a ``.t`` file) or an sts-online result.
+
+    ``burnin`` trees are dropped from MrBayes files. sts-online particles
+    count by their weights unless ``weighted`` is false. Returns a list of
+    rows matching :data:`ASDSF_HEADER`, and a list matching
+    :data:`PP_HEADER`.
+    """
+    (_, result), = compare_to_reference(reference_tree1, [reference_tree2], burnin=burnin,
+                                        weighted=weighted)
+    return _comparison_rows(reference_tree1, reference_tree2, result)
+
+
+def compare_posteriors_batch(reference_tree, paths, burnin=250, weighted=True,
+                             split_cache=False):
+    """
+    As :func:`compare_posteriors`, comparing every file in ``paths`` with
+    ``reference_tree``. Yields ``(path, asdsf_rows, pp_rows)``.
+    """
+    for path, result in compare_to_reference(reference_tree, paths, burnin=burnin,
+                                             weighted=weighted, split_cache=split_cache):
+        asdsf_rows, pp_rows = _comparison_rows(reference_tree, path, result)
+        yield path, asdsf_rows, pp_rows
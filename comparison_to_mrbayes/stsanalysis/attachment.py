@@ -0,0 +1,98 @@
+"""
+Likelihood of attaching a taxon at the middle of each edge of a tree.
+
+For each tree, :func:`scan_tree` prunes the taxon, computes the partials of
+the rest of the tree once with a :class:`likelihood.TreeLikelihood`, and
+scores putting the taxon back halfway along every edge, at each of several
+pendant lengths. Edges are ranked by log likelihood, best first, separately
+for each pendant length, and the edge on which the taxon sat in the tree is
+marked. These are the rows ``src/mid_edge_test.cc`` wrote, for judging how
+well a guided proposal could place a new taxon.
+"""
+import numpy as np
+
+from stsanalysis import likelihood, newick
+
+HEADER = ('tree', 'node', 'same_as_tree', 'd')
+
+PENDANT_LENGTHS = (0.0, 0.5)
+
+# Column suffixes of the pendant lengths mid_edge_test.cc used
+_SUFFIXES = {0.0: '', 0.5: '_half'}
+
+
+def header(pendant_lengths=PENDANT_LENGTHS):
+    """
+    Columns of the rows of :func:`scan_tree`, with a log likelihood and a
+    rank for each of ``pendant_lengths``.
+    """
+    result = list(HEADER)
+    for length in pendant_lengths:
+        suffix = _SUFFIXES.get(length, '_{0:g}'.format(length))
+        result.extend(['mid_edge_log_like' + suffix, 'rank' + suffix])
+    return result
+
+
+def _attachment_edge(tree, leaf, pruned, index, edges):
+    """
+    Position in ``edges`` of the edge of the pruned tree on which ``leaf``
+    sat in ``tree``, or None if it was attached to a node of degree more
+    than 3.
+    """
+    children = tree.children()
+    parent = tree.parent[leaf]
+    root = len(tree) - 1
+    pruned_root = len(pruned) - 1
+    if index[parent] >= 0:
+        # The parent kept other children: only a root left with two has
+        # merged into an edge
+        if parent != root or len(pruned.children()[pruned_root]) != 2:
+            return None
+        node = pruned_root
+    elif parent == root:
+        node = pruned_root
+    else:
+        sibling, = [c for c in children[parent] if c != leaf]
+        node = index[sibling]
+
+    for i, e in enumerate(edges):
+        if node == pruned_root:
+            if e.opposite is not None:
+                return i
+        elif e.node == node or e.opposite == node:
+            return i
+    return None
+
+
+def scan_tree(tree, tips, taxon, pendant_lengths=PENDANT_LENGTHS, weights=None):
+    """
+    Rows of :func:`header` (without the tree column) for attaching the leaf
+    labelled ``taxon`` at the middle of each edge of the rest of the
+    :class:`newick.Tree` ``tree``. ``tips`` are the partials of the
+    alignment, from :func:`likelihood.tip_partials`, and ``weights`` the
+    counts of its site patterns.
+    """
+    t = tree.taxa.index.get(taxon.lower())
+    leaves = np.flatnonzero(tree.taxon == t) if t is not None else []
+    if len(leaves) != 1:
+        raise ValueError('Taxon {0} is not a leaf of the tree'.format(taxon))
+    leaf = leaves[0]
+    pruned, index = newick.prune(tree, leaf)
+
+    like = likelihood.TreeLikelihood(pruned, tips, weights)
+    edges = like.edges()
+    log_likes = like.mid_edge_log_likelihoods(tips[tree.labels[leaf]],
+                                              pendant_lengths, edges)
+    ranks = np.empty(log_likes.shape, dtype=np.intp)
+    for j in range(log_likes.shape[1]):
+        order = np.argsort(-log_likes[:, j], kind='mergesort')
+        ranks[order, j] = np.arange(len(order))
+
+    actual = _attachment_edge(tree, leaf, pruned, index, edges)
+    rows = []
+    for i, e in enumerate(edges):
+        row = [e.node, 'yes' if i == actual else 'no', e.length]
+        for ll, rank in zip(log_likes[i].tolist(), ranks[i].tolist()):
+            row.extend([ll, rank])
+        rows.append(row)
+    return rows
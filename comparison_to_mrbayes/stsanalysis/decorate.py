@@ -0,0 +1,30 @@
+"""
+Annotate csv rows with run metadata.
+"""
+import csv
+
+
+def decorate(header, rows, metadata):
+    """
+    Append the values of ``metadata``, a list of ``(key, value)`` pairs, to
+    ``header`` and each of ``rows``.
+
+    Returns the new header and an iterator over the new rows.
+    """
+    keys = [k for k, _ in metadata]
+    values = [v for _, v in metadata]
+    return list(header) + keys, (list(row) + values for row in rows)
+
+
+def write_csv(fp, header, rows):
+    w = csv.writer(fp, lineterminator='\n')
+    w.writerow(header)
+    w.writerows(rows)
+
+
+def write_decorated(path, header, rows, metadata):
+    """
+    Write ``header`` and ``rows``, decorated with ``metadata``, to ``path``.
+    """
+    with open(path, 'w') as fp:
+        write_csv(fp, *decorate(header, rows, metadata))
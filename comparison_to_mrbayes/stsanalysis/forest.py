@@ -0,0 +1,139 @@
+"""
+Likelihood of forests cut from posterior trees, as ``natural_extension.cc``
+computed it.
+
+A forest is a set of disjoint clades of one tree, each scored as a tree of
+its own, rooted where it was cut off; its log likelihood is the sum of
+theirs. Cutting an edge of a tree leaves the clades on its two sides, whose
+partials are the down and up partials of a
+:class:`likelihood.TreeLikelihood`, so :meth:`ForestLikelihood.clades`
+scores every such clade of a tree in one pass and caches the result by
+clade. Further forests of the same tree, such as many :func:`random_split`
+draws, are then sums of lookups. A single leaf has the likelihood of its
+sequence under the stationary distribution, which is computed once per
+taxon for the whole alignment.
+
+Clades are bitmasks over the indices of the tree's
+:class:`newick.TaxonNamespace`.
+"""
+import numpy as np
+
+from stsanalysis import likelihood
+
+
+def node_masks(tree):
+    """
+    Clade below each node of ``tree``, as a bitmask of taxon indices.
+    """
+    masks = [0] * len(tree)
+    for i, (p, t) in enumerate(zip(tree.parent.tolist(), tree.taxon.tolist())):
+        if t >= 0:
+            masks[i] |= 1 << t
+        if p >= 0:
+            masks[p] |= masks[i]
+    return masks
+
+
+def clade_labels(tree, mask):
+    labels = tree.taxa.labels
+    return sorted(labels[i] for i in range(len(labels)) if mask >> i & 1)
+
+
+class ForestLikelihood(object):
+    """
+    Log likelihoods of clades of trees for ``alignment``, compressed to its
+    site patterns.
+    """
+
+    def __init__(self, alignment):
+        patterns, self.weights = likelihood.compress(alignment)
+        self.tips = likelihood.tip_partials(patterns)
+        labels = list(self.tips)
+        stationary = np.log(np.array([self.tips[label] for label in labels])
+                            .dot(likelihood.PI)).dot(self.weights)
+        self.leaf_log_likelihoods = dict(zip(labels, stationary.tolist()))
+        self._clades = {}
+
+    def _score(self, log_partials, log_scale):
+        return (log_partials + log_scale).dot(self.weights)
+
+    def clades(self, tree):
+        """
+        Dictionary from each clade on either side of an edge of ``tree``,
+        and from the whole tree, to its log likelihood. Computed once per
+        distinct tree.
+        """
+        key = (tree.shape, tree.length.tobytes())
+        result = self._clades.get(key)
+        if result is not None:
+            return result
+
+        like = likelihood.TreeLikelihood(tree, self.tips, self.weights)
+        like.compute_up()
+        masks = node_masks(tree)
+        everything = masks[-1]
+        labels = tree.labels
+        result = {everything: like.log_likelihood()}
+        for i in range(len(tree) - 1):
+            if labels[i] is not None:
+                below = self.leaf_log_likelihoods[labels[i]]
+            else:
+                below = self._score(np.log(like.down[i].dot(likelihood.PI)),
+                                    like.down_scale[i])
+            result[masks[i]] = below
+            result[everything ^ masks[i]] = self._score(
+                np.log(like.up[i].dot(likelihood.PI)), like.up_scale[i])
+        self._clades[key] = result
+        return result
+
+    def log_likelihood(self, tree, forest):
+        """
+        Log likelihood of the ``forest`` of clades of ``tree``.
+        """
+        clades = self.clades(tree)
+        try:
+            return sum(clades[mask] for mask in forest)
+        except KeyError as e:
+            raise ValueError('{0} is not a clade of the tree'.format(
+                ' '.join(clade_labels(tree, e.args[0]))))
+
+
+def split_on(tree, node):
+    """
+    The two clades left by cutting the edge above ``node``, and the nodes
+    whose edges are cut: the edge through a bifurcating root is cut whole.
+    """
+    masks = node_masks(tree)
+    root = len(tree) - 1
+    children = tree.children()[root]
+    cut = [node]
+    if tree.parent[node] == root and len(children) == 2:
+        cut = children
+    return [masks[node], masks[root] ^ masks[node]], cut
+
+
+def random_split(tree, random_state):
+    """
+    :func:`split_on` an edge of the unrooted ``tree`` chosen uniformly with
+    the :class:`numpy.random.RandomState` ``random_state``.
+    """
+    root = len(tree) - 1
+    children = tree.children()[root]
+    nodes = list(range(root))
+    if len(children) == 2:
+        nodes.remove(children[1])
+    return split_on(tree, nodes[random_state.randint(len(nodes))])
+
+
+def cherries(tree):
+    """
+    :func:`split_on` the internal edge of a four-taxon ``tree``, into its
+    two cherries.
+    """
+    if np.count_nonzero(tree.taxon >= 0) != 4:
+        raise ValueError('Tree does not have four taxa')
+    masks = node_masks(tree)
+    for i, mask in enumerate(masks[:-1]):
+        if bin(mask).count('1') == 2:
+            return split_on(tree, i)
+    raise ValueError('No internal edge found')
@@ -0,0 +1,361 @@
+"""
+Likelihood of DNA alignments on :class:`newick.Tree` trees under the
+Jukes-Cantor (JC69) model with a constant rate across sites, the model of
+the simulations and of the pipeline's MrBayes runs.
+
+Partial likelihoods are arrays of sites x 4 states, in the order of
+:data:`alignment.SYMBOLS`, with a log scale factor per site so that large
+trees don't underflow. A :class:`TreeLikelihood` computes, in one postorder
+pass, the partials of the subtree below each node and, when first needed, in
+one preorder pass, the partials of the rest of the tree at each node's
+parent. Together these give the partials at both ends of every edge, so the
+likelihood of attaching a new leaf anywhere in the tree costs no more than
+combining them: :meth:`TreeLikelihood.mid_edge_log_likelihoods` scores
+attachment at the middle of every edge, for several pendant lengths, at
+once, and :meth:`TreeLikelihood.pendant_log_likelihoods` varies the length
+of one edge of the tree.
+
+Trees are taken as unrooted. The two edges of a bifurcating root are one
+edge, whose length is the sum of theirs.
+
+Sites with the same pattern of states have the same likelihood, so
+:func:`compress` reduces an alignment to its distinct columns and their
+counts. A :class:`LikelihoodScorer` scores many trees against one compressed
+alignment, reusing its partial buffers from tree to tree, and
+:func:`score_trees` splits a list of trees over worker processes.
+"""
+import collections
+import multiprocessing
+
+import numpy as np
+
+from stsanalysis import newick
+from stsanalysis.alignment import Alignment, SYMBOLS
+
+# Stationary frequencies of JC69
+PI = np.repeat(0.25, 4)
+
+# Partials of each symbol: nucleotides are known, anything else is missing
+_TIP = np.vstack([np.eye(4), np.ones((len(SYMBOLS) - 4, 4))])
+
+
+def tip_partials(alignment):
+    """
+    Dictionary from the labels of the :class:`alignment.Alignment`
+    ``alignment`` to the partials of their sequences.
+    """
+    return dict((label, _TIP[states])
+                for label, states in zip(alignment.labels, alignment.states))
+
+
+def compress(alignment):
+    """
+    The distinct site patterns of ``alignment``: an :class:`Alignment` of its
+    distinct columns, in order of first appearance, and the number of sites
+    with each.
+    """
+    columns = np.ascontiguousarray(alignment.states.T)
+    # Each column as one opaque value of its bytes, whatever the dtype
+    keys = columns.view(np.dtype((np.void, columns.shape[1] * columns.itemsize))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    # Renumber in order of first appearance
+    by_first = np.argsort(first)
+    rank = np.empty_like(by_first)
+    rank[by_first] = np.arange(len(by_first))
+    counts = np.bincount(rank[inverse], minlength=len(first)).astype(float)
+    return Alignment(alignment.labels, alignment.states[:, first[by_first]]), counts
+
+
+def jc69(t):
+    """
+    JC69 transition matrices for the branch lengths ``t``, an array of shape
+    ``t.shape + (4, 4)``. Missing lengths are 0.
+    """
+    t = np.nan_to_num(np.asarray(t, dtype=float))
+    e = np.exp(-4.0 / 3.0 * t)[..., None, None]
+    return 0.25 + (np.eye(4) - 0.25) * e
+
+
+def _along_lengths(partials, t):
+    """
+    Partials at the far end of edges of lengths ``t`` from ``partials``,
+    broadcast together: with JC69, the product with the transition matrix
+    is a weighted average of the partials and their mean.
+    """
+    e = np.exp(-4.0 / 3.0 * np.nan_to_num(np.asarray(t, dtype=float)))[..., None, None]
+    mean = partials.mean(axis=-1)[..., None]
+    return mean + e * (partials - mean)
+
+
+def _rescale(partials):
+    """
+    ``partials`` divided by their maximum at each site, and the log of the
+    maxima.
+    """
+    scale = partials.max(axis=-1)
+    scale[scale == 0] = 1.0
+    return partials / scale[..., None], np.log(scale)
+
+
+def _along(partials, transition):
+    """
+    Partials at the far end of an edge with transition matrix ``transition``.
+    """
+    return partials.dot(transition.T)
+
+
+# An edge of the unrooted tree, identified by the node below it. The
+# partials at its far end are those of the rest of the tree at ``node``'s
+# parent, or for the edge through a bifurcating root, those of the subtree
+# below the root's other child ``opposite``.
+Edge = collections.namedtuple('Edge', ['node', 'length', 'opposite'])
+
+
+def _postorder(tree, children, tips, transition, down, messages, scale):
+    """
+    Fill ``down[i]``, the partials of the subtree below each node ``i`` of
+    ``tree``, ``messages[i]``, the same at the parent's end of the edge
+    above ``i``, and their scales. The arrays may be longer than the tree.
+    """
+    labels = tree.labels
+    for i, cs in enumerate(children):
+        if not cs:
+            try:
+                down[i] = tips[labels[i]]
+            except KeyError:
+                raise ValueError('No sequence for leaf {0}'.format(labels[i]))
+            scale[i] = 0.0
+        else:
+            p = messages[cs[0]]
+            s = scale[cs[0]]
+            for c in cs[1:]:
+                p = p * messages[c]
+                s = s + scale[c]
+            down[i], log_scale = _rescale(p)
+            scale[i] = s + log_scale
+        messages[i] = _along(down[i], transition[i])
+
+
+def _n_sites(tips):
+    return len(next(iter(tips.values())))
+
+
+class TreeLikelihood(object):
+    """
+    Partials of the alignment ``tips``, as from :func:`tip_partials`, on the
+    :class:`newick.Tree` ``tree``. ``weights`` are the number of sites with
+    each column of ``tips``, as from :func:`compress` [default: 1 each].
+    """
+
+    def __init__(self, tree, tips, weights=None):
+        self.tree = tree
+        self.children = tree.children()
+        self.transition = jc69(tree.length)
+        n, n_sites = len(tree), _n_sites(tips)
+        self.weights = np.ones(n_sites) if weights is None else weights
+        self.down = np.empty((n, n_sites, 4))
+        self.messages = np.empty_like(self.down)
+        self.down_scale = np.empty((n, n_sites))
+        _postorder(tree, self.children, tips, self.transition,
+                   self.down, self.messages, self.down_scale)
+        self.up = self.up_scale = None
+
+    @property
+    def n_sites(self):
+        return self.down.shape[1]
+
+    def site_log_likelihoods(self):
+        return np.log(self.down[-1].dot(PI)) + self.down_scale[-1]
+
+    def log_likelihood(self):
+        return self.site_log_likelihoods().dot(self.weights)
+
+    def compute_up(self):
+        """
+        Set ``up[i]``, the partials at the parent of node ``i`` of the tree
+        without the subtree below ``i``, and their scales. The root's entry
+        is unused.
+        """
+        parent = self.tree.parent.tolist()
+        root = len(parent) - 1
+        up = np.ones_like(self.down)
+        scale = np.zeros_like(self.down_scale)
+        for i in range(root - 1, -1, -1):
+            p = parent[i]
+            partials = np.ones_like(self.down[i])
+            s = np.zeros_like(self.down_scale[i])
+            if p != root:
+                partials = _along(up[p], self.transition[p])
+                s = s + scale[p]
+            for c in self.children[p]:
+                if c != i:
+                    partials = partials * self.messages[c]
+                    s = s + self.down_scale[c]
+            up[i], log_scale = _rescale(partials)
+            scale[i] = s + log_scale
+        self.up, self.up_scale = up, scale
+
+    def edges(self):
+        """
+        List of the :class:`Edge` of the unrooted tree, in postorder.
+        """
+        root = len(self.tree) - 1
+        length = np.nan_to_num(self.tree.length).tolist()
+        root_children = self.children[root]
+        result = []
+        for i in range(root):
+            if self.tree.parent[i] == root and len(root_children) == 2:
+                if i == root_children[0]:
+                    other = root_children[1]
+                    result.append(Edge(i, length[i] + length[other], other))
+            else:
+                result.append(Edge(i, length[i], None))
+        return result
+
+    def mid_edge_log_likelihoods(self, tip, pendant_lengths, edges=None):
+        """
+        Log likelihood of the tree with a leaf with partials ``tip``
+        attached to the middle of each of ``edges`` [default:
+        :meth:`edges`], by an edge of each of ``pendant_lengths``: an array
+        of edges x pendant lengths.
+        """
+        if self.up is None:
+            self.compute_up()
+        edges = self.edges() if edges is None else edges
+        below = np.array([e.node for e in edges], dtype=np.intp)
+        lengths = np.array([e.length for e in edges])
+
+        # Partials at the far end of each edge, and their scales
+        far = np.array([self.up[e.node] if e.opposite is None else self.down[e.opposite]
+                        for e in edges])
+        far_scale = np.array([self.up_scale[e.node] if e.opposite is None
+                              else self.down_scale[e.opposite] for e in edges])
+        half = lengths / 2.0
+        joint = (_along_lengths(self.down[below], half) *
+                 _along_lengths(far, half) * PI)
+        # The pendant edge's partials are mean + e (tip - mean), as in
+        # _along_lengths, so two sums over states serve every length
+        mean = tip.mean(axis=-1)
+        total = joint.dot(np.ones(4)) * mean
+        diff = np.einsum('esz,sz->es', joint, tip - mean[:, None])
+        e = np.exp(-4.0 / 3.0 * np.asarray(pendant_lengths, dtype=float))
+        site = total + e[:, None, None] * diff
+        scale = (self.down_scale[below] + far_scale).dot(self.weights)
+        return np.log(site).dot(self.weights).T + scale[:, None]
+
+    def pendant_log_likelihoods(self, node, lengths):
+        """
+        Log likelihood of the tree with each of ``lengths`` as the length of
+        the edge above ``node``, usually a leaf, and every other length
+        fixed: an array of lengths. Above a child of a bifurcating root,
+        ``lengths`` replace this child's part of the root's edge.
+        """
+        if self.up is None:
+            self.compute_up()
+        joint = self.up[node] * PI
+        below = self.down[node]
+        # As in mid_edge_log_likelihoods, two sums over states serve every
+        # length
+        mean = below.mean(axis=-1)
+        total = joint.dot(np.ones(4)) * mean
+        diff = (joint * (below - mean[:, None])).dot(np.ones(4))
+        e = np.exp(-4.0 / 3.0 * np.asarray(lengths, dtype=float))
+        site = total + e[:, None] * diff
+        scale = (self.up_scale[node] + self.down_scale[node]).dot(self.weights)
+        return np.log(site).dot(self.weights) + scale
+
+
+def log_likelihood(tree, tips):
+    """
+    Log likelihood of the alignment ``tips`` on the :class:`newick.Tree`
+    ``tree``.
+    """
+    return TreeLikelihood(tree, tips).log_likelihood()
+
+
+class LikelihoodScorer(object):
+    """
+    Log likelihoods of trees for ``alignment``, compressed to its site
+    patterns. Partial buffers are allocated for the largest tree seen and
+    shared by every tree scored.
+    """
+
+    def __init__(self, alignment):
+        patterns, self.weights = compress(alignment)
+        self.tips = tip_partials(patterns)
+        self._children = {}
+        self._buffers = None
+
+    @property
+    def n_patterns(self):
+        return len(self.weights)
+
+    def _buffers_for(self, n):
+        if self._buffers is None or len(self._buffers[0]) < n:
+            down = np.empty((n, self.n_patterns, 4))
+            self._buffers = (down, np.empty_like(down), np.empty((n, self.n_patterns)))
+        return self._buffers
+
+    def log_likelihood(self, tree):
+        """
+        Log likelihood of the :class:`newick.Tree` ``tree``.
+        """
+        # Trees with the same shape have the same children
+        children = self._children.get(tree.shape)
+        if children is None:
+            children = self._children[tree.shape] = tree.children()
+        down, messages, scale = self._buffers_for(len(tree))
+        _postorder(tree, children, self.tips, jc69(tree.length), down, messages, scale)
+        root = len(tree) - 1
+        return (np.log(down[root].dot(PI)) + scale[root]).dot(self.weights)
+
+
+# Scorer and trees of :func:`score_trees`, inherited by its worker processes
+_scorer = None
+_trees = None
+
+
+def _score_range(bounds):
+    start, stop = bounds
+    return start, [_scorer.log_likelihood(tree) for tree in _trees[start:stop]]
+
+
+def score_trees(trees, alignment, processes=1, chunk_size=64):
+    """
+    Array of the log likelihood for ``alignment`` of each of ``trees``,
+    :class:`newick.Tree` instances or Newick strings. A tree repeated as the
+    same object or string is scored once. With ``processes`` other than 1
+    the trees are scored in chunks of ``chunk_size`` by that many worker
+    processes [None: one per CPU].
+    """
+    global _scorer, _trees
+    taxa = newick.TaxonNamespace()
+    unique = collections.OrderedDict()
+    keys = []
+    for tree in trees:
+        key = id(tree) if isinstance(tree, newick.Tree) else tree
+        if key not in unique:
+            unique[key] = tree if isinstance(tree, newick.Tree) else newick.parse(tree, taxa)
+        keys.append(key)
+
+    _scorer = LikelihoodScorer(alignment)
+    _trees = list(unique.values())
+    try:
+        if processes == 1:
+            scores = [_scorer.log_likelihood(tree) for tree in _trees]
+        else:
+            scores = [None] * len(_trees)
+            ranges = [(i, min(i + chunk_size, len(_trees)))
+                      for i in range(0, len(_trees), chunk_size)]
+            pool = multiprocessing.Pool(processes)
+            try:
+                for start, chunk in pool.imap_unordered(_score_range, ranges):
+                    scores[start:start + len(chunk)] = chunk
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        _scorer = _trees = None
+
+    by_key = dict(zip(unique, scores))
+    return np.array([by_key[key] for key in keys], dtype=float)
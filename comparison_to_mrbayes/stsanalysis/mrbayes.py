@@ -0,0 +1,109 @@
+"""
+Streaming readers for MrBayes output: tree samples (``.t``) and parameter
+samples (``.p``).
+
+Burn-in samples are skipped without being parsed. Numbers in exponent
+notation, such as the ``1.0e+00`` MrBayes writes for some branch lengths and
+likelihoods, are read natively, so the files don't need rewriting first.
+"""
+import itertools
+import re
+
+import numpy as np
+
+from stsanalysis import newick
+
+_TREE_STATEMENT = re.compile(r'\s*tree\s+(\S+)\s*=\s*(.*)$', re.I | re.S)
+_TRANSLATE_ENTRY = re.compile(r"\s*([^\s,;]+)\s+('(?:[^']|'')*'|[^\s,;]+)\s*[,;]?")
+
+
+def _translate_entries(text, translate):
+    for m in _TRANSLATE_ENTRY.finditer(text):
+        value = m.group(2)
+        if value.startswith("'"):
+            value = newick.label_of_token(value[1:-1], True)
+        else:
+            value = newick.label_of_token(value)
+        translate[newick.label_of_token(m.group(1))] = value
+
+
+def iter_tree_statements(fp, burnin=0):
+    """
+    Yield ``(name, newick, translate)`` for each tree statement in the trees
+    block of the NEXUS file ``fp``, as written by MrBayes (one statement per
+    line, after an optional translate block), skipping the first ``burnin``.
+    ``translate`` maps the tokens used in the trees to taxon labels, or is
+    None.
+    """
+    translate = None
+    in_translate = False
+    skipped = 0
+    for line in fp:
+        stripped = line.strip()
+        lower = stripped[:10].lower()
+        if lower.startswith('tree '):
+            if skipped < burnin:
+                skipped += 1
+                continue
+            m = _TREE_STATEMENT.match(stripped)
+            yield m.group(1), m.group(2), translate
+        elif in_translate:
+            _translate_entries(stripped, translate)
+            in_translate = not stripped.endswith(';')
+        elif lower.startswith('translate'):
+            translate = {}
+            rest = stripped[len('translate'):]
+            _translate_entries(rest, translate)
+            in_translate = not rest.endswith(';')
+
+
+def iter_trees(fp, burnin=0, taxa=None):
+    """
+    Yield a :class:`newick.Tree` for each tree of the MrBayes tree file
+    ``fp`` after the first ``burnin``, numbering taxa with ``taxa``.
+    """
+    for _, s, translate in iter_tree_statements(fp, burnin):
+        yield newick.parse(s, taxa, translate)
+
+
+def _p_header(fp):
+    """
+    Column names of the parameter file ``fp``, after its ``[ID: ...]`` line.
+    """
+    for line in fp:
+        if line.strip() and not line.startswith('['):
+            return line.split()
+    raise ValueError('{0}: no header'.format(getattr(fp, 'name', '<stream>')))
+
+
+def iter_parameters(fp, burnin=0):
+    """
+    Yield a dictionary mapping each column name to its value for each sample
+    of the MrBayes parameter file ``fp`` after the first ``burnin``.
+    ``Gen`` is an integer; the other columns are floats.
+    """
+    columns = _p_header(fp)
+    for line in itertools.islice(fp, burnin, None):
+        values = line.split()
+        if values:
+            row = dict(zip(columns, map(float, values)))
+            row['Gen'] = int(row['Gen'])
+            yield row
+
+
+def read_parameters(fp, burnin=0):
+    """
+    Dictionary mapping each column of the MrBayes parameter file ``fp`` to
+    an array of its values after the first ``burnin`` samples. ``Gen`` is an
+    integer array; the other columns are floats.
+    """
+    columns = _p_header(fp)
+    lines = [line for line in itertools.islice(fp, burnin, None) if line.strip()]
+    if lines:
+        values = np.loadtxt(lines, ndmin=2)
+    else:
+        values = np.zeros((0, len(columns)))
+    result = dict((c, values[:, i]) for i, c in enumerate(columns))
+    if 'Gen' in result:
+        result['Gen'] = result['Gen'].astype(np.int64)
+    return result
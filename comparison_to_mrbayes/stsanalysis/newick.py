@@ -0,0 +1,400 @@
+"""
+Lightweight reader for the Newick trees written by sts-online and MrBayes.
+
+:func:`parse` reads a tree into a :class:`Tree` of NumPy arrays indexed by
+node, in postorder, without building dendropy objects. Leaves are numbered
+by a :class:`TaxonNamespace`, which should be shared by trees that are to be
+compared. Labels follow dendropy's conventions: underscores in unquoted
+labels are spaces, labels of internal nodes are not taxa, and a ``[&R]``
+comment marks the tree as rooted.
+
+Each tree also records its ``shape``: its parentheses and leaf labels,
+without lengths. Trees with the same shape have the same topology and the
+same node order, so work that indexes nodes can be memoized by shape. Its
+``topology`` is a canonical key of the unrooted topology, the same for every
+rooting and order of children, so work that depends only on the topology
+can be memoized once per topology.
+
+:func:`parse_batch` reads many trees into the rows of preallocated arrays,
+:func:`prune` removes a leaf from a tree, and :func:`to_dendropy` and
+:func:`from_dendropy` convert to and from dendropy trees for code that still
+needs them.
+"""
+import collections
+import math
+import re
+
+import numpy as np
+
+_TOKEN = re.compile(r"""
+    '((?:[^']|'')*)'         # quoted label
+  | \[([^\]]*)\]             # comment
+  | ([(),:;])                # punctuation
+  | ([^\s()\[\]',:;]+)       # unquoted label or number
+""", re.X)
+
+# Parentheses in shapes, which can't be confused with labels
+_OPEN, _CLOSE = 0, 1
+
+
+class TaxonNamespace(object):
+    """
+    Numbering of taxa in order of first appearance, matching labels
+    case-insensitively, as a shared :class:`dendropy.TaxonNamespace` does.
+    """
+
+    def __init__(self, labels=()):
+        self.labels = []
+        self.index = {}
+        for label in labels:
+            self.add(label)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, label):
+        """
+        Index of ``label``, which is added if it is new.
+        """
+        key = label.lower()
+        i = self.index.get(key)
+        if i is None:
+            i = self.index[key] = len(self.labels)
+            self.labels.append(label)
+        return i
+
+    def bit(self, label):
+        return 1 << self.add(label)
+
+
+class Tree(collections.namedtuple('Tree', ['parent', 'length', 'taxon', 'taxa',
+                                           'rooted', 'shape', 'topology'])):
+    """
+    A tree as arrays indexed by node, in postorder, so the root is last.
+
+    ``parent`` holds the index of each node's parent, -1 for the root;
+    ``length`` the length of the edge above each node, NaN where it is
+    missing; and ``taxon`` the index in the :class:`TaxonNamespace` ``taxa``
+    of each leaf's label, -1 for internal nodes and unlabelled leaves.
+    ``shape`` is a hashable tuple, and ``topology`` as from :func:`topology`.
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.parent)
+
+    @property
+    def labels(self):
+        """
+        Label of each node, None for internal nodes and unlabelled leaves.
+        """
+        labels = self.taxa.labels
+        return [labels[t] if t >= 0 else None for t in self.taxon.tolist()]
+
+    def n_children(self):
+        return np.bincount(self.parent[:-1], minlength=len(self.parent))
+
+    def children(self):
+        """
+        List of the children of each node, in order.
+        """
+        result = [[] for _ in self.parent]
+        for i, p in enumerate(self.parent[:-1].tolist()):
+            result[p].append(i)
+        return result
+
+
+def topology(parent, taxon):
+    """
+    Canonical key of the unrooted topology of the tree with the sequences
+    ``parent`` and ``taxon``, in postorder, as in :class:`Tree`: the mask of
+    its taxa and the frozenset of its nontrivial splits. Bit ``i`` of a mask
+    stands for taxon ``i`` of the tree's namespace, and each split is the
+    side without the tree's lowest-numbered taxon.
+    """
+    masks = [1 << t if t >= 0 else 0 for t in taxon]
+    sizes = [int(t >= 0) for t in taxon]
+    internal = [False] * len(parent)
+    for i, p in enumerate(parent[:-1]):
+        masks[p] |= masks[i]
+        sizes[p] += sizes[i]
+        internal[p] = True
+    return _topology(masks[-1], sizes[-1],
+                     [(m, k) for m, k, inner in zip(masks[:-1], sizes, internal) if inner])
+
+
+def _topology(fill, n_taxa, clades):
+    """
+    :func:`topology` of the tree with the ``n_taxa`` taxa of ``fill``, from
+    ``(mask, size)`` of the clade below each internal node but the root.
+    """
+    lowest = fill & -fill
+    return fill, frozenset([fill ^ m if m & lowest else m
+                            for m, k in clades if 1 < k < n_taxa - 1])
+
+
+def label_of_token(token, quoted=False):
+    if quoted:
+        return token.replace("''", "'")
+    return token.replace('_', ' ')
+
+
+def _parse(s, taxa, translate=None):
+    """
+    Parse ``s`` into lists of parents, lengths and taxa, the rooting, the
+    shape and the topology.
+    """
+    parent = []
+    length = []
+    taxon = []
+    masks = []
+    sizes = []
+    clades = []
+    rooted = None
+    open_nodes = [[]]
+    shape = []
+    last = None            # node to which a following label or length belongs
+    after_colon = False
+    nan = float('nan')
+
+    def new_node(t=-1):
+        parent.append(-1)
+        length.append(nan)
+        taxon.append(t)
+        masks.append(1 << t if t >= 0 else 0)
+        sizes.append(int(t >= 0))
+        open_nodes[-1].append(len(parent) - 1)
+        return len(parent) - 1
+
+    for m in _TOKEN.finditer(s):
+        quoted, comment, punct, word = m.groups()
+        if comment is not None:
+            if comment in ('&R', '&r'):
+                rooted = True
+            elif comment in ('&U', '&u'):
+                rooted = False
+        elif word is not None and after_colon:
+            length[last] = float(word)
+            after_colon = False
+        elif word is not None or quoted is not None:
+            if last is None:
+                name = label_of_token(word if quoted is None else quoted,
+                                      quoted is not None)
+                if translate is not None:
+                    name = translate.get(name, name)
+                t = taxa.add(name)
+                last = new_node(t)
+                shape.append(taxa.labels[t])
+            # Labels of internal nodes are ignored
+        elif punct == '(':
+            open_nodes.append([])
+            shape.append(_OPEN)
+            last = None
+        else:
+            if last is None:
+                last = new_node()
+                shape.append(None)
+            if punct == ':':
+                after_colon = True
+            elif punct == ',':
+                last = None
+            elif punct == ')':
+                if len(open_nodes) < 2:
+                    raise ValueError('Unbalanced parentheses in {0!r}'.format(s[:60]))
+                children = open_nodes.pop()
+                shape.append(_CLOSE)
+                last = new_node()
+                mask = size = 0
+                for child in children:
+                    parent[child] = last
+                    mask |= masks[child]
+                    size += sizes[child]
+                masks[last] = mask
+                sizes[last] = size
+                clades.append((mask, size))
+            else:
+                break
+
+    if len(open_nodes) != 1 or len(open_nodes[0]) != 1:
+        raise ValueError('Malformed Newick tree {0!r}'.format(s[:60]))
+    shape.append(rooted)
+    # The root's clade is all of the taxa
+    return (parent, length, taxon, rooted, tuple(shape),
+            _topology(masks[-1], sizes[-1], clades[:-1]))
+
+
+def parse(s, taxa=None, translate=None):
+    """
+    Parse the Newick string ``s`` into a :class:`Tree`, numbering its taxa
+    with the :class:`TaxonNamespace` ``taxa`` [default: a new namespace].
+    Leaf labels found in the dictionary ``translate`` are replaced by its
+    values.
+    """
+    if taxa is None:
+        taxa = TaxonNamespace()
+    parent, length, taxon, rooted, shape, topo = _parse(s, taxa, translate)
+    return Tree(np.array(parent, dtype=np.intp), np.array(length),
+                np.array(taxon, dtype=np.intp), taxa, rooted, shape, topo)
+
+
+# Trees parsed by :func:`parse_batch`, one per row. Row ``i`` describes
+# ``n_nodes[i]`` nodes as in :class:`Tree`, and is padded with -1 (``parent``,
+# ``taxon``) or NaN (``length``).
+TreeBatch = collections.namedtuple('TreeBatch', ['parent', 'length', 'taxon',
+                                                 'n_nodes', 'taxa'])
+
+
+def allocate_batch(n_trees, max_nodes, taxa=None):
+    """
+    An empty :class:`TreeBatch` for up to ``n_trees`` trees of up to
+    ``max_nodes`` nodes.
+    """
+    return TreeBatch(np.full((n_trees, max_nodes), -1, dtype=np.intp),
+                     np.full((n_trees, max_nodes), np.nan),
+                     np.full((n_trees, max_nodes), -1, dtype=np.intp),
+                     np.zeros(n_trees, dtype=np.intp),
+                     taxa if taxa is not None else TaxonNamespace())
+
+
+def parse_batch(strings, out, start=0, translate=None):
+    """
+    Parse each of the Newick ``strings`` into the rows of the
+    :class:`TreeBatch` ``out``, from row ``start``. Returns the number of
+    trees read.
+    """
+    n_trees = 0
+    for i, s in enumerate(strings, start):
+        parent, length, taxon, _, _, _ = _parse(s, out.taxa, translate)
+        n = len(parent)
+        if n > out.parent.shape[1]:
+            raise ValueError('Tree {0} has {1} nodes; the batch holds {2}'.format(
+                i, n, out.parent.shape[1]))
+        out.parent[i, :n] = parent
+        out.parent[i, n:] = -1
+        out.length[i, :n] = length
+        out.length[i, n:] = np.nan
+        out.taxon[i, :n] = taxon
+        out.taxon[i, n:] = -1
+        out.n_nodes[i] = n
+        n_trees += 1
+    return n_trees
+
+
+def _shape(tree_children, labels, rooted):
+    """
+    Shape of the tree with children ``tree_children`` and node ``labels``.
+    """
+    shape = []
+    stack = [(len(tree_children) - 1, False)]
+    while stack:
+        node, closing = stack.pop()
+        if closing:
+            shape.append(_CLOSE)
+        elif not tree_children[node]:
+            shape.append(labels[node])
+        else:
+            shape.append(_OPEN)
+            stack.append((node, True))
+            stack.extend((c, False) for c in reversed(tree_children[node]))
+    shape.append(rooted)
+    return tuple(shape)
+
+
+def prune(tree, node):
+    """
+    ``tree`` without the leaf ``node``. A parent left with one child is
+    removed, its child taking its place with the sum of their lengths.
+    Returns the new :class:`Tree` and the array of the index in it of each
+    node of ``tree``, -1 for those removed.
+    """
+    parents = tree.parent.tolist()
+    lengths = tree.length.tolist()
+    children = tree.children()
+    if children[node]:
+        raise ValueError('Node {0} is not a leaf'.format(node))
+    p = parents[node]
+    if p < 0:
+        raise ValueError('Cannot prune the only node of a tree')
+    children[p].remove(node)
+    removed = set([node])
+    root = len(parents) - 1
+    if len(children[p]) == 1:
+        c, = children[p]
+        removed.add(p)
+        if p == root:
+            root = c
+            lengths[c] = float('nan')
+        else:
+            # Missing lengths count as 0 unless both are missing
+            if not (math.isnan(lengths[c]) and math.isnan(lengths[p])):
+                lengths[c] = np.nan_to_num(lengths[c]) + np.nan_to_num(lengths[p])
+            siblings = children[parents[p]]
+            siblings[siblings.index(p)] = c
+
+    # Renumber the remaining nodes in postorder
+    order = []
+    stack = [(root, False)]
+    while stack:
+        i, done = stack.pop()
+        if done or not children[i]:
+            order.append(i)
+        else:
+            stack.append((i, True))
+            stack.extend((c, False) for c in reversed(children[i]))
+    index = np.full(len(parents), -1, dtype=np.intp)
+    index[order] = np.arange(len(order))
+
+    new_children = [[int(index[c]) for c in children[i]] for i in order]
+    parent = np.full(len(order), -1, dtype=np.intp)
+    for i, cs in enumerate(new_children):
+        parent[cs] = i
+    taxon = tree.taxon[order]
+    labels = tree.taxa.labels
+    return (Tree(parent, np.array([lengths[i] for i in order]), taxon, tree.taxa,
+                 tree.rooted,
+                 _shape(new_children, [labels[t] if t >= 0 else None
+                                       for t in taxon.tolist()], tree.rooted),
+                 topology(parent.tolist(), taxon.tolist())),
+            index)
+
+
+def from_dendropy(tree, taxa=None):
+    """
+    :class:`Tree` equivalent to the dendropy ``tree``.
+    """
+    if taxa is None:
+        taxa = TaxonNamespace()
+    nodes = list(tree.postorder_node_iter())
+    index = dict((node, i) for i, node in enumerate(nodes))
+    parent = [index[node.parent_node] if node.parent_node is not None else -1
+              for node in nodes]
+    length = [node.edge.length if node.edge.length is not None else np.nan
+              for node in nodes]
+    taxon = [taxa.add(node.taxon.label) if node.is_leaf() and node.taxon is not None
+             else -1 for node in nodes]
+    rooted = tree.is_rooted
+    children = [[index[c] for c in node.child_node_iter()] for node in nodes]
+    labels = [taxa.labels[t] if t >= 0 else None for t in taxon]
+    return Tree(np.array(parent, dtype=np.intp), np.array(length, dtype=float),
+                np.array(taxon, dtype=np.intp), taxa, rooted,
+                _shape(children, labels, rooted), topology(parent, taxon))
+
+
+def to_dendropy(tree, taxon_namespace=None):
+    """
+    dendropy tree equivalent to the :class:`Tree` ``tree``, with taxa from
+    the dendropy ``taxon_namespace`` if given.
+    """
+    import dendropy
+    if taxon_namespace is None:
+        taxon_namespace = dendropy.TaxonNamespace()
+    nodes = [dendropy.Node() for _ in range(len(tree))]
+    for node, t, l in zip(nodes, tree.taxon.tolist(), tree.length.tolist()):
+        if t >= 0:
+            node.taxon = taxon_namespace.require_taxon(label=tree.taxa.labels[t])
+        node.edge.length = None if np.isnan(l) else l
+    for i, p in enumerate(tree.parent[:-1].tolist()):
+        nodes[p].add_child(nodes[i])
+    result = dendropy.Tree(seed_node=nodes[-1], taxon_namespace=taxon_namespace)
+    result.is_rooted = tree.rooted
+    return result
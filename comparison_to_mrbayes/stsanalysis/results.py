@@ -0,0 +1,245 @@
+"""
+SQLite store of the results of a simulation sweep.
+
+Each distinct set of run metadata (tree, number of taxa, trimmed taxa,
+particle factor and proposal method) is one row of ``runs``, indexed for
+selecting slices of the sweep. Measurements are kept in one table per kind
+of result, referring to their run by ``run_id``:
+
+``topology_distances``
+    Distances between posterior trees and the reference tree
+    (:data:`stsanalysis.topology.HEADER`).
+``asdsf``, ``split_pps``
+    ASDSF and split posterior probabilities (:data:`asdsf.ASDSF_HEADER`,
+    :data:`asdsf.PP_HEADER`).
+``probs``
+    Log likelihoods of the sts-online particles.
+
+Rows are recorded per ``output``, the CSV file of the step which produced
+them, in one transaction, so a rerun step replaces its rows. The size and
+modification time of the file are recorded with them, in ``outputs``, so
+that rows no longer matching a rewritten file can be found with
+:meth:`ResultsStore.outputs` and read again.
+:meth:`ResultsStore.export_csv` writes a table as the stacked, decorated CSV
+files the R reports read.
+"""
+import csv
+import os
+
+import sqlalchemy as sa
+
+from stsanalysis import asdsf, topology
+from stsanalysis.decorate import write_csv
+
+RUN_COLUMNS = ('tree', 'n_taxa', 'trim_taxon', 'trim_count', 'particle_factor',
+               'proposal_method_name', 'proposal_args')
+
+schema = sa.MetaData()
+
+runs = sa.Table('runs', schema,
+                sa.Column('id', sa.Integer, primary_key=True),
+                *([sa.Column(c, sa.Text, nullable=False) for c in RUN_COLUMNS] +
+                  [sa.UniqueConstraint(*RUN_COLUMNS),
+                   sa.Index('runs_sweep', 'n_taxa', 'trim_count', 'particle_factor',
+                            'proposal_method_name')]))
+
+outputs = sa.Table('outputs', schema,
+                   sa.Column('id', sa.Integer, primary_key=True),
+                   sa.Column('table_name', sa.Text, nullable=False),
+                   sa.Column('output', sa.Text, nullable=False),
+                   sa.Column('size', sa.Integer),
+                   sa.Column('mtime', sa.Float),
+                   sa.UniqueConstraint('table_name', 'output'))
+
+
+def file_stamp(path):
+    """
+    ``(size, mtime)`` of the file ``path``, or None if it doesn't exist.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+def _measurements(name, *columns):
+    return sa.Table(name, schema,
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('run_id', sa.Integer, sa.ForeignKey('runs.id'),
+                              nullable=False, index=True),
+                    sa.Column('output', sa.Text, nullable=False, index=True),
+                    *columns)
+
+
+_measurements('topology_distances',
+              sa.Column('file', sa.Text),
+              sa.Column('log_weight', sa.Float),
+              sa.Column('rf_distance', sa.Integer),
+              sa.Column('weighted_rf', sa.Float),
+              sa.Column('euclidean', sa.Float),
+              sa.Column('type', sa.Text))
+_measurements('asdsf',
+              sa.Column('type', sa.Text),
+              sa.Column('file1', sa.Text),
+              sa.Column('file2', sa.Text),
+              sa.Column('asdsf', sa.Float),
+              sa.Column('msdsf', sa.Float))
+_measurements('split_pps',
+              sa.Column('type', sa.Text),
+              sa.Column('file1', sa.Text),
+              sa.Column('file2', sa.Text),
+              sa.Column('pp1', sa.Float),
+              sa.Column('pp2', sa.Float),
+              sa.Column('split', sa.Text))
+_measurements('probs',
+              sa.Column('logP', sa.Float))
+
+# Columns of the rows passed to :meth:`ResultsStore.record`; other columns
+# of a table come from the run metadata
+ROW_COLUMNS = {
+    'topology_distances': topology.HEADER,
+    'asdsf': asdsf.ASDSF_HEADER,
+    'split_pps': asdsf.PP_HEADER,
+    'probs': ('logP',),
+}
+
+# Header of each table's CSV export, as written by the pipeline's steps
+EXPORT_COLUMNS = {
+    'topology_distances': topology.HEADER + RUN_COLUMNS + ('type',),
+    'asdsf': asdsf.ASDSF_HEADER + RUN_COLUMNS,
+    'split_pps': asdsf.PP_HEADER + RUN_COLUMNS,
+    'probs': ('trim_taxon', 'n_taxa', 'trim_count', 'particle_factor',
+              'proposal_method_name', 'logP'),
+}
+
+# Failures of the database itself, such as a lock that can't be taken
+DatabaseError = sa.exc.DBAPIError
+
+# Outputs per query when exporting, below SQLite's limit on parameters
+_CHUNK = 500
+
+
+class ResultsStore(object):
+    """
+    The results database at ``path``, created if it doesn't exist. Several
+    processes may record results at once; writers wait up to ``timeout``
+    seconds for each other.
+    """
+
+    def __init__(self, path, timeout=600):
+        self.engine = sa.create_engine('sqlite:///' + path,
+                                       connect_args={'timeout': timeout})
+        schema.create_all(self.engine)
+
+    def close(self):
+        self.engine.dispose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def run_id(self, metadata):
+        """
+        Id of the run described by ``metadata``, a dictionary with a value
+        for each of :data:`RUN_COLUMNS`, added if it is new.
+        """
+        values = dict((c, metadata[c]) for c in RUN_COLUMNS)
+        query = sa.select([runs.c.id]).where(
+            sa.and_(*[runs.c[c] == v for c, v in values.items()]))
+        for _ in range(2):
+            with self.engine.connect() as conn:
+                run_id = conn.execute(query).scalar()
+            if run_id is not None:
+                return run_id
+            try:
+                with self.engine.begin() as conn:
+                    return conn.execute(runs.insert(), values).inserted_primary_key[0]
+            except sa.exc.IntegrityError:
+                # Added by another process since the select
+                pass
+        raise ValueError('Could not add run {0}'.format(values))
+
+    def record(self, table, output, rows, metadata, stamp=None):
+        """
+        Replace the rows of ``table`` from ``output`` by ``rows``, sequences
+        matching :data:`ROW_COLUMNS`, of the run described by ``metadata``, a
+        list of ``(key, value)`` pairs as for
+        :func:`stsanalysis.decorate.decorate`. ``stamp`` is the
+        :func:`file_stamp` of ``output`` the rows were written to, by
+        default its current one.
+        """
+        if stamp is None:
+            stamp = file_stamp(output)
+        t = schema.tables[table]
+        metadata = dict(metadata)
+        extra = dict((c, metadata[c]) for c in t.c.keys() if c in metadata)
+        extra['run_id'] = self.run_id(metadata)
+        extra['output'] = output
+        columns = ROW_COLUMNS[table]
+        values = []
+        for row in rows:
+            value = dict(zip(columns, row))
+            value.update(extra)
+            values.append(value)
+        where = sa.and_(outputs.c.table_name == table, outputs.c.output == output)
+        with self.engine.begin() as conn:
+            conn.execute(t.delete().where(t.c.output == output))
+            if values:
+                conn.execute(t.insert(), values)
+            conn.execute(outputs.delete().where(where))
+            if stamp is not None:
+                conn.execute(outputs.insert(), {'table_name': table, 'output': output,
+                                                'size': stamp[0], 'mtime': stamp[1]})
+
+    def record_csv(self, table, path, metadata):
+        """
+        Record the rows of the decorated CSV file ``path``, written by an
+        earlier sweep, as from ``output`` ``path``.
+        """
+        stamp = file_stamp(path)
+        with open(path) as fp:
+            r = csv.reader(fp)
+            header = next(r)
+            positions = [header.index(c) for c in ROW_COLUMNS[table]]
+            rows = [[row[i] for i in positions] for row in r]
+        self.record(table, path, rows, metadata, stamp)
+
+    def outputs(self, table):
+        """
+        Dictionary from each output recorded in ``table`` to the
+        :func:`file_stamp` it had when recorded.
+        """
+        query = (sa.select([outputs.c.output, outputs.c.size, outputs.c.mtime])
+                 .where(outputs.c.table_name == table))
+        with self.engine.connect() as conn:
+            return dict((r[0], (r[1], r[2])) for r in conn.execute(query))
+
+    def export_csv(self, table, fp, outputs):
+        """
+        Write the rows of ``table`` from each of ``outputs``, in order, with
+        their run metadata, to the file ``fp``, as :data:`EXPORT_COLUMNS`.
+        """
+        t = schema.tables[table]
+        columns = EXPORT_COLUMNS[table]
+        selected = [t.c[c] if c in t.c else runs.c[c] for c in columns]
+        joined = t.join(runs, t.c.run_id == runs.c.id)
+
+        def rows():
+            with self.engine.connect() as conn:
+                for i in range(0, len(outputs), _CHUNK):
+                    chunk = outputs[i:i + _CHUNK]
+                    query = (sa.select([t.c.output] + selected)
+                             .select_from(joined)
+                             .where(t.c.output.in_(chunk))
+                             .order_by(t.c.id))
+                    by_output = dict((o, []) for o in chunk)
+                    for row in conn.execute(query):
+                        by_output[row[0]].append(row[1:])
+                    for output in chunk:
+                        for row in by_output[output]:
+                            yield row
+
+        write_csv(fp, columns, rows())
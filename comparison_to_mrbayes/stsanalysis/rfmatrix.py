@@ -0,0 +1,230 @@
+"""
+Robinson-Foulds distances between all pairs of posterior samples.
+
+:class:`SampleSplits` reads every tree once, numbering the splits seen across
+all samples; each sample is stored as its split ids and the lengths of those
+edges. :func:`rf_matrices` then fills the N x N RF and weighted RF matrices
+tile by tile: RF distances from products of 0/1 sample x split matrices,
+computed once per distinct topology in the tile, and weighted RF distances
+from the absolute differences of dense edge length rows restricted to the
+splits present in the tile. Memory use is bounded by the tile size, not N.
+
+Splits are encoded as in :mod:`stsanalysis.topology`, so entries agree with
+the distances it reports (up to summation order for weighted RF), or read
+from :mod:`stsanalysis.splitcache` caches with :meth:`SampleSplits.add_cached`.
+"""
+from __future__ import division
+import logging
+import os.path
+
+import numpy as np
+
+from stsanalysis import newick, splitcache, topology
+
+log = logging.getLogger('rfmatrix')
+
+SAMPLE_HEADER = ('file', 'index', 'log_weight')
+
+# Maximum number of elements in the temporary arrays of a weighted RF tile
+_BLOCK_ELEMENTS = 1 << 22
+
+
+class SampleSplits(object):
+    """
+    Splits and edge lengths of a collection of trees.
+    """
+
+    def __init__(self):
+        self.taxa = newick.TaxonNamespace()
+        self.split_ids = {}
+        self.shapes = {}
+        self.topologies = {}
+        # Whether splits come from caches, whose masks are numbered differently
+        self.cached = None
+        # Per sample
+        self.samples = []
+        self.ids = []
+        self.lengths = []
+        self.topology = []
+        # Per topology: ids of its splits
+        self.topology_ids = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def n_splits(self):
+        return len(self.split_ids)
+
+    def split_id(self, mask):
+        i = self.split_ids.get(mask)
+        if i is None:
+            i = self.split_ids[mask] = len(self.split_ids)
+        return i
+
+    def _shape(self, tree):
+        encoding = topology.encode_splits(tree)
+        # As dendropy, a split repeated in a tree takes the last edge's length
+        edges = {}
+        for node, mask in zip(encoding.nodes, encoding.masks):
+            edges[mask] = node
+        masks = list(edges)
+        ids = np.array([self.split_id(m) for m in masks], dtype=np.intp)
+        nodes = np.array([edges[m] for m in masks], dtype=np.intp)
+        # Rooting-independent key, shared by every shape of the topology
+        key = frozenset(masks)
+        t = self.topologies.get(key)
+        if t is None:
+            t = self.topologies[key] = len(self.topology_ids)
+            self.topology_ids.append(np.sort(ids))
+        return ids, nodes, encoding.merge, t
+
+    def _check_cached(self, cached):
+        if self.cached is None:
+            self.cached = cached
+        elif self.cached != cached:
+            raise ValueError('Cannot mix cached and parsed samples')
+
+    def add(self, tree, sample):
+        """
+        Add the :class:`newick.Tree` ``tree``, described by ``sample``, a row
+        matching :data:`SAMPLE_HEADER`. The tree's taxa must be numbered by
+        :attr:`taxa`.
+        """
+        self._check_cached(False)
+        shape = self.shapes.get(tree.shape)
+        if shape is None:
+            shape = self.shapes[tree.shape] = self._shape(tree)
+        ids, nodes, merge, t = shape
+        length = np.nan_to_num(topology.node_lengths(tree, merge))
+        self.ids.append(ids)
+        self.lengths.append(length[nodes])
+        self.topology.append(t)
+        self.samples.append(sample)
+
+    def add_file(self, path, burnin=0):
+        """
+        Add each tree of ``path``, a MrBayes tree file or sts-online result,
+        skipping ``burnin`` trees of MrBayes files.
+        """
+        offset = 0 if path.endswith('.json') else burnin
+        read = topology.tree_readers[os.path.splitext(path)[1]]
+        for i, (tree, log_weight) in enumerate(read(path, burnin, self.taxa)):
+            self.add(tree, (path, offset + i, log_weight))
+        log.info('%s: %d samples, %d topologies, %d splits so far',
+                 path, len(self), len(self.topology_ids), self.n_splits)
+
+    def add_cached(self, path, burnin=0):
+        """
+        As :meth:`add_file`, reading the splits of ``path`` from its
+        :mod:`splitcache`. A collection's samples must all come from caches
+        or all from :meth:`add`.
+        """
+        self._check_cached(True)
+        matrix = splitcache.open_split_matrix(path)
+        is_json = path.endswith('.json')
+        start = 0 if is_json else burnin
+        rows = np.arange(start, len(matrix))
+        masks, inverse = matrix.unique_splits(rows)
+        ids = np.array([self.split_id(m) for m in masks], dtype=np.intp)
+        lengths = matrix.lengths[rows]
+        topologies = {}
+        for i, row, n, t in zip(range(len(rows)), rows.tolist(),
+                                matrix.n_edges[rows].tolist(),
+                                matrix.topology[rows].tolist()):
+            edges = inverse[i, :n]
+            g = topologies.get(t)
+            if g is None:
+                key = frozenset(masks[e] for e in edges.tolist())
+                g = self.topologies.get(key)
+                if g is None:
+                    g = self.topologies[key] = len(self.topology_ids)
+                    self.topology_ids.append(np.sort(ids[edges]))
+                topologies[t] = g
+            self.ids.append(ids[edges])
+            self.lengths.append(np.array(lengths[i, :n]))
+            self.topology.append(g)
+            # MrBayes trees have log weight 0, as from the tree readers
+            self.samples.append((path, int(matrix.index[row]),
+                                 float(matrix.log_weights[row]) if is_json else 0))
+        log.info('%s: %d samples, %d topologies, %d splits so far',
+                 path, len(self), len(self.topology_ids), self.n_splits)
+
+    def _dense_lengths(self, samples, columns):
+        """
+        Edge lengths of ``samples`` for the splits ``columns``, a sorted array
+        of split ids: 0 where a sample lacks a split.
+        """
+        result = np.zeros((len(samples), len(columns)))
+        for row, s in enumerate(samples):
+            result[row, np.searchsorted(columns, self.ids[s])] = self.lengths[s]
+        return result
+
+    def rf_tile(self, rows, cols):
+        """
+        RF distances between the samples ``rows`` and ``cols``.
+        """
+        topologies = np.asarray(self.topology)
+        t_rows, inv_rows = np.unique(topologies[rows], return_inverse=True)
+        t_cols, inv_cols = np.unique(topologies[cols], return_inverse=True)
+        splits = np.unique(np.concatenate([self.topology_ids[t]
+                                           for t in np.concatenate((t_rows, t_cols))]))
+
+        def incidence(ts):
+            result = np.zeros((len(ts), len(splits)), dtype=np.float32)
+            for row, t in enumerate(ts):
+                result[row, np.searchsorted(splits, self.topology_ids[t])] = 1
+            return result
+
+        a = incidence(t_rows)
+        b = incidence(t_cols)
+        shared = np.dot(a, b.T)
+        rf = a.sum(1)[:, None] + b.sum(1)[None, :] - 2 * shared
+        return np.rint(rf).astype(np.int32)[inv_rows][:, inv_cols]
+
+    def weighted_rf_tile(self, rows, cols):
+        """
+        Weighted RF distances between the samples ``rows`` and ``cols``.
+        """
+        columns = np.unique(np.concatenate([self.ids[s] for s in
+                                            np.concatenate((rows, cols))]))
+        a = self._dense_lengths(rows, columns)
+        b = self._dense_lengths(cols, columns)
+        result = np.zeros((len(rows), len(cols)))
+        step = max(1, _BLOCK_ELEMENTS // max(1, len(rows) * len(cols)))
+        for j in range(0, len(columns), step):
+            result += np.abs(a[:, None, j:j + step] - b[None, :, j:j + step]).sum(-1)
+        return result
+
+
+def _tiles(n, tile_size):
+    starts = range(0, n, tile_size)
+    for i in starts:
+        for j in starts:
+            if j >= i:
+                yield (np.arange(i, min(i + tile_size, n)),
+                       np.arange(j, min(j + tile_size, n)))
+
+
+def rf_matrices(sample_splits, rf_out, weighted_out=None, tile_size=256):
+    """
+    Fill ``rf_out`` with the RF distance between each pair of samples in the
+    :class:`SampleSplits` ``sample_splits``, and ``weighted_out``, if given,
+    with the weighted RF distances. Both are N x N arrays, such as
+    memory-mapped ``.npy`` files from :func:`open_matrix`.
+    """
+    for rows, cols in _tiles(len(sample_splits), tile_size):
+        block = sample_splits.rf_tile(rows, cols)
+        rf_out[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] = block
+        rf_out[cols[0]:cols[-1] + 1, rows[0]:rows[-1] + 1] = block.T
+        if weighted_out is not None:
+            block = sample_splits.weighted_rf_tile(rows, cols)
+            weighted_out[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] = block
+            weighted_out[cols[0]:cols[-1] + 1, rows[0]:rows[-1] + 1] = block.T
+
+
+def open_matrix(path, n, dtype):
+    """
+    A new N x N ``.npy`` file at ``path``, memory-mapped for writing.
+    """
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(n, n))
@@ -0,0 +1,53 @@
+"""
+Simulation of DNA alignments under the Jukes-Cantor (JC69) model with a
+constant rate across sites, as the pipeline's ``bppseqgen`` runs did.
+
+:func:`simulate_jc69` evolves every site at once, from the root of a
+:class:`newick.Tree` down to its leaves: along an edge of length ``t``
+(expected substitutions per site), each site is redrawn from the uniform
+stationary distribution with probability ``1 - exp(-4t/3)``, which gives the
+JC69 transition probabilities. The result is an
+:class:`alignment.Alignment`, which is written as FASTA, NEXUS and relaxed
+PHYLIP directly from its array of states.
+"""
+import numpy as np
+
+from stsanalysis import newick
+from stsanalysis.alignment import Alignment, write_alignment
+
+
+def simulate_jc69(tree, n_sites, random_state=None):
+    """
+    Simulate ``n_sites`` sites down the :class:`newick.Tree` ``tree``.
+    ``random_state`` is a seed or :class:`numpy.random.RandomState`. Returns
+    an :class:`Alignment` of the leaves, in the order of the tree.
+    """
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    parent = tree.parent.tolist()
+    # Probability that a site is redrawn along each edge; missing lengths are 0
+    redraw = -np.expm1(-4.0 / 3.0 * np.nan_to_num(tree.length))
+
+    states = np.empty((len(parent), n_sites), dtype=np.uint8)
+    states[-1] = random_state.randint(4, size=n_sites)
+    # Nodes are in postorder, so each parent is set before its children
+    for i in range(len(parent) - 2, -1, -1):
+        states[i] = states[parent[i]]
+        hit = np.flatnonzero(random_state.random_sample(n_sites) < redraw[i])
+        states[i, hit] = random_state.randint(4, size=len(hit))
+
+    leaves = np.flatnonzero(tree.n_children() == 0)
+    labels = tree.labels
+    return Alignment([labels[i] for i in leaves], states[leaves])
+
+
+def simulate_files(tree_path, paths, n_sites, seed=0):
+    """
+    Simulate ``n_sites`` sites down the Newick tree in ``tree_path`` with
+    the random seed ``seed``, writing the alignment to each of ``paths``.
+    """
+    with open(tree_path) as fp:
+        tree = newick.parse(fp.read())
+    alignment = simulate_jc69(tree, n_sites, seed)
+    for path in paths:
+        write_alignment(alignment, path)
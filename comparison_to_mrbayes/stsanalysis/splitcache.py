@@ -0,0 +1,307 @@
+"""
+Binary cache of the splits of a posterior sample of trees.
+
+:func:`write_split_matrix` reads a MrBayes tree file or sts-online result
+once and stores every sample as fixed-width rows, in a directory next to the
+source (``x.run1.t`` -> ``x.run1.t.splits``):
+
+``masks.npy``
+    uint64, samples x edges x words: the split of each edge, as in
+    :mod:`stsanalysis.splits` (bit ``i`` of word ``i // 64`` is taxon
+    ``i % 64`` of the sorted taxa, normalized to exclude taxon 0). Edges are
+    in postorder and the root's edge, split 0, comes last.
+``lengths.npy``
+    float64, samples x edges: edge lengths, 0 where missing.
+``nontrivial.npy``
+    bool, samples x edges: splits which are not pendant edges.
+``n_edges.npy``, ``topology.npy``, ``log_weights.npy``, ``index.npy``
+    Per sample: the number of edges, the index of its topology in order of
+    first appearance, its log weight and its index in the source file.
+``header.json``
+    The taxon labels, and the size, modification time and SHA-1 of the
+    source. Rows past ``n_edges`` are padding.
+
+:func:`open_split_matrix` memory-maps the arrays, so repeated runs start
+without parsing and processes reading the same file share its pages. The
+cache is rebuilt when the source has changed: when its size or modification
+time differ, and its hash does too. As in :func:`splits.tree_splits`, trees
+are taken as unrooted, and the two root edges of a bifurcating root are one
+split, with the sum of their lengths.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+from stsanalysis import newick, splits, topology
+
+log = logging.getLogger('splitcache')
+
+VERSION = 1
+
+_HEADER = 'header.json'
+_ARRAYS = ('masks', 'lengths', 'nontrivial', 'n_edges', 'topology',
+           'log_weights', 'index')
+_WORD = 64
+_WORD_MASK = (1 << _WORD) - 1
+
+
+def cache_path(path):
+    return path + '.splits'
+
+
+def _source_header(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': st.st_mtime, 'sha1': _sha1(path)}
+
+
+def _sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def n_words(n_taxa):
+    return max(1, (n_taxa + _WORD - 1) // _WORD)
+
+
+def words_of_mask(mask, n):
+    return [(mask >> (_WORD * i)) & _WORD_MASK for i in range(n)]
+
+
+def mask_of_words(words):
+    return sum(int(w) << (_WORD * i) for i, w in enumerate(words))
+
+
+def _encode_shape(tree, taxa):
+    """
+    Normalized split masks of the edges of ``tree``, and the edge of each
+    node.
+    """
+    labels = tree.labels
+    children = tree.n_children().tolist()
+    node_masks = [0] * len(labels)
+    edges = {}
+    masks = []
+    edge_of_node = []
+    for i, parent in enumerate(tree.parent.tolist()):
+        if not children[i]:
+            try:
+                node_masks[i] = 1 << taxa.index[labels[i]]
+            except KeyError:
+                raise ValueError('Taxon {0} is not in the taxon index'.format(labels[i]))
+        if parent >= 0:
+            node_masks[parent] |= node_masks[i]
+            mask = taxa.normalize(node_masks[i])
+        else:
+            mask = 0
+        e = edges.get(mask)
+        if e is None:
+            e = edges[mask] = len(masks)
+            masks.append(mask)
+        edge_of_node.append(e)
+    # The root's edge last
+    if edge_of_node[-1] != len(masks) - 1:
+        last = edge_of_node[-1]
+        masks.append(masks.pop(last))
+        edge_of_node = [e if e < last else (len(masks) - 1 if e == last else e - 1)
+                        for e in edge_of_node]
+    return masks, np.array(edge_of_node, dtype=np.intp)
+
+
+def write_split_matrix(source, path=None):
+    """
+    Read every tree of ``source`` and write the cache directory ``path``
+    [default: :func:`cache_path`]. Returns ``path``.
+    """
+    path = path or cache_path(source)
+    header = _source_header(source)
+    read = topology.tree_readers[os.path.splitext(source)[1]]
+
+    taxa = None
+    shapes = {}
+    topologies = {}
+    rows = []
+    log_weights = []
+    for tree, log_weight in read(source, 0, newick.TaxonNamespace()):
+        if taxa is None:
+            taxa = splits.TaxonIndex.of_tree(tree)
+            words = n_words(len(taxa))
+        shape = shapes.get(tree.shape)
+        if shape is None:
+            masks, edge_of_node = _encode_shape(tree, taxa)
+            t = topologies.setdefault(frozenset(masks), len(topologies))
+            shape = shapes[tree.shape] = (
+                np.array([words_of_mask(m, words) for m in masks], dtype=np.uint64),
+                np.array([not taxa.is_trivial(m) for m in masks], dtype=bool),
+                edge_of_node, t)
+        rows.append((shape, np.nan_to_num(tree.length)))
+        log_weights.append(log_weight)
+    if taxa is None:
+        raise ValueError('{0}: no trees'.format(source))
+
+    n = len(rows)
+    width = max(len(shape[0]) for shape, _ in rows)
+    arrays = {'masks': np.zeros((n, width, words), dtype=np.uint64),
+              'lengths': np.zeros((n, width)),
+              'nontrivial': np.zeros((n, width), dtype=bool),
+              'n_edges': np.zeros(n, dtype=np.int32),
+              'topology': np.zeros(n, dtype=np.int32),
+              'log_weights': np.array(log_weights, dtype=np.float64),
+              'index': np.arange(n, dtype=np.int64)}
+    for i, ((masks, nontrivial, edge_of_node, t), length) in enumerate(rows):
+        m = len(masks)
+        arrays['masks'][i, :m] = masks
+        arrays['nontrivial'][i, :m] = nontrivial
+        arrays['lengths'][i, :m] = np.bincount(edge_of_node, weights=length, minlength=m)
+        arrays['n_edges'][i] = m
+        arrays['topology'][i] = t
+
+    header.update(version=VERSION, taxa=taxa.labels, n_samples=n)
+    tmp = '{0}.tmp{1}'.format(path, os.getpid())
+    _remove_tree(tmp)
+    os.mkdir(tmp)
+    for name in _ARRAYS:
+        np.save(os.path.join(tmp, name + '.npy'), arrays[name])
+    _write_header(tmp, header)
+    _install(tmp, path, source)
+    log.info('%s: cached %d samples, %d topologies', source, n, len(topologies))
+    return path
+
+
+def _install(tmp, path, source):
+    """
+    Move the cache directory ``tmp``, built from ``source``, to ``path``.
+
+    Several processes may rebuild the cache of one source at once. A current
+    cache already at ``path`` is kept and ``tmp`` discarded; a stale one is
+    first renamed aside, so that a cache another process has just put in
+    place is never removed from under it.
+    """
+    while True:
+        try:
+            os.rename(tmp, path)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+        if is_current(source, path):
+            _remove_tree(tmp)
+            return
+        old = '{0}.old{1}'.format(path, os.getpid())
+        try:
+            os.rename(path, old)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        else:
+            _remove_tree(old)
+
+
+def _write_header(path, header):
+    tmp = os.path.join(path, _HEADER + '.tmp')
+    with open(tmp, 'w') as fp:
+        json.dump(header, fp)
+    os.rename(tmp, os.path.join(path, _HEADER))
+
+
+def _read_header(path):
+    try:
+        with open(os.path.join(path, _HEADER)) as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _remove_tree(path):
+    try:
+        shutil.rmtree(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def is_current(source, path=None):
+    """
+    True if the cache ``path`` was built from the current contents of
+    ``source``. A source whose size and modification time are unchanged is
+    taken to be unchanged; otherwise it is hashed, and if only its
+    modification time changed, the cache's header is updated.
+    """
+    path = path or cache_path(source)
+    header = _read_header(path)
+    if header is None or header.get('version') != VERSION:
+        return False
+    st = os.stat(source)
+    if header['size'] == st.st_size and header['mtime'] == st.st_mtime:
+        return True
+    if header['size'] != st.st_size:
+        return False
+    source_header = _source_header(source)
+    if source_header['sha1'] != header['sha1']:
+        return False
+    header.update(source_header)
+    _write_header(path, header)
+    return True
+
+
+class SplitMatrix(object):
+    """
+    The arrays of a split cache, memory-mapped read-only.
+    """
+
+    def __init__(self, path):
+        header = _read_header(path)
+        if header is None:
+            raise ValueError('{0}: not a split cache'.format(path))
+        self.path = path
+        self.taxa = splits.TaxonIndex(header['taxa'])
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+
+    def __len__(self):
+        return len(self.n_edges)
+
+    def unique_splits(self, rows, which=None):
+        """
+        Distinct masks of the splits of samples ``rows``, in order of first
+        appearance, as Python integers, and the index of each edge's mask in
+        that list: -1 for padding, and for edges not in the boolean array
+        ``which``.
+        """
+        masks = np.ascontiguousarray(self.masks[rows])
+        n, width, words = masks.shape
+        keep = np.arange(width)[None, :] < self.n_edges[rows][:, None]
+        if which is not None:
+            keep &= which
+        flat = masks[keep]
+        inverse = np.empty((n, width), dtype=np.intp)
+        inverse.fill(-1)
+        if not len(flat):
+            return [], inverse
+        keys = flat.view(np.dtype((np.void, flat.dtype.itemsize * words))).ravel()
+        _, first, order = np.unique(keys, return_index=True, return_inverse=True)
+        # Renumber in order of first appearance
+        by_first = np.argsort(first)
+        rank = np.empty_like(by_first)
+        rank[by_first] = np.arange(len(by_first))
+        inverse[keep] = rank[order]
+        result = [mask_of_words(flat[first[i]].tolist()) for i in by_first]
+        return result, inverse
+
+
+def open_split_matrix(source, path=None):
+    """
+    :class:`SplitMatrix` of ``source``, rebuilding its cache ``path``
+    [default: :func:`cache_path`] if it is missing or out of date.
+    """
+    path = path or cache_path(source)
+    if not is_current(source, path):
+        write_split_matrix(source, path)
+    return SplitMatrix(path)
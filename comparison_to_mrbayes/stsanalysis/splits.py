@@ -0,0 +1,215 @@
+"""
+Splits of unrooted trees as integer bitmasks.
+
+Taxa are numbered by a shared :class:`TaxonIndex`; bit ``i`` of a split is set
+if taxon ``i`` is on the side of the split away from taxon 0, so each split
+has exactly one mask. Masks are Python integers, so any number of taxa is
+supported. :class:`SplitFrequencies` accumulates the (optionally weighted)
+frequency of each split in several samples of trees.
+
+Trees are :class:`newick.Tree` instances. A tree's topology is identified by
+the frozenset of its splits, which doesn't depend on its rooting or the order
+of its children; :class:`TopologyCache` encodes each distinct topology once,
+keyed by the :attr:`newick.Tree.topology` computed when the tree was parsed,
+and returns the same split tuple for every tree with that topology.
+"""
+from __future__ import division
+
+import numpy as np
+
+
+class TaxonIndex(object):
+    """
+    Numbering of a fixed set of taxon labels.
+    """
+
+    def __init__(self, labels):
+        self.labels = sorted(labels)
+        self.index = dict((label, i) for i, label in enumerate(self.labels))
+        self.all = (1 << len(self.labels)) - 1
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def of_tree(cls, tree):
+        return cls(label for label in tree.labels if label is not None)
+
+    def normalize(self, mask):
+        """
+        The mask for the same split which excludes taxon 0.
+        """
+        return self.all ^ mask if mask & 1 else mask
+
+    def is_trivial(self, mask):
+        """
+        True for pendant edges, which every tree shares.
+        """
+        n = bin(mask).count('1')
+        return n <= 1 or n >= len(self.labels) - 1
+
+    def name(self, mask):
+        """
+        Human-readable name for ``mask``, listing the taxa of its smaller side.
+        """
+        mask = self.normalize(mask)
+        if 2 * bin(mask).count('1') > len(self.labels):
+            mask = self.all ^ mask
+        return ' '.join(label for i, label in enumerate(self.labels)
+                        if mask >> i & 1)
+
+
+def tree_splits(tree, taxa):
+    """
+    Normalized masks of the nontrivial splits in ``tree``, in postorder. The
+    two edges below a bifurcating root are the same split, listed once.
+    """
+    labels = tree.labels
+    masks = [0] * len(labels)
+    children = tree.n_children().tolist()
+    result = []
+    seen = set()
+    for i, parent in enumerate(tree.parent.tolist()):
+        if not children[i]:
+            try:
+                masks[i] = 1 << taxa.index[labels[i]]
+            except KeyError:
+                raise ValueError('Taxon {0} is not in the taxon index'.format(
+                    labels[i]))
+        elif parent >= 0:
+            mask = taxa.normalize(masks[i])
+            if not taxa.is_trivial(mask) and mask not in seen:
+                seen.add(mask)
+                result.append(mask)
+        if parent >= 0:
+            masks[parent] |= masks[i]
+    return result
+
+
+class TopologyCache(object):
+    """
+    Splits of trees, computed once per distinct topology.
+
+    :meth:`splits` returns a tuple of split masks as from :func:`tree_splits`.
+    Trees with the same topology get the same tuple object, even when they
+    are rooted or ordered differently, so the tuple can key per-topology
+    work.
+    """
+
+    def __init__(self, taxa):
+        self.taxa = taxa
+        # By taxon namespace and :attr:`newick.Tree.topology`, whose masks
+        # number taxa by the namespace
+        self.parsed = {}
+        self.topologies = {}
+
+    def splits(self, tree):
+        key = tree.taxa, tree.topology
+        result = self.parsed.get(key)
+        if result is None:
+            result = tuple(tree_splits(tree, self.taxa))
+            result = self.topologies.setdefault(frozenset(result), result)
+            self.parsed[key] = result
+        return result
+
+    def __len__(self):
+        """
+        Number of distinct topologies seen.
+        """
+        return len(self.topologies)
+
+
+class SplitFrequencies(object):
+    """
+    Frequencies of the splits of several samples of trees.
+
+    Each split seen is assigned a row; :meth:`frequencies` returns an array
+    with one row per split and one column per sample.
+    """
+
+    def __init__(self, taxa):
+        self.taxa = taxa
+        self.split_ids = {}
+        self.masks = []
+        self.samples = []
+
+    def copy(self):
+        """
+        A copy sharing the arrays of the samples already added, to which
+        further samples may be added independently.
+        """
+        result = SplitFrequencies(self.taxa)
+        result.split_ids = dict(self.split_ids)
+        result.masks = list(self.masks)
+        result.samples = list(self.samples)
+        return result
+
+    def split_id(self, mask):
+        i = self.split_ids.get(mask)
+        if i is None:
+            i = self.split_ids[mask] = len(self.masks)
+            self.masks.append(mask)
+        return i
+
+    def add_sample(self, split_lists, weights=None):
+        """
+        Add a sample of trees, given as an iterable of sequences of split
+        masks. ``weights``, if given, holds one non-negative weight per tree.
+        Returns the column of the new sample.
+
+        Split ids are looked up once per distinct sequence, so sequences
+        shared between trees, as from :class:`TopologyCache`, are cheap.
+        """
+        ids_of_splits = {}
+        ids = []
+        sizes = []
+        for masks in split_lists:
+            shared = isinstance(masks, tuple)
+            tree_ids = ids_of_splits.get(masks) if shared else None
+            if tree_ids is None:
+                tree_ids = [self.split_id(mask) for mask in masks]
+                if shared:
+                    ids_of_splits[masks] = tree_ids
+            ids.extend(tree_ids)
+            sizes.append(len(tree_ids))
+        n_trees = len(sizes)
+        if weights is None:
+            weights = np.ones(n_trees)
+        else:
+            weights = np.asarray(weights, dtype=float)
+            if len(weights) != n_trees:
+                raise ValueError('{0} weights for {1} trees'.format(len(weights), n_trees))
+        if not n_trees or not weights.sum() > 0:
+            raise ValueError('Empty sample')
+        ids = np.asarray(ids, dtype=np.intp)
+        tree_of_id = np.repeat(np.arange(n_trees), sizes)
+        self.samples.append((ids, weights[tree_of_id] / weights.sum()))
+        return len(self.samples) - 1
+
+    def frequencies(self):
+        result = np.zeros((len(self.masks), len(self.samples)))
+        for j, (ids, w) in enumerate(self.samples):
+            # minlength must be positive in older NumPy
+            counts = np.bincount(ids, weights=w, minlength=max(1, len(self.masks)))
+            result[:, j] = counts[:len(self.masks)]
+        return result
+
+    def names(self):
+        return [self.taxa.name(mask) for mask in self.masks]
+
+
+def sdsf(frequencies, min_support=0.1):
+    """
+    Average and maximum standard deviation of split frequencies between the
+    columns of ``frequencies``, over the splits with frequency at least
+    ``min_support`` in some sample, and a boolean array marking those splits.
+
+    The standard deviation is that of MrBayes' ``sump``, with ``n - 1``
+    degrees of freedom.
+    """
+    frequencies = np.asarray(frequencies)
+    keep = frequencies.max(axis=1) >= min_support
+    if not keep.any():
+        return 0.0, 0.0, keep
+    sd = frequencies[keep].std(axis=1, ddof=1)
+    return float(sd.mean()), float(sd.max()), keep
@@ -0,0 +1,105 @@
+"""
+Columnar sidecar for sts-online JSON results.
+
+:func:`write_sidecar` converts the numeric and short string fields of an
+sts-online result into typed NumPy arrays, stored uncompressed next to the
+result (``x.sts.json`` -> ``x.sts.npz``). Columns are named
+``<section>.<field>``, e.g. ``trees.logWeight`` or ``generations.ess``.
+
+:func:`load_columns` reads only the requested columns from the sidecar, or
+from the JSON itself when there is no sidecar, it is out of date, or it lacks
+a column.
+"""
+import os
+
+import numpy as np
+
+from stsanalysis import stsjson
+
+FIELDS = {
+    'trees': (('particleID', np.int64),
+              ('logWeight', np.float64),
+              ('treeLength', np.float64)),
+    'generations': (('T', np.int64),
+                    ('ess', np.float64),
+                    ('uniqueParticles', np.int64),
+                    ('totalUpdatePartialsCalls', np.int64),
+                    ('sequence', str)),
+    'proposals': (('T', np.int64),
+                  ('newLogLike', np.float64)),
+}
+
+# Size and modification time of the JSON the sidecar was built from
+_SOURCE = 'source.stat'
+
+
+def sidecar_path(json_path):
+    return os.path.splitext(json_path)[0] + '.npz'
+
+
+def _source_stat(json_path):
+    st = os.stat(json_path)
+    return np.array([st.st_size, st.st_mtime], dtype=np.float64)
+
+
+def _read_json(json_path, columns):
+    """
+    Read ``columns`` from the JSON result. Columns absent from any record
+    are left out.
+    """
+    wanted = {}
+    for column in columns:
+        section, field = column.split('.', 1)
+        wanted.setdefault(section, set()).add(field)
+
+    values = dict((c, []) for c in columns)
+    missing = set()
+    with open(json_path) as fp:
+        for section, record in stsjson.iter_sections(fp, list(wanted)):
+            for field in wanted[section]:
+                column = section + '.' + field
+                try:
+                    values[column].append(record[field])
+                except KeyError:
+                    missing.add(column)
+
+    dtypes = dict((s + '.' + f, t) for s, fields in FIELDS.items() for f, t in fields)
+    return dict((c, np.array(v, dtype=dtypes.get(c)))
+                for c, v in values.items() if c not in missing)
+
+
+def write_sidecar(json_path, path=None):
+    """
+    Write every column of :data:`FIELDS` found in ``json_path`` to the
+    sidecar ``path`` [default: :func:`sidecar_path`].
+    """
+    path = path or sidecar_path(json_path)
+    columns = [s + '.' + f for s, fields in FIELDS.items() for f, _ in fields]
+    arrays = _read_json(json_path, columns)
+    arrays[_SOURCE] = _source_stat(json_path)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fp:
+        np.savez(fp, **arrays)
+    os.rename(tmp, path)
+
+
+def load_columns(json_path, columns):
+    """
+    Dictionary mapping each name in ``columns`` to an array of its values in
+    the sts-online result ``json_path``.
+
+    Raises ``KeyError`` if a column is not present in the result.
+    """
+    path = sidecar_path(json_path)
+    if os.path.exists(path):
+        with np.load(path) as npz:
+            if (_SOURCE in npz.files and
+                    np.array_equal(npz[_SOURCE], _source_stat(json_path)) and
+                    all(c in npz.files for c in columns)):
+                return dict((c, npz[c]) for c in columns)
+
+    result = _read_json(json_path, columns)
+    for column in columns:
+        if column not in result:
+            raise KeyError('{0}: no column {1}'.format(json_path, column))
+    return result
@@ -0,0 +1,176 @@
+"""
+Incremental reader for sts-online JSON results.
+
+An sts-online result is an object whose ``trees``, ``generations`` and
+``proposals`` members are arrays of records. With many particles the
+``trees`` array holds thousands of Newick strings, so rather than loading
+the whole document, :func:`iter_sections` yields one record at a time and
+scans over the members it was not asked for without decoding them.
+Memory use is bounded by the largest record plus the read size.
+"""
+import collections
+import json
+import re
+
+CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+_NUMBER_CHARS = '0123456789.eE+-'
+_WHITESPACE = re.compile(r'\s*')
+_STRUCTURE = re.compile(r'["\[\]{}]')
+# The rest of a string, after its opening quote
+_STRING_END = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+
+
+class _Reader(object):
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """
+        Read another chunk, dropping the text already consumed. Returns
+        False at the end of the file.
+        """
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def error(self, message):
+        return ValueError('{0}: {1} near {2!r}'.format(
+            getattr(self.fp, 'name', '<stream>'), message,
+            self.buf[self.pos:self.pos + 40]))
+
+    def peek(self):
+        """
+        Next non-whitespace character, or '' at the end of the file.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return ''
+
+    def next(self, expected):
+        """
+        Consume the next non-whitespace character, which must be in ``expected``.
+        """
+        c = self.peek()
+        if not c or c not in expected:
+            raise self.error('expected one of {0!r}'.format(expected))
+        self.pos += 1
+        return c
+
+    def value(self):
+        """
+        Decode the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self.more():
+                    raise
+                continue
+            # A number cut off by the end of the buffer decodes as a shorter
+            # number; read on until it is followed by something else.
+            if self.eof or (end < len(self.buf) and
+                            self.buf[end] not in _NUMBER_CHARS):
+                self.pos = end
+                return value
+            self.more()
+
+    def skip(self):
+        """
+        Move past the next JSON value without decoding it.
+        """
+        if self.peek() not in '[{"':
+            self.value()
+            return
+        depth = 0
+        while True:
+            m = _STRUCTURE.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self.more():
+                    raise self.error('unexpected end of file')
+                continue
+            c = m.group()
+            self.pos = m.end()
+            if c == '"':
+                self._skip_string()
+            elif c in '[{':
+                depth += 1
+            else:
+                depth -= 1
+            if depth == 0:
+                return
+
+    def _skip_string(self):
+        while True:
+            m = _STRING_END.match(self.buf, self.pos)
+            if m is not None:
+                self.pos = m.end()
+                return
+            if not self.more():
+                raise self.error('unterminated string')
+
+
+def iter_sections(fp, sections=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield ``(section, record)`` pairs for each element of the top-level arrays
+    named in ``sections`` (all arrays if ``None``), in file order.
+
+    Reading stops as soon as every requested section has been read.
+    """
+    remaining = None if sections is None else set(sections)
+    r = _Reader(fp, chunk_size)
+    r.next('{')
+    if r.peek() == '}':
+        return
+    while True:
+        key = r.value()
+        r.next(':')
+        if (remaining is None or key in remaining) and r.peek() == '[':
+            r.next('[')
+            if r.peek() == ']':
+                r.next(']')
+            else:
+                while True:
+                    yield key, r.value()
+                    if r.next(',]') == ']':
+                        break
+            if remaining is not None:
+                remaining.discard(key)
+                if not remaining:
+                    return
+        else:
+            r.skip()
+        if r.next(',}') == '}':
+            return
+
+
+def records(path, section):
+    """
+    Yield the records of ``section`` of the sts-online result ``path``.
+    """
+    with open(path) as fp:
+        for _, record in iter_sections(fp, [section]):
+            yield record
+
+
+def last_record(path, section):
+    """
+    Last record of ``section``, or ``None`` if the section is empty.
+    """
+    last = collections.deque(records(path, section), maxlen=1)
+    return last[0] if last else None
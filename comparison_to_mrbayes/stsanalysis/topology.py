@@ -0,0 +1,255 @@
+"""
+Distances between posterior trees and a reference tree.
+
+Trees are read with :mod:`stsanalysis.newick` and reduced to the lengths of
+their splits, so the reference is encoded once and each posterior tree is
+compared with it in a single pass. The distances are identical to those of
+:mod:`dendropy.calculate.treecompare`.
+"""
+from __future__ import division
+import collections
+import itertools
+import math
+import os.path
+
+import numpy as np
+
+from stsanalysis import mrbayes, newick, stsjson
+
+HEADER = ('file', 'log_weight', 'rf_distance', 'weighted_rf', 'euclidean')
+
+
+def compute_expectation(fn, trees):
+    """
+    Computes the weighted expectation of applying ``fn`` to each tree in ``trees``.
+
+    ``fn`` should return a double.
+    """
+    log_weights = []
+    results = []
+
+    for tree in trees:
+        log_weights.append(tree.log_weight)
+        results.append(fn(tree))
+
+    max_log_weight = max(log_weights)
+    result = 0.0
+    weight_sum = 0.0
+    for lw, r in itertools.izip_longest(log_weights, results):
+        w = math.exp(lw - max_log_weight)
+        weight_sum += w
+        result += r * w
+
+    return result / weight_sum
+
+
+# Topology of a tree as dendropy encodes it: the nodes whose edges remain,
+# in postorder, the split of each, and the ``(keep, drop)`` pair of root
+# edges merged when a basal bifurcation is collapsed, or None.
+Encoding = collections.namedtuple('Encoding', ['nodes', 'masks', 'merge'])
+
+
+def encode_splits(tree):
+    """
+    Encode the splits of the :class:`newick.Tree` ``tree`` as dendropy's
+    :meth:`~dendropy.Tree.encode_bipartitions` would, returning an
+    :class:`Encoding`. Bit ``i`` of a split stands for taxon ``i`` of the
+    tree's namespace, so trees to be compared must share a namespace.
+
+    A basal bifurcation of an unrooted tree is collapsed into the other
+    root edge; splits of unrooted trees exclude the tree's first taxon.
+    """
+    parent = tree.parent.tolist()
+    taxon = tree.taxon.tolist()
+    n = len(parent)
+    root = n - 1
+    rooted = tree.rooted
+    nodes = range(n)
+    merge = None
+    children = tree.n_children().tolist()
+    if not rooted and children[root] == 2:
+        c0, c1 = [i for i in range(root) if parent[i] == root]
+        if children[c1] >= 2:
+            merge = c0, c1
+        elif children[c0] >= 2:
+            merge = c1, c0
+        if merge is not None:
+            drop = merge[1]
+            for i in range(drop):
+                if parent[i] == drop:
+                    parent[i] = root
+            nodes = [i for i in nodes if i != drop]
+            rooted = False
+
+    masks = [0] * n
+    for i in nodes:
+        if taxon[i] >= 0:
+            masks[i] = 1 << taxon[i]
+        if i != root:
+            masks[parent[i]] |= masks[i]
+
+    fill = masks[root]
+    lowest = fill & -fill
+    result = []
+    for i in nodes:
+        mask = masks[i]
+        if rooted:
+            mask &= fill
+        elif mask & lowest:
+            mask = ~mask & fill
+        else:
+            mask &= fill
+        result.append(mask)
+    return Encoding(nodes, result, merge)
+
+
+def node_lengths(tree, merge):
+    """
+    Lengths of the edges of ``tree`` after merging the root edges ``merge``.
+    A missing root edge length is 0.0; other missing lengths are NaN.
+    """
+    length = tree.length.copy()
+    if merge is not None:
+        keep, drop = merge
+        # A missing length on either edge leaves the other unchanged
+        if not np.isnan(length[drop]):
+            length[keep] += length[drop]
+    if np.isnan(length[-1]):
+        length[-1] = 0.0
+    return length
+
+
+def edge_lengths(tree):
+    """
+    Dictionary mapping the split of each edge of ``tree`` to its length, in
+    the order of dendropy's :attr:`~dendropy.Tree.bipartition_edge_map`.
+    """
+    encoding = encode_splits(tree)
+    length = node_lengths(tree, encoding.merge).tolist()
+    result = {}
+    for node, mask in zip(encoding.nodes, encoding.masks):
+        result[mask] = length[node]
+    return result
+
+
+# Topology-only part of a comparison with the reference: for each reference
+# split, the node with the same split, or -1; the remaining nodes, in the
+# order dendropy visits them; the symmetric difference; and the merged root
+# edges, as in :class:`Encoding`.
+_Plan = collections.namedtuple('_Plan', ['matched', 'unmatched', 'rf', 'merge'])
+
+
+class Reference(object):
+    """
+    Edge lengths of a reference tree, compared with other trees by
+    :meth:`distances`.
+
+    The symmetric difference and the node matching each reference split
+    are computed once per shape (:attr:`newick.Tree.shape`), so duplicated
+    trees only cost the comparison of their edge lengths. This memo is per
+    shape rather than per :attr:`newick.Tree.topology`: the plan indexes
+    the tree's nodes, which differ between rootings and child orders of one
+    topology. Trees must share the reference's taxon namespace.
+    """
+
+    def __init__(self, tree):
+        self.taxa = tree.taxa
+        edges = edge_lengths(tree)
+        self.masks = list(edges)
+        self.lengths = np.nan_to_num(np.array([edges[m] for m in self.masks]))
+        self.plans = {}
+
+    def _plan(self, tree):
+        encoding = encode_splits(tree)
+        # Mirror the dictionaries dendropy builds, so the unmatched splits
+        # come out in the same order
+        edges = {}
+        for node, mask in zip(encoding.nodes, encoding.masks):
+            edges[mask] = node
+        unmatched = dict(edges)
+        matched = [unmatched.pop(m, -1) for m in self.masks]
+        rf = matched.count(-1) + len(unmatched)
+        return _Plan(np.array(matched, dtype=np.intp),
+                     np.array(list(unmatched.values()), dtype=np.intp),
+                     rf, encoding.merge)
+
+    def distances(self, tree):
+        """
+        Symmetric difference, weighted Robinson-Foulds and Euclidean distances
+        between the reference and the :class:`newick.Tree` ``tree``.
+
+        The distances are identical to those of
+        :mod:`dendropy.calculate.treecompare`, which are summed in the order
+        of the reference's splits and then the tree's unmatched splits.
+        """
+        plan = self.plans.get(tree.shape)
+        if plan is None:
+            plan = self.plans[tree.shape] = self._plan(tree)
+
+        length = node_lengths(tree, plan.merge)
+        missing = np.isnan(length)
+        if missing.any():
+            if np.in1d(np.flatnonzero(missing), plan.matched).any():
+                raise ValueError('Edge length is missing')
+            length[missing] = 0.0
+        # Reference splits missing from the tree are compared with 0.0
+        length = np.append(length, 0.0)
+
+        diffs = np.concatenate((self.lengths - length[plan.matched],
+                                0.0 - length[plan.unmatched])).tolist()
+        weighted = sum([abs(d) for d in diffs])
+        euclidean = math.sqrt(sum([pow(d, 2) for d in diffs]))
+        return [plan.rf, weighted, euclidean]
+
+
+def read_json_trees(path, nexus_burnin=0, taxa=None):
+    # Resampled particles are often exact copies; parse each once
+    parsed = {}
+    with open(path) as fp:
+        for _, record in stsjson.iter_sections(fp, ['trees']):
+            s = record['newickString']
+            tree = parsed.get(s)
+            if tree is None:
+                tree = parsed[s] = newick.parse(s, taxa)
+            yield tree, record['logWeight']
+
+
+def read_nexus_trees(path, nexus_burnin=0, taxa=None):
+    with open(path) as fp:
+        for tree in mrbayes.iter_trees(fp, nexus_burnin, taxa):
+            yield tree, 0
+
+
+def read_newick_trees(path, nexus_burnin=0, taxa=None):
+    with open(path) as fp:
+        for line in fp:
+            if line.strip():
+                yield newick.parse(line, taxa), 0
+
+
+# Readers yielding ``(tree, log_weight)`` for each tree of a file, after
+# ``nexus_burnin`` trees of NEXUS files, by file extension. Taxa are numbered
+# by the :class:`newick.TaxonNamespace` ``taxa``, or a new namespace per tree.
+tree_readers = {'.json': read_json_trees, '.t': read_nexus_trees,
+                '.nex': read_nexus_trees, '.nwk': read_newick_trees,
+                '.trees': read_newick_trees}
+
+
+def compare_to_reference(reference_tree, compare_trees, nexus_burnin=0):
+    """
+    Compare each tree in the files ``compare_trees`` with the Newick tree in
+    the file ``reference_tree``.
+
+    Yields rows matching :data:`HEADER`. The first ``nexus_burnin`` trees of
+    NEXUS files are skipped.
+    """
+    # Trees need a common taxon numbering
+    taxa = newick.TaxonNamespace()
+
+    with open(reference_tree) as fp:
+        ref = Reference(newick.parse(fp.read(), taxa))
+
+    for path in compare_trees:
+        read = tree_readers[os.path.splitext(path)[1]]
+        for tree, weight in read(path, nexus_burnin, taxa):
+            yield [path, weight] + ref.distances(tree)
@@ -0,0 +1,126 @@
+"""
+Distributions of RF distances within and between posterior samples, as
+summarized by BAli-Phy's ``trees-distances compare``.
+
+For files 1 and 2, D11 and D22 are the distances between distinct trees of
+the same file and D12 the distances between a tree of file 1 and one of file
+2. Each is summarized by its mean and central 95% interval, and
+P(D12 > Dii) is the probability that an independent draw from D12 exceeds
+one from Dii.
+
+RF distances are integers, so each distribution is kept as a histogram.
+Every file is read once; the histograms within each file and between each
+pair of files are computed in a process pool.
+"""
+from __future__ import division
+import collections
+import itertools
+import multiprocessing
+
+import numpy as np
+
+from stsanalysis import rfmatrix
+
+PosteriorComparison = collections.namedtuple(
+        'PosteriorComparison',
+        ['tree1', 'tree2',
+         'd11_mean', 'd11_lower', 'd11_upper',
+         'd22_mean', 'd22_lower', 'd22_upper',
+         'd12_mean', 'd12_lower', 'd12_upper',
+         'p_d12_g_d11',
+         'p_d12_g_d22'])
+
+CREDIBLE_INTERVAL = 0.95
+
+# Samples of the files being compared, inherited by the pool's workers
+_samples = None
+_ranges = None
+
+
+def _histogram(task, tile_size=256):
+    """
+    Counts of each RF distance within the file ``task[0]``, or between files
+    ``task[0]`` and ``task[1]``.
+    """
+    rows = _ranges[task[0]]
+    cols = _ranges[task[-1]]
+    within = len(task) == 1
+    counts = np.zeros(1, dtype=np.int64)
+    for i in range(0, len(rows), tile_size):
+        r = rows[i:i + tile_size]
+        for j in range(i if within else 0, len(cols), tile_size):
+            c = cols[j:j + tile_size]
+            block = _samples.rf_tile(r, c)
+            if within and i == j:
+                # Distinct pairs only
+                block = block[np.triu_indices(len(r), 1)]
+            block_counts = np.bincount(block.ravel())
+            if len(block_counts) > len(counts):
+                block_counts[:len(counts)] += counts
+                counts = block_counts
+            else:
+                counts[:len(block_counts)] += block_counts
+    return task, counts
+
+
+def summarize(counts, ci=CREDIBLE_INTERVAL):
+    """
+    Mean and central ``ci`` interval of the distances with histogram
+    ``counts``.
+    """
+    n = counts.sum()
+    if not n:
+        return float('nan'), float('nan'), float('nan')
+    values = np.arange(len(counts))
+    cdf = np.cumsum(counts) / n
+    lower = np.searchsorted(cdf, (1 - ci) / 2)
+    upper = np.searchsorted(cdf, (1 + ci) / 2)
+    return float(np.dot(values, counts) / n), float(lower), float(upper)
+
+
+def p_greater(counts1, counts2):
+    """
+    Probability that a draw from the histogram ``counts1`` exceeds an
+    independent draw from ``counts2``.
+    """
+    n1, n2 = counts1.sum(), counts2.sum()
+    if not n1 or not n2:
+        return float('nan')
+    # Number of draws from counts2 below each value
+    below = np.concatenate(([0], np.cumsum(counts2)))
+    below = below[np.minimum(np.arange(len(counts1)), len(counts2))]
+    return float(np.dot(counts1, below) / (n1 * n2))
+
+
+def compare_posteriors(paths, burnin=0, processes=None, split_cache=False):
+    """
+    Compare each pair of the tree files ``paths``, skipping ``burnin`` trees
+    of MrBayes files. Yields a :class:`PosteriorComparison` per pair, in the
+    order of :func:`itertools.combinations`. Splits are read from the files'
+    :mod:`splitcache` if ``split_cache`` is set.
+    """
+    global _samples, _ranges
+    _samples = rfmatrix.SampleSplits()
+    _ranges = []
+    for path in paths:
+        start = len(_samples)
+        if split_cache:
+            _samples.add_cached(path, burnin)
+        else:
+            _samples.add_file(path, burnin)
+        _ranges.append(np.arange(start, len(_samples)))
+
+    pairs = list(itertools.combinations(range(len(paths)), 2))
+    tasks = [(i,) for i in range(len(paths))] + pairs
+    pool = multiprocessing.Pool(processes)
+    try:
+        counts = dict(pool.imap_unordered(_histogram, tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+    for i, j in pairs:
+        d11, d22, d12 = counts[(i,)], counts[(j,)], counts[(i, j)]
+        yield PosteriorComparison(*((paths[i], paths[j]) +
+                                    summarize(d11) + summarize(d22) + summarize(d12) +
+                                    (p_greater(d12, d11), p_greater(d12, d22))))
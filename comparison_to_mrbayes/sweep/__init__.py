@@ -0,0 +1,3 @@
+"""
+Execution machinery for the simulation sweep in ``run_simulations.py``.
+"""
@@ -0,0 +1,214 @@
+"""
+Content-addressed store of step outputs, shared between output directories.
+
+A cacheable task is keyed by its signature, with the output directory replaced
+by a placeholder, and the content hashes of its inputs. The store holds one
+file per distinct output under ``objects/``, and one JSON entry per key under
+``entries/`` naming the objects for each output. Cache hits are materialized
+by hard link, falling back to a reflink or a copy across file systems.
+
+Entries are touched whenever they are used; when the objects exceed
+``max_size`` bytes the least recently used entries are evicted, along with
+any objects no longer referenced.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+import subprocess
+import threading
+import time
+
+from .manifest import task_signature
+
+log = logging.getLogger('sts.cache')
+
+# Unreferenced objects younger than this may belong to an entry still being
+# written by another process
+GRACE_SECONDS = 600
+
+_SUFFIXES = {'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
+
+
+def parse_size(s):
+    """
+    Parse a size in bytes, with an optional K, M, G or T suffix.
+
+    >>> parse_size('2G')
+    2147483648
+    """
+    s = s.strip().lower().rstrip('b')
+    if s and s[-1] in _SUFFIXES:
+        return int(float(s[:-1]) * _SUFFIXES[s[-1]])
+    return int(s)
+
+
+def materialize(src, dst):
+    """
+    Make ``dst`` a copy of ``src``: a hard link if possible, otherwise a
+    reflink or a plain copy.
+    """
+    _remove(dst)
+    try:
+        os.link(src, dst)
+        return
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+    with open(os.devnull, 'w') as devnull:
+        if subprocess.call(['cp', '--reflink=always', src, dst], stderr=devnull) == 0:
+            return
+    shutil.copyfile(src, dst)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+class ArtifactCache(object):
+    """
+    Cache rooted at ``path``. ``output_dir`` is the output directory of the
+    current sweep; it is replaced by a placeholder in cache keys so that
+    entries are shared between output directories.
+    """
+
+    def __init__(self, path, output_dir, max_size=None):
+        self.path = path
+        # Paths below output_dir, not longer names ending in it, such as
+        # 'old-output/' or the 'sim.output/' of another sweep
+        self._output_re = re.compile(r'(?<![\w.-]){0}(?=/)'.format(
+            re.escape(os.path.normpath(output_dir))))
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        for d in ('objects', 'entries', 'tmp'):
+            d = os.path.join(path, d)
+            if not os.path.isdir(d):
+                try:
+                    os.makedirs(d)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+
+    def relocate(self, s):
+        return self._output_re.sub('{output}', s)
+
+    def key(self, task, digest):
+        """
+        Cache key for ``task``; ``digest`` maps a path to its content hash.
+        """
+        inputs = [(self.relocate(path), digest(path)) for path in task.inputs]
+        k = json.dumps([self.relocate(task_signature(task)), inputs])
+        return hashlib.sha1(k.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, 'entries', key + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    def _tmp_path(self, name):
+        return os.path.join(self.path, 'tmp', '{0}.{1}.{2}'.format(
+            name, os.getpid(), threading.current_thread().ident))
+
+    def fetch(self, task, digest):
+        """
+        Materialize the outputs of ``task`` from the cache, returning whether
+        there was a hit.
+        """
+        entry_path = self._entry_path(self.key(task, digest))
+        try:
+            with open(entry_path) as fp:
+                entry = json.load(fp)
+            for path in task.outputs:
+                materialize(self._object_path(entry['outputs'][self.relocate(path)]), path)
+            os.utime(entry_path, None)
+        except (IOError, OSError, KeyError, ValueError):
+            # Missing, or evicted while we were reading it
+            return False
+        task.elapsed = entry.get('elapsed')
+        log.info('Cached: %s', task.name)
+        return True
+
+    def store(self, task, digest):
+        """
+        Add the outputs of ``task`` to the cache.
+        """
+        outputs = {}
+        for path in task.outputs:
+            d = digest(path)
+            obj = self._object_path(d)
+            if not os.path.exists(obj):
+                if not os.path.isdir(os.path.dirname(obj)):
+                    try:
+                        os.mkdir(os.path.dirname(obj))
+                    except OSError as e:
+                        if e.errno != errno.EEXIST:
+                            raise
+                tmp = self._tmp_path(d)
+                shutil.copyfile(path, tmp)
+                os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.rename(tmp, obj)
+            materialize(obj, path)
+            outputs[self.relocate(path)] = d
+
+        key = self.key(task, digest)
+        tmp = self._tmp_path(key)
+        with open(tmp, 'w') as fp:
+            json.dump({'name': task.name, 'outputs': outputs,
+                       'elapsed': task.elapsed}, fp)
+        os.rename(tmp, self._entry_path(key))
+
+        if self.max_size is not None:
+            with self._lock:
+                self.evict(self.max_size)
+
+    def evict(self, max_size):
+        """
+        Remove least recently used entries until the objects referenced by the
+        remaining entries total at most ``max_size`` bytes, then delete
+        unreferenced objects.
+        """
+        entries_dir = os.path.join(self.path, 'entries')
+        entries = []
+        for name in os.listdir(entries_dir):
+            p = os.path.join(entries_dir, name)
+            try:
+                with open(p) as fp:
+                    outputs = json.load(fp)['outputs']
+                entries.append((os.path.getmtime(p), p, set(outputs.values())))
+            except (IOError, OSError, KeyError, ValueError):
+                continue
+        entries.sort(reverse=True)
+
+        sizes = {}
+        recent = set()
+        now = time.time()
+        for root, _, files in os.walk(os.path.join(self.path, 'objects')):
+            for f in files:
+                st = os.stat(os.path.join(root, f))
+                sizes[f] = st.st_size
+                if now - st.st_mtime < GRACE_SECONDS:
+                    recent.add(f)
+
+        keep = set()
+        total = 0
+        for mtime, p, digests in entries:
+            new = digests - keep
+            size = sum(sizes.get(d, 0) for d in new)
+            if keep and total + size > max_size:
+                log.info('Evicting %s', os.path.basename(p))
+                _remove(p)
+                continue
+            keep |= new
+            total += size
+
+        for d in set(sizes) - keep - recent:
+            _remove(self._object_path(d))
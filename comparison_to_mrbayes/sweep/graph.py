@@ -0,0 +1,255 @@
+"""
+Dependency graph of pipeline steps, run on a pool of worker threads.
+
+Each task declares the files it reads and writes. Tasks are added in program
+order: a task depends on the most recent task writing any of its inputs, and
+on the most recent task writing any of its outputs, so the graph runs the same
+steps as the equivalent serial script but overlaps everything independent.
+"""
+import collections
+import heapq
+import logging
+import multiprocessing
+import subprocess
+import threading
+import traceback
+from timeit import default_timer as timer
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+log = logging.getLogger('sts.graph')
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class Task(object):
+    """
+    A single pipeline step.
+
+    A task either runs ``cmds``, a list of argument lists executed in order
+    with ``check_call``, or calls ``func(*args, **kwargs)``. CPU-bound Python
+    functions should set ``process`` to run in the graph's process pool rather
+    than in the worker thread. The outputs of ``cacheable`` tasks may be shared
+    between output directories.
+    """
+
+    def __init__(self, name, cmds=None, func=None, args=(), kwargs=None,
+                 inputs=(), outputs=(), deps=(), cwd=None, cacheable=False,
+                 process=False):
+        if (cmds is None) == (func is None):
+            raise ValueError('Task {0}: specify exactly one of cmds, func'.format(name))
+        self.name = name
+        self.cmds = cmds
+        self.func = func
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.cwd = cwd
+        self.cacheable = cacheable
+        self.process = process
+        self.pool = None
+        # Outputs replaced by a later task
+        self.overwritten = set()
+        self.state = PENDING
+        self.elapsed = None
+
+    def __repr__(self):
+        return 'Task({0!r})'.format(self.name)
+
+    def run(self):
+        if self.func is not None:
+            if self.process and self.pool is not None:
+                return self.pool.apply(_call, (self.func, self.args, self.kwargs))
+            return self.func(*self.args, **self.kwargs)
+        for cmd in self.cmds:
+            log.debug('Running: %s', ' '.join(cmd))
+            subprocess.check_call(cmd, cwd=self.cwd)
+
+
+class TaskGraph(object):
+    def __init__(self):
+        self.tasks = collections.OrderedDict()
+        self._writers = {}
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __iter__(self):
+        return iter(self.tasks.values())
+
+    def add(self, name, **kwargs):
+        """
+        Add a task named ``name``; ``kwargs`` are passed to :class:`Task`.
+
+        Returns the new task, which may be passed in ``deps`` of later tasks.
+        """
+        if name in self.tasks:
+            raise ValueError('Duplicate task: {0}'.format(name))
+        task = Task(name, **kwargs)
+        deps = list(task.deps)
+        for path in task.inputs + task.outputs:
+            writer = self._writers.get(path)
+            if writer is not None:
+                deps.append(writer)
+        for path in task.outputs:
+            if path in self._writers:
+                self._writers[path].overwritten.add(path)
+        task.deps = _unique(d for d in deps if d is not task)
+        for path in task.outputs:
+            self._writers[path] = task
+        self.tasks[name] = task
+        return task
+
+    def dependents(self):
+        result = collections.defaultdict(list)
+        for task in self:
+            for dep in task.deps:
+                result[dep].append(task)
+        return result
+
+    def heights(self):
+        """
+        Length of the longest chain of dependents below each task; tasks on
+        the critical path are started first.
+        """
+        dependents = self.dependents()
+        height = {}
+        for task in reversed(list(self)):
+            height[task] = 1 + max([height[d] for d in dependents[task]] or [0])
+        return height
+
+    def start_pool(self, processes):
+        """
+        Start a pool of ``processes`` worker processes for the tasks with
+        ``process`` set. The pool must be started before any threads.
+        """
+        pool = multiprocessing.Pool(processes)
+        for task in self:
+            task.pool = pool
+        return pool
+
+    def run(self, jobs=1, execute=None):
+        """
+        Run all tasks, at most ``jobs`` at a time.
+
+        ``execute`` is called with each task in a worker thread; it defaults to
+        :func:`execute_task`. A failed task causes everything depending on it
+        to be skipped, but independent tasks carry on. Returns the list of
+        tasks which failed or were skipped.
+        """
+        execute = execute or execute_task
+        pool = None
+        if jobs > 1 and any(task.process for task in self):
+            pool = self.start_pool(jobs)
+        dependents = self.dependents()
+        height = self.heights()
+        order = dict((task, i) for i, task in enumerate(self))
+        waiting = dict((task, len(task.deps)) for task in self)
+
+        ready = []
+
+        def push(task):
+            heapq.heappush(ready, (-height[task], order[task], task))
+
+        for task in self:
+            if not waiting[task]:
+                push(task)
+
+        work = queue.Queue()
+        done = queue.Queue()
+
+        def worker():
+            while True:
+                task = work.get()
+                if task is None:
+                    return
+                try:
+                    execute(task)
+                except Exception as e:
+                    log.exception('%s failed', task.name)
+                    done.put((task, e))
+                else:
+                    done.put((task, None))
+
+        threads = [threading.Thread(target=worker) for _ in range(max(1, jobs))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        def skip(task):
+            for d in dependents[task]:
+                if d.state == PENDING:
+                    d.state = SKIPPED
+                    log.warning('Skipping %s: depends on %s', d.name, task.name)
+                    skip(d)
+
+        running = 0
+        try:
+            while ready or running:
+                while ready and running < len(threads):
+                    task = heapq.heappop(ready)[2]
+                    if task.state != PENDING:
+                        continue
+                    work.put(task)
+                    running += 1
+                if not running:
+                    break
+                task, error = done.get()
+                running -= 1
+                if error is not None:
+                    task.state = FAILED
+                    skip(task)
+                    continue
+                task.state = DONE
+                for d in dependents[task]:
+                    waiting[d] -= 1
+                    if not waiting[d] and d.state == PENDING:
+                        push(d)
+        finally:
+            for _ in threads:
+                work.put(None)
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        return [task for task in self if task.state in (FAILED, SKIPPED)]
+
+
+def execute_task(task):
+    log.info('Starting %s', task.name)
+    start = timer()
+    task.run()
+    task.elapsed = timer() - start
+    log.info('Finished %s (%.1fs)', task.name, task.elapsed)
+
+
+class TaskError(Exception):
+    """
+    Failure of a task run in the process pool; carries the formatted
+    traceback, since the original exception may not be picklable.
+    """
+
+
+def _call(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        raise TaskError(traceback.format_exc())
+
+
+def _unique(items):
+    seen = set()
+    result = []
+    for i in items:
+        if i not in seen:
+            seen.add(i)
+            result.append(i)
+    return result
@@ -0,0 +1,180 @@
+"""
+Record of the steps completed in an output directory.
+
+Each completed task appends a line to the manifest holding its signature (the
+commands or function call it ran) and the content hashes of its inputs and
+outputs. On a later run a task is skipped if its signature is unchanged and
+every input and output still has the recorded content, so a sweep restarted
+after a crash or a parameter change only reruns the steps affected.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .graph import execute_task
+
+log = logging.getLogger('sts.manifest')
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-1 of the contents of ``path``"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        while True:
+            block = fp.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def task_signature(task):
+    """
+    String identifying the work done by ``task``: its commands, or the
+    qualified name and arguments of its function.
+    """
+    if task.func is not None:
+        call = ['{0}.{1}'.format(task.func.__module__, task.func.__name__),
+                task.args, sorted(task.kwargs.items())]
+    else:
+        call = task.cmds
+    return json.dumps([call, task.cwd], sort_keys=True, default=repr)
+
+
+class Manifest(object):
+    """
+    Append-only log of completed tasks, stored as one JSON object per line.
+
+    ``force`` runs every task regardless of the manifest, still recording the
+    results. Cacheable tasks which aren't up to date are looked up in
+    ``cache``, an :class:`sweep.cache.ArtifactCache`, if given.
+
+    Workers sharing an output directory each write their own ``shard``,
+    ``<path>.<shard>``. Shards are read along with the main file, and merged
+    into it by the next manifest opened without a shard.
+    """
+
+    def __init__(self, path, force=False, cache=None, shard=None):
+        self.path = path
+        self.force = force
+        self.cache = cache
+        self.entries = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+        self._load(compact=shard is None)
+        self._fp = open(path if shard is None else '{0}.{1}'.format(path, shard), 'a')
+
+    def _shards(self):
+        d, base = os.path.split(self.path)
+        return [os.path.join(d, n) for n in sorted(os.listdir(d or '.'))
+                if n.startswith(base + '.') and not n.endswith('.tmp')]
+
+    def _load(self, compact):
+        shards = self._shards()
+        for p in [self.path] + shards:
+            if not os.path.exists(p):
+                continue
+            with open(p) as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Partial line written as the sweep was killed
+                        continue
+                    self.entries[entry['name']] = entry
+                    for path, (size, mtime, digest) in entry['files'].items():
+                        self._digests[path, size, mtime] = digest
+
+        if compact and self.entries:
+            # Merge shards, dropping superseded entries
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as fp:
+                for entry in self.entries.values():
+                    fp.write(json.dumps(entry, sort_keys=True) + '\n')
+            os.rename(tmp, self.path)
+            for p in shards:
+                os.remove(p)
+        log.info('Loaded %d entries from %s', len(self.entries), self.path)
+
+    def close(self):
+        self._fp.close()
+
+    def stat(self, path):
+        """
+        ``[size, mtime, digest]`` for ``path``, or ``None`` if it doesn't exist.
+
+        Files are only rehashed when their size or modification time changes.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = path, st.st_size, st.st_mtime
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(path)
+            self._digests[key] = digest
+        return [st.st_size, st.st_mtime, digest]
+
+    def digest(self, path):
+        return self.stat(path)[2]
+
+    def up_to_date(self, task):
+        """
+        Whether ``task`` ran with the same signature, inputs and outputs.
+
+        Outputs which a later task in the graph replaces are not checked.
+        """
+        entry = self.entries.get(task.name)
+        if entry is None or entry['signature'] != task_signature(task):
+            return False
+        files = entry['files']
+        for path in task.inputs + task.outputs:
+            if path in task.overwritten:
+                continue
+            st = self.stat(path)
+            if st is None or path not in files or files[path][2] != st[2]:
+                return False
+        return True
+
+    def record(self, task):
+        files = {}
+        for path in task.inputs + task.outputs:
+            st = self.stat(path)
+            if st is not None:
+                files[path] = st
+        entry = {'name': task.name,
+                 'signature': task_signature(task),
+                 'files': files,
+                 'elapsed': task.elapsed}
+        line = json.dumps(entry, sort_keys=True)
+        with self._lock:
+            self.entries[task.name] = entry
+            self._fp.write(line + '\n')
+            self._fp.flush()
+
+    def execute(self, task):
+        """
+        Run ``task`` with :func:`execute_task` unless it is up to date or
+        cached, then record it. Suitable as the ``execute`` argument of
+        ``TaskGraph.run``.
+        """
+        if not self.force and self.up_to_date(task):
+            task.elapsed = self.entries[task.name].get('elapsed')
+            log.info('Up to date: %s', task.name)
+            return
+        cache = self.cache if task.cacheable else None
+        if cache is not None:
+            if not self.force and cache.fetch(task, self.digest):
+                self.record(task)
+                return
+            # Outputs may be hard links into the cache; never write through them
+            for path in task.outputs:
+                if os.path.lexists(path):
+                    os.remove(path)
+        execute_task(task)
+        if cache is not None:
+            cache.store(task, self.digest)
+        self.record(task)
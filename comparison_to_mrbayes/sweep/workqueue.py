@@ -0,0 +1,189 @@
+"""
+Work queue on a shared file system, for running a task graph on many hosts.
+
+The queue directory holds:
+
+``tasks.json``
+    Names and dependencies of the tasks in the graph, written by
+    :meth:`WorkQueue.enqueue`. Every worker builds the same graph and checks it
+    against this list.
+``claims/<task>.<n>``
+    Lease on a task, created with ``O_EXCL`` so that only one worker can hold
+    generation ``n``. The holder touches the file while the task runs; once it
+    is older than the lease period, another worker may claim generation
+    ``n + 1``.
+``done/<task>``, ``failed/<task>``
+    Markers for finished tasks.
+"""
+import errno
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+log = logging.getLogger('sts.workqueue')
+
+LEASE_SECONDS = 600
+
+
+def _file_name(task_name):
+    return task_name.replace('/', '+')
+
+
+class WorkQueue(object):
+    def __init__(self, path, lease=LEASE_SECONDS):
+        self.path = path
+        self.lease = lease
+        self.worker_id = '{0}-{1}'.format(socket.gethostname(), os.getpid())
+
+    def _dir(self, name):
+        return os.path.join(self.path, name)
+
+    def enqueue(self, graph):
+        """
+        Write the task list of ``graph``, discarding the state of any previous
+        queue in the same directory. Steps which are already up to date are
+        skipped by the workers' manifests, not by the queue.
+        """
+        for d in ('claims', 'done', 'failed'):
+            d = self._dir(d)
+            if not os.path.isdir(d):
+                os.makedirs(d)
+            for name in os.listdir(d):
+                os.remove(os.path.join(d, name))
+        tasks = [{'name': t.name, 'deps': [d.name for d in t.deps]} for t in graph]
+        tmp = self._dir('tasks.json.tmp')
+        with open(tmp, 'w') as fp:
+            json.dump(tasks, fp, indent=1)
+        os.rename(tmp, self._dir('tasks.json'))
+        log.info('Queued %d tasks in %s', len(tasks), self.path)
+
+    def check(self, graph):
+        with open(self._dir('tasks.json')) as fp:
+            tasks = json.load(fp)
+        if [t['name'] for t in tasks] != [t.name for t in graph]:
+            raise ValueError('{0} was queued from a different sweep'.format(self.path))
+
+    def finished(self):
+        """
+        Sets of the names of tasks that are done, and that failed.
+        """
+        def names(d):
+            return set(n.replace('+', '/') for n in os.listdir(self._dir(d)))
+        return names('done'), names('failed')
+
+    def _generations(self, fname, claims=None):
+        if claims is None:
+            claims = os.listdir(self._dir('claims'))
+        prefix = fname + '.'
+        return sorted(int(n[len(prefix):]) for n in claims
+                      if n.startswith(prefix) and n[len(prefix):].isdigit())
+
+    def claim(self, task, claims=None):
+        """
+        Try to take the lease on ``task``; returns the claim path, or ``None``
+        if another worker holds it. ``claims`` is an optional listing of the
+        claims directory.
+        """
+        fname = _file_name(task.name)
+        gens = self._generations(fname, claims)
+        if gens:
+            try:
+                age = time.time() - os.path.getmtime(
+                    os.path.join(self._dir('claims'), '{0}.{1}'.format(fname, gens[-1])))
+            except OSError:
+                return None
+            if age < self.lease:
+                return None
+            log.warning('Lease on %s expired %.0fs ago; reclaiming', task.name, age - self.lease)
+        path = os.path.join(self._dir('claims'),
+                            '{0}.{1}'.format(fname, gens[-1] + 1 if gens else 0))
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                return None
+            raise
+        os.write(fd, self.worker_id.encode('utf-8'))
+        os.close(fd)
+        if os.path.exists(os.path.join(self._dir('done'), fname)):
+            # Finished by another worker since we listed the queue
+            os.remove(path)
+            return None
+        return path
+
+    def release(self, task, failed=False):
+        fname = _file_name(task.name)
+        marker = os.path.join(self._dir('failed' if failed else 'done'), fname)
+        with open(marker, 'w') as fp:
+            json.dump({'worker': self.worker_id, 'elapsed': task.elapsed}, fp)
+        for gen in self._generations(fname):
+            try:
+                os.remove(os.path.join(self._dir('claims'), '{0}.{1}'.format(fname, gen)))
+            except OSError:
+                pass
+
+    def _heartbeat(self, path, stop):
+        while not stop.wait(self.lease / 5.0):
+            try:
+                os.utime(path, None)
+            except OSError:
+                log.warning('Lost claim %s', path)
+                return
+
+    def work(self, graph, execute, poll=30):
+        """
+        Claim and run tasks of ``graph`` with ``execute`` until every task
+        has finished or depends on a failed task.
+
+        Returns the number of tasks this worker ran.
+        """
+        self.check(graph)
+        height = graph.heights()
+        tasks = sorted(graph, key=lambda t: -height[t])
+        count = 0
+        while True:
+            done, failed = self.finished()
+            blocked = set(failed)
+            for task in graph:
+                if any(d.name in blocked for d in task.deps):
+                    blocked.add(task.name)
+            remaining = [t for t in tasks if t.name not in done and t.name not in blocked]
+            if not remaining:
+                break
+
+            task = claim = None
+            claims = os.listdir(self._dir('claims'))
+            for t in remaining:
+                if all(d.name in done for d in t.deps):
+                    claim = self.claim(t, claims)
+                    if claim:
+                        task = t
+                        break
+            if task is None:
+                log.debug('No tasks available; %d remaining', len(remaining))
+                time.sleep(poll)
+                continue
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(claim, stop))
+            heartbeat.daemon = True
+            heartbeat.start()
+            try:
+                execute(task)
+            except Exception:
+                log.exception('%s failed', task.name)
+                self.release(task, failed=True)
+            else:
+                self.release(task)
+            finally:
+                stop.set()
+                heartbeat.join()
+            count += 1
+
+        if blocked:
+            log.warning('%d tasks failed or depend on a failed task', len(blocked))
+        log.info('%s ran %d tasks', self.worker_id, count)
+        return count
@@ -0,0 +1,25 @@
+"""
+Helper tools for the three-taxa pipeline, run as subcommands of ``sts-tools``.
+
+The parser of each subcommand is a ``*_parser`` function of
+:mod:`ststools.cli`, registered in its ``SUBCOMMANDS`` with the module that
+implements the subcommand. That module defines ``run(a)``, taking the parsed
+arguments, and is imported, with its heavy libraries, only when the
+subcommand runs. Modules shared with the comparison to MrBayes, such as
+:mod:`stsanalysis.likelihood`, are importable since ``sts-tools`` puts
+``comparison_to_mrbayes`` on the path.
+"""
+import contextlib
+import sys
+
+
+@contextlib.contextmanager
+def open_arg(path, mode='r'):
+    """
+    Open the command-line path ``path``; ``-`` is standard input or output.
+    """
+    if path == '-':
+        yield sys.stdout if 'w' in mode else sys.stdin
+    else:
+        with open(path, mode) as fp:
+            yield fp
@@ -0,0 +1,149 @@
+"""
+Command line for ``sts-tools``.
+
+Argument parsing lives here so that it needs only the standard library; the
+module implementing a subcommand, and with it dendropy, numpy, pandas and so
+on, is imported only once that subcommand runs.
+
+With ``--socket`` (or ``STS_TOOLS_SOCKET``) set, subcommands are sent to a
+running ``sts-tools serve``, which has already imported everything, and run
+locally if no server is listening.
+"""
+import argparse
+import collections
+import importlib
+import logging
+import os
+import sys
+
+log = logging.getLogger('sts-tools')
+
+Subcommand = collections.namedtuple('Subcommand', ['module', 'help', 'build_parser',
+                                                   'stdin_args'])
+
+
+def key_val(s):
+    if not s.count('=') == 1:
+        raise ValueError("Format: x=y")
+    k, v = s.split('=', 1)
+    return k.strip(), v.strip()
+
+
+def generate_trees_parser(p):
+    p.add_argument('-c', '--count', type=int, default=1000)
+    p.add_argument('-d', '--distance', type=float, default=0.1)
+    p.add_argument('nexus')
+    p.add_argument('tree')
+
+
+def generate_mb_parser(p):
+    p.add_argument('nexus_path')
+    mb_group = p.add_argument_group('mrbayes')
+    mb_group.add_argument('-l', '--length', type=int, default=1000000)
+    mb_group.add_argument('-r', '--runs', type=int, default=2)
+    mb_group.add_argument('-c', '--chains', type=int, default=3)
+    p.add_argument('-o', '--outfile', default='-')
+
+
+def compare_dists_parser(p):
+    p.add_argument('sts_output')
+    p.add_argument('mb_output')
+    p.add_argument('empirical_output')
+    p.add_argument('-o', '--outfile', default='-')
+
+
+def compare_dists_batch_parser(p):
+    p.add_argument('files', nargs='+', help="""sts-online output, MrBayes .p
+                   file and empirical posterior of each run, in turn""")
+    p.add_argument('-k', '--key', action='append', dest='keys', help="""Value of
+                   control.json to label runs by; may be repeated [default:
+                   proposal_method, seed and branch_length]""")
+    p.add_argument('-j', '--jobs', type=int, default=1, help="""Processes reading
+                   the runs; 0 for one per CPU [default: %(default)s]""")
+    p.add_argument('-s', '--summary', help="""Write the ESS, KL divergence and
+                   Hellinger distance of each run to this CSV file""")
+    p.add_argument('-o', '--outfile', default='-')
+
+
+def empirical_posterior_parser(p):
+    p.add_argument('tree', help="""Newick tree, with the other branch lengths to
+                   condition on""")
+    p.add_argument('fasta', help="""Alignment""")
+    p.add_argument('-t', '--new-taxon', default='C', help="""Leaf whose pendant
+                   branch length varies [default: %(default)s]""")
+    p.add_argument('-n', '--steps', type=int, default=1000, help="""Number of
+                   pendant lengths [default: %(default)s]""")
+    p.add_argument('--max-length', type=float, default=1.0, help="""Lengths are
+                   spaced by this over --steps [default: %(default)s]""")
+    p.add_argument('--exp-mean', type=float, default=0.1, help="""Mean of the
+                   exponential prior on branch lengths [default: %(default)s]""")
+    p.add_argument('-o', '--outfile', default='-')
+
+
+def decorate_csv_parser(p):
+    p.add_argument('-i', '--input', default='-')
+    p.add_argument('-o', '--output', default='-')
+    p.add_argument('kvs', metavar='k=v', nargs='+', type=key_val)
+
+
+def serve_parser(p):
+    pass
+
+
+SUBCOMMANDS = collections.OrderedDict([
+    ('generate-trees', Subcommand('ststools.trees', 'Generate the simulation trees',
+                                  generate_trees_parser, ())),
+    ('generate-mb', Subcommand('ststools.mrbayes', 'Write a MrBayes command block',
+                               generate_mb_parser, ())),
+    ('compare-dists', Subcommand('ststools.dists', 'Compare pendant branch length distributions',
+                                 compare_dists_parser, ())),
+    ('compare-dists-batch', Subcommand('ststools.distbatch',
+                                       'Compare the distributions of many runs at once',
+                                       compare_dists_batch_parser, ())),
+    ('empirical-posterior', Subcommand('ststools.empirical',
+                                       'Posterior of the pendant branch length on a grid',
+                                       empirical_posterior_parser, ())),
+    ('decorate-csv', Subcommand('ststools.decorate', 'Append constant columns to a CSV file',
+                                decorate_csv_parser, ('input',))),
+    ('serve', Subcommand('ststools.server', 'Run subcommands sent to --socket',
+                         serve_parser, ())),
+])
+
+
+def parser():
+    p = argparse.ArgumentParser(prog='sts-tools')
+    p.add_argument('--socket', default=os.environ.get('STS_TOOLS_SOCKET'),
+                   help="""Unix socket of an sts-tools server [default:
+                   $STS_TOOLS_SOCKET]""")
+    sp = p.add_subparsers(dest='subcommand', metavar='subcommand')
+    sp.required = True
+    for name, sub in SUBCOMMANDS.items():
+        sub.build_parser(sp.add_parser(name, help=sub.help))
+    return p
+
+
+def run(a):
+    """
+    Run the parsed subcommand ``a`` in this process, returning its exit status.
+    """
+    module = importlib.import_module(SUBCOMMANDS[a.subcommand].module)
+    return module.run(a) or 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    a = parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if a.socket and a.subcommand != 'serve':
+        from ststools import server
+        stdin = None
+        if any(getattr(a, k) == '-' for k in SUBCOMMANDS[a.subcommand].stdin_args):
+            stdin = sys.stdin.read()
+        status = server.submit(a.socket, argv, stdin)
+        if status is not None:
+            return status
+        log.warning('No server on %s; running %s locally', a.socket, a.subcommand)
+        if stdin is not None:
+            sys.stdin = server.StringIO(stdin)
+    return run(a)
@@ -0,0 +1,20 @@
+"""
+Append constant columns, given as k=v pairs, to a CSV file.
+"""
+import csv
+
+from ststools import open_arg
+
+
+def run(a):
+    keys, values = zip(*a.kvs)
+    values = list(values)
+
+    with open_arg(a.input) as ifp, open_arg(a.output, 'w') as ofp:
+        r = csv.reader(ifp)
+        headers = list(next(r))
+        w = csv.writer(ofp, lineterminator='\n')
+        w.writerow(headers + list(keys))
+
+        for row in r:
+            w.writerow(list(row) + values)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the pendant branch length distributions of many runs at once.
+
+Inputs are (sts-online JSON, MrBayes .p file, empirical posterior CSV)
+triples, one per run, labelled by the values of ``keys`` in the
+``control.json`` beside the sts-online output. Each file is read once, in
+parallel with ``--jobs``, and of the sts-online output only the tree lengths
+and first ESS are kept; the histograms of every run are then binned
+together, and the KL divergence and Hellinger distance of
+:mod:`ststools.dists` computed row by row.
+
+The output is the table of lengths, weights and types of every run that
+``plot-dists.r`` reads, with a column per key; ``--summary`` writes the
+statistics of each run.
+"""
+from __future__ import division
+
+import collections
+import csv
+import json
+import multiprocessing
+import os.path
+
+import numpy as np
+import pandas as pd
+
+from stsanalysis import stsjson
+from ststools import dists, open_arg
+
+TYPES = ('sts', 'empirical', 'mb')
+
+Run = collections.namedtuple('Run', ['control', 'ess', 'sts', 'empirical',
+                                     'empirical_weight', 'mb'])
+
+
+def load_run(paths):
+    """
+    Read the sts-online output, MrBayes parameters and empirical posterior
+    ``paths`` of one run.
+    """
+    sts_path, mb_path, empirical_path = paths
+    tree_lengths = []
+    ess = None
+    with open(sts_path) as fp:
+        for section, record in stsjson.iter_sections(fp, ['trees', 'generations']):
+            if section == 'trees':
+                tree_lengths.append(record['treeLength'])
+            elif ess is None:
+                ess = record['ess']
+    with open(os.path.join(os.path.dirname(sts_path), 'control.json')) as fp:
+        control = json.load(fp)
+    with open(mb_path) as fp:
+        mb_tl = dists.read_tree_lengths(fp)
+    empirical = pd.read_csv(empirical_path, usecols=['branch_length', 'posterior'])
+    posterior = empirical['posterior'].values
+    return Run(control, ess, np.array(tree_lengths, dtype=float),
+               empirical['branch_length'].values,
+               np.exp(posterior - posterior.max()), mb_tl)
+
+
+def histograms(values):
+    """
+    Histograms over :data:`dists.RANGE` of each array of ``values``, one row
+    each, normalized to sum to one. Bins are those of :func:`numpy.histogram`.
+    """
+    n = len(values)
+    group = np.repeat(np.arange(n), [len(v) for v in values])
+    values = np.concatenate(values)
+
+    lo, hi = dists.RANGE
+    keep = (values >= lo) & (values <= hi)
+    edges = np.linspace(lo, hi, dists.BINS + 1)
+    # The last bin includes its right edge
+    bins = np.minimum(np.searchsorted(edges, values[keep], side='right') - 1,
+                      dists.BINS - 1)
+    counts = np.bincount(group[keep] * dists.BINS + bins,
+                         minlength=n * dists.BINS).reshape(n, dists.BINS)
+    return counts / counts.sum(axis=1)[:, np.newaxis]
+
+
+def distribution_table(runs, keys):
+    """
+    Lengths of each run by type, with weights summing to one within each
+    type of a run.
+    """
+    frames = []
+    for run in runs:
+        for t, length, weight in zip(TYPES, [run.sts, run.empirical, run.mb],
+                                     [None, run.empirical_weight, None]):
+            weight = np.ones_like(length) if weight is None else weight
+            frame = pd.DataFrame({'length': length, 'weight': weight / weight.sum(),
+                                  'type': t}, columns=['length', 'weight', 'type'])
+            for k in keys:
+                frame[k] = run.control[k]
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def run(a):
+    if len(a.files) % 3:
+        raise ValueError('Expected (sts-online, MrBayes, empirical) triples, got '
+                         '{0} files'.format(len(a.files)))
+    triples = list(zip(a.files[::3], a.files[1::3], a.files[2::3]))
+
+    if a.jobs == 1:
+        runs = [load_run(t) for t in triples]
+    else:
+        pool = multiprocessing.Pool(a.jobs or None)
+        try:
+            runs = pool.map(load_run, triples)
+        finally:
+            pool.close()
+            pool.join()
+
+    keys = a.keys or ['proposal_method', 'seed', 'branch_length']
+    for (sts_path, _, _), r in zip(triples, runs):
+        missing = [k for k in keys if k not in r.control]
+        if missing:
+            raise ValueError('{0}: no {1} in control.json'.format(
+                sts_path, ', '.join(missing)))
+
+    sts_hist = histograms([r.sts for r in runs])
+    mb_hist = histograms([r.mb[len(r.mb) // 4:] for r in runs])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kl = dists.kl(mb_hist, sts_hist)
+    hellinger = dists.hellinger(mb_hist, sts_hist)
+
+    with open_arg(a.outfile, 'w') as ofp:
+        distribution_table(runs, keys).to_csv(ofp, index=False)
+
+    if a.summary:
+        with open_arg(a.summary, 'w') as ofp:
+            w = csv.writer(ofp, lineterminator='\n')
+            w.writerow(keys + ['ess', 'kl', 'hellinger'])
+            for r, k, h in zip(runs, kl.tolist(), hellinger.tolist()):
+                w.writerow([r.control[key] for key in keys] + [r.ess, k, h])
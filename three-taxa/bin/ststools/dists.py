@@ -1,14 +1,16 @@
-#!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import argparse
-import csv
+"""
+Compare the distribution of the length of the pendant branch to C between
+sts-online, MrBayes and the empirical posterior.
+"""
 import json
-import sys
 
 import numpy as np
 import pandas as pd
 from scipy.misc import logsumexp
 
+from ststools import open_arg
+
 BINS = 250
 RANGE = (0.0, 1.0)
 
@@ -18,14 +20,14 @@ def kl(p, q):
 
     Parameters
     ----------
-    p, q : array-like, dtype=float, shape=n
-        Discrete probability distributions.
+    p, q : array-like, dtype=float, shape=n or (m, n)
+        Discrete probability distributions, one per row.
     """
-    return np.sum(np.where(p != 0, p * np.log(p / q), 0))
+    return np.sum(np.where(p != 0, p * np.log(p / q), 0), axis=-1)
 
 
 def hellinger(p, q):
-    sqsum = ((np.sqrt(p) + np.sqrt(q))**2.0).sum()
+    sqsum = ((np.sqrt(p) + np.sqrt(q))**2.0).sum(axis=-1)
     return np.sqrt(sqsum) / np.sqrt(2)
 
 
@@ -41,33 +43,30 @@ def hist_of_empirical(empirical_data):
     return hist
 
 
+def read_tree_lengths(fp):
+    """
+    The TL column of the MrBayes parameter file ``fp``.
+    """
+    # Skip the [ID: ...] line
+    return pd.read_csv(fp, sep='\t', skiprows=1, usecols=['TL'])['TL'].values
+
+
 def mb_tree_lengths(fp):
-    next(fp)  # Skip header
-    r = csv.DictReader(fp, delimiter='\t')
-    tl = np.array([float(line['TL']) for line in r])
-    l = len(tl)
-    burn = l // 4
+    tl = read_tree_lengths(fp)
+    burn = len(tl) // 4
     return tl[burn:]
 
 
-def main():
-    p = argparse.ArgumentParser()
-    p.add_argument('sts_output', type=argparse.FileType('r'))
-    p.add_argument('mb_output', type=argparse.FileType('r'))
-    p.add_argument('empirical_output', type=argparse.FileType('r'))
-    p.add_argument('-o', '--outfile', default=sys.stdout,
-                   type=argparse.FileType('w'))
-    a = p.parse_args()
-
-    with a.empirical_output as fp:
+def run(a):
+    with open(a.empirical_output) as fp:
         empirical = pd.read_csv(fp)
 
     empirical_hist, empirical_edges = hist_of_empirical(empirical)
 
-    with a.sts_output as fp:
+    with open(a.sts_output) as fp:
         doc = json.load(fp)
 
-    with a.mb_output as fp:
+    with open(a.mb_output) as fp:
         mb_tl = mb_tree_lengths(fp)
         mb_hist, mb_edges = np.histogram(mb_tl,
                                          bins=BINS,
@@ -88,7 +87,7 @@ def main():
     sts_hist = sts_hist / sts_hist.sum()
     mb_hist = mb_hist / mb_hist.sum()
 
-    with a.outfile as ofp:
+    with open_arg(a.outfile, 'w') as ofp:
         r = {'kl': kl(mb_hist, sts_hist),
              'hellinger': hellinger(mb_hist, sts_hist),
              'ess': doc['generations'][0]['ess'],
@@ -96,6 +95,3 @@ def main():
         json.dump(r, ofp, indent=2)
         #output.to_csv(ofp, index=False)
 
-
-if __name__ == '__main__':
-    main()
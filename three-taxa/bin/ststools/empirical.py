@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Empirical posterior of the length of the pendant branch to ``new_taxon``.
+
+The other branch lengths of the tree are fixed; the pendant length runs over
+a grid of ``steps`` points from 1e-6, and each gets the log of an
+exponential prior on every branch length and the JC69 log likelihood of the
+alignment, from the partials of :mod:`stsanalysis.likelihood`: those of the
+rest of the tree at the attachment point are computed once, and the whole
+grid is scored from them in one call.
+"""
+import csv
+
+import numpy as np
+
+from stsanalysis import alignment, likelihood, newick
+from ststools import open_arg
+
+MIN_LENGTH = 1e-6
+
+
+def log_exponential_pdf(x, mean):
+    return -np.log(mean) - np.asarray(x) / mean
+
+
+def run(a):
+    with open(a.tree) as fp:
+        tree = newick.parse(fp.read())
+    with open(a.fasta) as fp:
+        patterns, weights = likelihood.compress(alignment.read_fasta(fp))
+    leaves = [i for i, label in enumerate(tree.labels) if label == a.new_taxon]
+    if len(leaves) != 1:
+        raise ValueError('{0} leaves labelled {1}'.format(len(leaves), a.new_taxon))
+    leaf, = leaves
+    tl = likelihood.TreeLikelihood(tree, likelihood.tip_partials(patterns), weights)
+
+    lengths = MIN_LENGTH + np.arange(a.steps) * (a.max_length / a.steps)
+    others = np.delete(np.nan_to_num(tree.length[:-1]), leaf)
+    prior = (log_exponential_pdf(others, a.exp_mean).sum() +
+             log_exponential_pdf(lengths, a.exp_mean))
+    ll = tl.pendant_log_likelihoods(leaf, lengths)
+
+    with open_arg(a.outfile, 'w') as fp:
+        w = csv.writer(fp, lineterminator='\n')
+        w.writerow(['branch_length', 'prior', 'likelihood', 'posterior'])
+        w.writerows(zip(lengths.tolist(), prior.tolist(), ll.tolist(),
+                        (prior + ll).tolist()))
@@ -1,10 +1,13 @@
-#!/usr/bin/env python
-import argparse
+"""
+Write a MrBayes command block for the alignment ``nexus_path``, constraining
+(A, B, D) to be a clade.
+"""
 import os.path
-import sys
 
 from Bio import SeqIO
 
+from ststools import open_arg
+
 TEMPLATE = """
 begin mrbayes;
     set autoclose=yes nowarn=yes;
@@ -18,16 +21,7 @@ begin mrbayes;
 end;
 """
 
-def main():
-    p = argparse.ArgumentParser()
-    p.add_argument('nexus_path')
-    mb_group = p.add_argument_group('mrbayes')
-    mb_group.add_argument('-l', '--length', type=int, default=1000000)
-    mb_group.add_argument('-r', '--runs', type=int, default=2)
-    mb_group.add_argument('-c', '--chains', type=int, default=3)
-    p.add_argument('-o', '--outfile', type=argparse.FileType('w'), default=sys.stdout)
-    a = p.parse_args()
-
+def run(a):
     base = os.path.splitext(a.nexus_path)[0]
     n_sequences = sum(True for i in SeqIO.parse(a.nexus_path, 'nexus'))
 
@@ -43,8 +37,5 @@ def main():
                         samplefreq=a.length // 1000, printfreq = a.length // 100,
                         nruns=a.runs, nchains=a.chains,
                         diagnfreq=a.length / 2)
-    with a.outfile as fp:
+    with open_arg(a.outfile, 'w') as fp:
         fp.write(t)
-
-if __name__ == '__main__':
-    main()
@@ -0,0 +1,133 @@
+"""
+Run ``sts-tools`` subcommands sent over a Unix socket.
+
+The server imports every subcommand module once, then forks a child per
+request, so each job starts with the libraries loaded but cannot leave state
+behind. A request is one JSON line, ``{"argv": [...], "cwd": ..., "stdin":
+...}``; the reply is one JSON line with the job's ``status``, ``stdout`` and
+``stderr``.
+"""
+import errno
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import traceback
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from ststools import cli
+
+log = logging.getLogger('sts-tools')
+
+
+def _text(s):
+    # Python 2 file-like objects expect byte strings
+    if not isinstance(s, str):
+        s = s.encode('utf-8')
+    return s
+
+
+def _exit_status(code):
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    sys.stderr.write('{0}\n'.format(code))
+    return 1
+
+
+def handle(conn):
+    """
+    Run the request on ``conn`` and send the reply.
+    """
+    request = json.loads(conn.makefile('rb').readline().decode('utf-8'))
+    stdout, stderr = StringIO(), StringIO()
+    sys.stdin = StringIO(_text(request.get('stdin') or ''))
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        os.chdir(request['cwd'])
+        status = cli.run(cli.parser().parse_args(request['argv']))
+    except SystemExit as e:
+        status = _exit_status(e.code)
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    reply = {'status': status, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+    conn.sendall((json.dumps(reply) + '\n').encode('utf-8'))
+
+
+def serve(path):
+    for sub in cli.SUBCOMMANDS.values():
+        if sub.module != __name__:
+            try:
+                importlib.import_module(sub.module)
+            except ImportError as e:
+                log.warning('Not preloading %s: %s', sub.module, e)
+
+    try:
+        os.unlink(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(path)
+    s.listen(64)
+    # Children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    log.info('Listening on %s', path)
+
+    try:
+        while True:
+            conn, _ = s.accept()
+            if os.fork() == 0:
+                s.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                try:
+                    handle(conn)
+                finally:
+                    os._exit(0)
+            conn.close()
+    finally:
+        s.close()
+        os.unlink(path)
+
+
+def submit(path, argv, stdin=None):
+    """
+    Run ``argv`` on the server listening on ``path``, copying its output to
+    ours. Returns the exit status, or ``None`` if no server is listening.
+    """
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+    except socket.error:
+        return None
+    try:
+        request = {'argv': argv, 'cwd': os.getcwd(), 'stdin': stdin}
+        s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        s.shutdown(socket.SHUT_WR)
+        line = s.makefile('rb').readline()
+    finally:
+        s.close()
+    if not line:
+        raise IOError('sts-tools server on {0} closed the connection'.format(path))
+    reply = json.loads(line.decode('utf-8'))
+    sys.stdout.write(_text(reply['stdout']))
+    sys.stderr.write(_text(reply['stderr']))
+    return reply['status']
+
+
+def run(a):
+    if not a.socket:
+        raise SystemExit('sts-tools serve: specify --socket')
+    serve(a.socket)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+Write ``count`` copies of the pruned tree ((A,B),D) as NEXUS, and the full
+tree with C attached at ``distance`` as Newick.
+"""
+import dendropy
+
+
+def run(a):
+    tree = '((A:1e-6,B:1e-6):1e-6,D:1e-6)'
+    tree_full = '({0}:1e-6,C:{1});'.format(tree, a.distance)
+
+    with open(a.tree, 'w') as fp:
+        fp.write(tree_full + '\n')
+
+    tl = dendropy.TreeList()
+    for _ in xrange(a.count):
+        tl.append(dendropy.Tree.get_from_string(tree + ';', 'newick'))
+
+    with open(a.nexus, 'w') as fp:
+        tl.write_to_stream(fp, 'nexus')